@@ -0,0 +1,257 @@
+# benchmark_api.py
+# Reproducible end-to-end benchmark of the API. Starts uvicorn in a child
+# process against a throwaway SQLite file (or --database-url), with Groq and
+# Tesseract replaced by deterministic local fakes and rate limiting off,
+# registers a hospital, seeds N synthetic patients and drives the
+# load_test.py endpoint mixes at the given concurrency. Results (throughput
+# and p50/p95/p99 per endpoint) are written to a JSON file; with --baseline
+# they are compared against an earlier run and regressions fail the run. A
+# run fails without writing results if no trained model can be loaded or any
+# request errors, so a broken setup never becomes a baseline.
+#
+#   python benchmark_api.py --patients 5000 --mix intake --output bench.json
+#   python benchmark_api.py --patients 5000 --mix intake --baseline bench.json
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import httpx
+
+import load_test
+
+EMAIL = "bench@example.com"
+PASSWORD = "bench-password"
+
+
+# ---------------------------------------------------------------------------
+# Server side: runs in the child process started by the harness
+# ---------------------------------------------------------------------------
+
+class FakeOcrEngine:
+    """Deterministic stand-in for the Tesseract process pool.
+
+    Returns text derived from the document's hash after ``page_ms`` per page,
+    so uploads exercise everything around OCR without poppler or tesseract.
+    """
+
+    def __init__(self, pages: int = 1, page_ms: float = 0.0):
+        self.pages = pages
+        self.page_ms = page_ms
+
+    def settings(self) -> dict:
+        return {"fake": True}
+
+    async def extract_file(self, path: str, digest: str = None):
+        from ocr import OcrResult, PageResult, sha256_file
+
+        digest = digest or await asyncio.to_thread(sha256_file, path)
+        started = time.perf_counter()
+        pages = []
+        for page in range(1, self.pages + 1):
+            if self.page_ms:
+                await asyncio.sleep(self.page_ms / 1000)
+            pages.append(PageResult(page=page, text=f"Scanned page {page} of document {digest[:12]}.\n",
+                                    raster_ms=0.0, ocr_ms=self.page_ms))
+        return OcrResult(text="".join(p.text for p in pages), pages=pages,
+                         total_ms=(time.perf_counter() - started) * 1000)
+
+    def shutdown(self):
+        pass
+
+
+def serve(args):
+    import uvicorn
+
+    import main
+    import routers.patient
+    from llm import FakeLLMBackend, llm_client
+    from model_registry import registry
+
+    # Load the model up front: without one every predict and upload is a 500
+    try:
+        registry.current()
+    except Exception as e:
+        raise SystemExit(f"No trained model could be loaded ({e}); run train_model.py first")
+    routers.patient.ocr_engine = FakeOcrEngine(pages=args.ocr_pages, page_ms=args.ocr_page_ms)
+    llm_client.backend = FakeLLMBackend(latency=args.llm_ms / 1000)
+    uvicorn.run(main.app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+# ---------------------------------------------------------------------------
+# Harness side
+# ---------------------------------------------------------------------------
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(args, env: dict, port: int) -> subprocess.Popen:
+    command = [sys.executable, os.path.abspath(__file__), "serve", "--port", str(port),
+               "--ocr-pages", str(args.ocr_pages), "--ocr-page-ms", str(args.ocr_page_ms),
+               "--llm-ms", str(args.llm_ms)]
+    server = subprocess.Popen(command, env=env)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise SystemExit(f"API server exited with code {server.returncode}")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/", timeout=1).status_code == 200:
+                return server
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    server.terminate()
+    raise SystemExit("API server did not start within 60s")
+
+
+def preflight(base_url: str) -> str:
+    """The version of the model the server loaded; exits if it has none."""
+    response = httpx.post(f"{base_url}/auth/login", json={"email": EMAIL, "password": PASSWORD})
+    response.raise_for_status()
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    info = httpx.get(f"{base_url}/ai/model", headers=headers, timeout=10).json()
+    if not info.get("loaded"):
+        raise SystemExit(f"API server has no model loaded: {info}")
+    return info["version"]
+
+
+def seed(base_url: str, patients: int) -> int:
+    response = httpx.post(f"{base_url}/auth/register", json={
+        "name": "Benchmark Hospital", "address": "1 Bench Street", "email": EMAIL,
+        "phone": "000", "password": PASSWORD,
+    })
+    response.raise_for_status()
+    hospital_id = response.json()["hospital_id"]
+
+    # Straight into the database through the bulk importer, like seed_patients.py
+    import seed_patients
+    seed_patients.seed_database(patients, hospital_id)
+    return hospital_id
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> list:
+    """Human-readable regressions of ``result`` against ``baseline``.
+
+    A latency percentile regresses when it is more than ``tolerance`` (a
+    fraction) above the baseline; throughput when it is more than
+    ``tolerance`` below it; any endpoint gaining errors is flagged too.
+    """
+    regressions = []
+    if result["throughput_rps"] < baseline["throughput_rps"] * (1 - tolerance):
+        regressions.append(f"throughput {result['throughput_rps']} req/s < baseline {baseline['throughput_rps']}")
+    for name, before in baseline["endpoints"].items():
+        after = result["endpoints"].get(name)
+        if after is None:
+            regressions.append(f"{name}: missing from this run")
+            continue
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            if after[key] > before[key] * (1 + tolerance):
+                regressions.append(f"{name} {key[:3]} {after[key]} ms > baseline {before[key]} ms")
+        if after["errors"] > before["errors"]:
+            regressions.append(f"{name}: {after['errors']} errors (baseline {before['errors']})")
+    return regressions
+
+
+def run(args):
+    random.seed(args.seed)
+    workdir = tempfile.mkdtemp(prefix="medicare-bench-")
+    database_url = args.database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    env = {
+        **os.environ,
+        "DATABASE_URL": database_url,
+        "LLM_BACKEND": "fake",
+        "RATE_LIMIT_ENABLED": "false",
+        "JWT_SECRET": os.environ.get("JWT_SECRET", "benchmark-only-secret-not-for-production"),
+        "OCR_CACHE_PATH": os.path.join(workdir, "ocr_cache.sqlite3"),
+        "INGEST_DB_PATH": os.path.join(workdir, "ingest_jobs.sqlite3"),
+        "INGEST_UPLOAD_DIR": os.path.join(workdir, "uploads"),
+    }
+    # The seeding below runs in this process and must hit the same database
+    os.environ["DATABASE_URL"] = database_url
+
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server = start_server(args, env, port)
+    try:
+        seed(base_url, args.patients)
+        model_version = preflight(base_url)
+        if args.warmup:
+            asyncio.run(load_test.run(base_url, EMAIL, PASSWORD, args.concurrency, args.warmup, args.mix))
+        summary = asyncio.run(load_test.run(base_url, EMAIL, PASSWORD, args.concurrency, args.duration, args.mix))
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    load_test.report(summary)
+    failing = {name: e["errors"] for name, e in summary["endpoints"].items() if e["errors"]}
+    if failing:
+        print(f"❌ Requests failed, results not written: {failing}")
+        raise SystemExit(1)
+
+    result = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "model_version": model_version,
+        "params": {
+            "mix": args.mix, "patients": args.patients, "concurrency": args.concurrency,
+            "duration": args.duration, "database": database_url.split(":", 1)[0],
+            "ocr_pages": args.ocr_pages, "ocr_page_ms": args.ocr_page_ms, "llm_ms": args.llm_ms,
+        },
+        "machine": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        **summary,
+    }
+    with open(args.output, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"✅ Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("params") != result["params"]:
+            print(f"⚠️  Baseline was recorded with different parameters: {baseline.get('params')}")
+        regressions = compare(result, baseline, args.tolerance)
+        if regressions:
+            print(f"❌ {len(regressions)} regression(s) against {args.baseline} (tolerance {args.tolerance:.0%}):")
+            for line in regressions:
+                print(f"   {line}")
+            raise SystemExit(1)
+        print(f"✅ No regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the API end to end with faked OCR and LLM")
+    fakes = parser.add_argument_group("server fakes")
+    fakes.add_argument("--ocr-pages", type=int, default=1, help="pages the fake OCR reports per document")
+    fakes.add_argument("--ocr-page-ms", type=float, default=0.0, help="simulated OCR time per page")
+    fakes.add_argument("--llm-ms", type=float, default=0.0, help="simulated Groq latency per call")
+    parser.add_argument("command", nargs="?", choices=["run", "serve"], default="run")
+    parser.add_argument("--port", type=int, default=8000, help=argparse.SUPPRESS)
+    parser.add_argument("--database-url", default=None, help="an empty database; defaults to a fresh SQLite file")
+    parser.add_argument("--patients", type=int, default=1000)
+    parser.add_argument("--mix", choices=load_test.MIXES, default="dashboard")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds of measured load")
+    parser.add_argument("--warmup", type=float, default=3.0, help="seconds of unmeasured load first")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", default=None, help="earlier results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown as a fraction")
+    args = parser.parse_args()
+    if args.command == "serve":
+        serve(args)
+    else:
+        run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+# benchmark_inference.py
+# Compares single-row latency of sklearn's model.predict with the flattened
+# NumPy forest exported by train_model.py, and checks both agree. Loads the
+# active model version the same way the API does (MODEL_DIR/CURRENT, else the
+# legacy pickles in the working directory).
+
+import argparse
+import random
+import time
+
+import numpy as np
+
+from forest import CompiledForest, flatten_forest
+from model_registry import registry
+
+
+def percentile_ms(samples, q):
+    return float(np.percentile(samples, q)) * 1000
+
+
+def time_calls(fn, rows, repeat):
+    samples = []
+    for i in range(repeat):
+        row = rows[i % len(rows)]
+        started = time.perf_counter()
+        fn(row)
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sklearn vs compiled forest inference")
+    parser.add_argument("--repeat", type=int, default=500)
+    parser.add_argument("--check-rows", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    bundle = registry.current()
+    model, encoder = bundle.model, bundle.encoder
+    forest = bundle.forest or CompiledForest(flatten_forest(model))
+    print(f"Model version {bundle.version} from {bundle.path}")
+
+    random.seed(args.seed)
+    symptoms = list(encoder.classes_)
+    sets = [random.sample(symptoms, k=random.randint(1, min(6, len(symptoms)))) for _ in range(args.check_rows)]
+    X = encoder.transform(sets)
+
+    sk_proba = model.predict_proba(X)
+    np_proba = forest.predict_proba(X)
+    identical = np.array_equal(model.predict(X), forest.predict(X))
+    print(f"Checked {len(sets)} rows: predictions identical={identical}, "
+          f"max |proba diff|={np.abs(sk_proba - np_proba).max():.3g}")
+
+    rows = [X[i:i + 1] for i in range(min(len(sets), 256))]
+    model.predict(rows[0])  # warm up
+    forest.predict(rows[0])
+    sk = time_calls(model.predict, rows, args.repeat)
+    fast = time_calls(forest.predict, rows, args.repeat)
+
+    print(f"{'predictor':<20}{'p50 (ms)':>10}{'p99 (ms)':>10}")
+    print(f"{'sklearn predict':<20}{percentile_ms(sk, 50):>10.3f}{percentile_ms(sk, 99):>10.3f}")
+    print(f"{'compiled forest':<20}{percentile_ms(fast, 50):>10.3f}{percentile_ms(fast, 99):>10.3f}")
+    print(f"p50 speedup: {np.percentile(sk, 50) / np.percentile(fast, 50):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
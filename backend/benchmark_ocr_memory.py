@@ -0,0 +1,155 @@
+# benchmark_ocr_memory.py
+# Checks that OCR memory stays bounded as documents get longer. For each
+# page count it writes a synthetic scanned PDF (one grayscale JPEG per page,
+# generated a page at a time), OCRs it from disk with a fresh OcrEngine in a
+# child process, and reports the peak RSS of that process and of its pool
+# workers. Fails if a worker exceeds --max-worker-mb, or if the peak grows by
+# more than --max-growth-mb between the shortest and the longest document.
+# Needs poppler and tesseract installed, like the API itself.
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from PIL import Image, ImageDraw
+
+from ocr import OcrEngine
+
+WORDS = ["hemoglobin", "glucose", "platelets", "creatinine", "cholesterol", "normal", "elevated",
+         "mg/dL", "g/dL", "patient", "reports", "fever", "cough", "fatigue", "follow-up", "prescribed"]
+
+
+def rss_mb(usage) -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return round(usage.ru_maxrss * scale / (1024 * 1024), 1)
+
+
+def scanned_page(rng: random.Random, dpi: int, blank: bool) -> bytes:
+    width, height = int(8.5 * dpi), int(11 * dpi)
+    image = Image.new("L", (width, height), 235)
+    if not blank:
+        draw = ImageDraw.Draw(image)
+        for y in range(dpi // 2, height - dpi // 2, dpi // 5):
+            draw.text((dpi // 2, y), " ".join(rng.choices(WORDS, k=10)), fill=25)
+    out = io.BytesIO()
+    image.save(out, "JPEG", quality=70)
+    image.close()
+    return out.getvalue()
+
+
+def write_scanned_pdf(path: str, pages: int, dpi: int = 150, seed: int = 42):
+    """A minimal image-only PDF, written one page at a time so generating it stays small too."""
+    rng = random.Random(seed)
+    offsets = {}
+    with open(path, "wb") as f:
+        def obj(number: int, body: bytes, stream: bytes = None):
+            offsets[number] = f.tell()
+            f.write(b"%d 0 obj\n" % number + body)
+            if stream is not None:
+                f.write(b"\nstream\n" + stream + b"\nendstream")
+            f.write(b"\nendobj\n")
+
+        f.write(b"%PDF-1.4\n")
+        obj(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+        kids = []
+        for i in range(pages):
+            page_id, content_id, image_id = 3 + 3 * i, 4 + 3 * i, 5 + 3 * i
+            jpeg = scanned_page(rng, dpi, blank=(i % 10 == 9))
+            content = b"q 612 0 0 792 0 0 cm /Im0 Do Q"
+            obj(page_id, b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                         b"/Resources << /XObject << /Im0 %d 0 R >> >> /Contents %d 0 R >>" % (image_id, content_id))
+            obj(content_id, b"<< /Length %d >>" % len(content), content)
+            obj(image_id, b"<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /DeviceGray "
+                          b"/BitsPerComponent 8 /Filter /DCTDecode /Length %d >>"
+                          % (int(8.5 * dpi), 11 * dpi, len(jpeg)), jpeg)
+            kids.append(b"%d 0 R" % page_id)
+        obj(2, b"<< /Type /Pages /Kids [" + b" ".join(kids) + b"] /Count %d >>" % pages)
+
+        xref = f.tell()
+        count = max(offsets) + 1
+        f.write(b"xref\n0 %d\n0000000000 65535 f \n" % count)
+        for number in range(1, count):
+            f.write(b"%010d 00000 n \n" % offsets[number])
+        f.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (count, xref))
+
+
+def measure(args):
+    """Child process: OCR one document and print peak RSS as JSON."""
+    engine = OcrEngine(pool_size=args.pool_size, page_concurrency=args.page_concurrency, cache=None)
+    started = time.perf_counter()
+    result = asyncio.run(engine.extract_file(args.pdf))
+    elapsed = time.perf_counter() - started
+    # Workers must have exited for RUSAGE_CHILDREN to include them
+    engine.shutdown(wait=True)
+    print(json.dumps({
+        "pages": len(result.pages),
+        "paths": result.path_counts,
+        "seconds": round(elapsed, 2),
+        "parent_peak_mb": rss_mb(resource.getrusage(resource.RUSAGE_SELF)),
+        "worker_peak_mb": rss_mb(resource.getrusage(resource.RUSAGE_CHILDREN)),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that OCR peak RSS does not grow with page count")
+    parser.add_argument("--pages", default="5,60", help="comma-separated page counts, shortest first")
+    parser.add_argument("--dpi", type=int, default=150, help="resolution of the synthetic scans")
+    parser.add_argument("--pool-size", type=int, default=2)
+    parser.add_argument("--page-concurrency", type=int, default=2)
+    parser.add_argument("--max-worker-mb", type=float, default=400)
+    parser.add_argument("--max-growth-mb", type=float, default=64)
+    parser.add_argument("--pdf", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.pdf:
+        measure(args)
+        return
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for pages in (int(p) for p in args.pages.split(",")):
+            path = os.path.join(workdir, f"scan-{pages}.pdf")
+            write_scanned_pdf(path, pages, args.dpi)
+            # A fresh process per document, so each peak is measured on its own
+            out = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--pdf", path, "--pool-size", str(args.pool_size),
+                 "--page-concurrency", str(args.page_concurrency)],
+                capture_output=True, text=True, check=True,
+            ).stdout
+            result = json.loads(out.strip().splitlines()[-1])
+            result["file_mb"] = round(os.path.getsize(path) / (1024 * 1024), 1)
+            results.append(result)
+
+    print(f"{'pages':>6}{'file':>9}{'seconds':>9}{'parent peak':>13}{'worker peak':>13}  paths")
+    for r in results:
+        print(f"{r['pages']:>6}{r['file_mb']:>7.1f}MB{r['seconds']:>9.2f}{r['parent_peak_mb']:>11.1f}MB"
+              f"{r['worker_peak_mb']:>11.1f}MB  {r['paths']}")
+
+    failures = []
+    for r in results:
+        if r["worker_peak_mb"] > args.max_worker_mb:
+            failures.append(f"{r['pages']} pages: worker peak {r['worker_peak_mb']} MB > {args.max_worker_mb} MB")
+    for key in ("parent_peak_mb", "worker_peak_mb"):
+        growth = results[-1][key] - results[0][key]
+        if growth > args.max_growth_mb:
+            failures.append(f"{key} grew {growth:.1f} MB from {results[0]['pages']} to "
+                            f"{results[-1]['pages']} pages (> {args.max_growth_mb} MB)")
+    if failures:
+        print("❌ OCR memory is not bounded:")
+        for line in failures:
+            print(f"   {line}")
+        raise SystemExit(1)
+    print("✅ OCR peak RSS stays bounded as page count grows")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# benchmark_similarity.py
+# Builds the similar-patients index over synthetic symptom profiles at
+# increasing sizes and reports build time, top-k query latency and
+# incremental upsert latency. The smallest size is also checked against a
+# brute-force Python Jaccard scan.
+
+import argparse
+import random
+import time
+
+import numpy as np
+
+from model_registry import ModelBundle
+from similarity import SimilarityIndex
+
+
+class FixedRegistry:
+    def __init__(self, bundle):
+        self.bundle = bundle
+
+    def current(self):
+        return self.bundle
+
+
+def synthetic_bundle(n_symptoms: int) -> ModelBundle:
+    vocabulary = {f"symptom_{i}": i for i in range(n_symptoms)}
+    return ModelBundle(version="bench", path=".", encoder=None, forest=None, load_ms=0.0, vocabulary=vocabulary)
+
+
+def random_profiles(rng, count, symptoms, start_id=1):
+    for i in range(count):
+        chosen = rng.sample(symptoms, k=rng.randint(2, 8))
+        yield (start_id + i, rng.randint(1, 20), chosen, f"disease {rng.randint(0, 40)}")
+
+
+def brute_force(profiles, query, k):
+    query = set(query)
+    scored = []
+    for patient_id, _, symptoms, _ in profiles:
+        symptoms = set(symptoms)
+        score = len(query & symptoms) / len(query | symptoms)
+        if score > 0:
+            scored.append((-round(score, 4), patient_id))
+    return [patient_id for _, patient_id in sorted(scored)[:k]]
+
+
+def percentile_ms(samples, q):
+    return float(np.percentile(samples, q)) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the similar-patients index")
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--symptoms", type=int, default=132, help="vocabulary size (132 in the Kaggle dataset)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    bundle = synthetic_bundle(args.symptoms)
+    symptoms = list(bundle.vocabulary)
+    sizes = [int(s) for s in args.sizes.split(",")]
+
+    print(f"{'patients':>10}{'build':>11}{'matrix':>10}{'query p50':>12}{'query p99':>12}{'upsert p50':>12}")
+    for n, size in enumerate(sizes):
+        index = SimilarityIndex(model_registry=FixedRegistry(bundle))
+        profiles = list(random_profiles(rng, size, symptoms))
+        started = time.perf_counter()
+        index.build(profiles, bundle=bundle, expected_rows=size)
+        build_s = time.perf_counter() - started
+
+        queries = [rng.sample(symptoms, k=rng.randint(2, 6)) for _ in range(args.queries)]
+        if n == 0:
+            for query in queries[:20]:
+                got = [r["patient_id"] for r in index.search(query, args.k)]
+                expected = brute_force(profiles, query, args.k)
+                assert got == expected, f"mismatch for {query}: {got} != {expected}"
+
+        samples = []
+        for query in queries:
+            started = time.perf_counter()
+            index.search(query, args.k)
+            samples.append(time.perf_counter() - started)
+
+        upserts = []
+        for profile in random_profiles(rng, 200, symptoms, start_id=rng.randint(1, size)):
+            started = time.perf_counter()
+            index.upsert([profile])
+            upserts.append(time.perf_counter() - started)
+
+        print(f"{size:>10,}{build_s:>10.2f}s{index.stats()['matrix_mb']:>8.1f}MB"
+              f"{percentile_ms(samples, 50):>10.2f}ms{percentile_ms(samples, 99):>10.2f}ms"
+              f"{percentile_ms(upserts, 50):>10.3f}ms")
+    print("✅ Top-k results match a brute-force Jaccard scan")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+import csv
+import json
+import os
+import time
+from datetime import datetime
+from itertools import islice
+from typing import Iterable, Iterator
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from models import Patient, MedicalRecord, DiseaseHistory
+from parsing import parse_date, parse_datetime, parse_number
+from search_index import reindex_patients
+
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "1000"))
+
+PATIENT_COLUMNS = [
+    "name", "age", "contact", "dob", "symptoms", "allergies", "previous_diseases",
+    "weight", "height", "medical_summary", "medications",
+]
+RECORD_COLUMNS = ["symptoms", "allergies", "previous_diseases", "medications", "weight", "height"]
+
+
+class BulkImportError(Exception):
+    def __init__(self, message: str, imported: int):
+        super().__init__(message)
+        self.imported = imported
+
+
+def parse_csv(lines: Iterable[str]) -> Iterator[dict]:
+    return csv.DictReader(lines)
+
+
+def parse_ndjson(lines: Iterable[str]) -> Iterator[dict]:
+    for line in lines:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def _value(row: dict, key: str):
+    value = row.get(key)
+    if isinstance(value, str):
+        value = value.strip()
+    return value if value not in ("", None) else None
+
+
+def _patient_values(row: dict, hospital_id: int) -> dict:
+    values = {column: _value(row, column) for column in PATIENT_COLUMNS}
+    values["age"] = int(values["age"]) if values["age"] is not None else 0
+    values["weight"] = parse_number(values["weight"])
+    values["height"] = parse_number(values["height"])
+    values["name"] = values["name"] or "Unknown"
+    values["contact"] = values["contact"] or "N/A"
+    values["dob"] = parse_date(values["dob"])
+    values["hospital_id"] = hospital_id
+    return values
+
+
+def import_patients(db: Session, rows: Iterable[dict], hospital_id: int, chunk_size: int = IMPORT_CHUNK_SIZE) -> dict:
+    """Insert patients with their initial MedicalRecord and optional DiseaseHistory.
+
+    Rows are written in chunks: one multi-row INSERT ... RETURNING id for the
+    patients, one executemany per child table, and one commit per chunk.
+    A row may carry ``visit_date``, ``predicted_disease`` and ``created_at``
+    in addition to the patient columns. Dates and measurements are parsed
+    leniently; values that don't parse are stored as NULL (dates of the
+    child rows fall back to the import time).
+    """
+    started = time.perf_counter()
+    counts = {"patients": 0, "medical_records": 0, "disease_history": 0}
+    rows = iter(rows)
+    now = datetime.now()
+
+    while True:
+        try:
+            # Inside the try: a malformed CSV/NDJSON line raises while the chunk is read
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            patients = [_patient_values(row, hospital_id) for row in chunk]
+            patient_ids = db.scalars(
+                insert(Patient).returning(Patient.id, sort_by_parameter_order=True), patients
+            ).all()
+
+            records, history = [], []
+            for row, patient, patient_id in zip(chunk, patients, patient_ids):
+                record = {column: patient[column] for column in RECORD_COLUMNS}
+                record.update(
+                    patient_id=patient_id,
+                    document_summary=patient["medical_summary"],
+                    visit_date=parse_datetime(_value(row, "visit_date")) or now,
+                )
+                records.append(record)
+                if _value(row, "predicted_disease"):
+                    history.append({
+                        "patient_id": patient_id,
+                        "symptoms": patient["symptoms"],
+                        "predicted_disease": _value(row, "predicted_disease"),
+                        "created_at": parse_datetime(_value(row, "created_at")) or now,
+                    })
+
+            db.execute(insert(MedicalRecord), records)
+            if history:
+                db.execute(insert(DiseaseHistory), history)
+            reindex_patients(db, patient_ids)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            raise BulkImportError(str(e), counts["patients"]) from e
+
+        counts["patients"] += len(patient_ids)
+        counts["medical_records"] += len(records)
+        counts["disease_history"] += len(history)
+
+    seconds = time.perf_counter() - started
+    return {
+        **counts,
+        "seconds": round(seconds, 3),
+        "rows_per_sec": round(counts["patients"] / seconds, 1) if seconds > 0 else None,
+    }
@@ -0,0 +1,280 @@
+# extraction.py
+# Structured extraction from long OCR text. The text is split into
+# token-budgeted chunks that fit the model's context window; each chunk is
+# sent to the LLM concurrently (bounded by a process-wide semaphore, with
+# retry and exponential backoff), its reply parsed and validated against
+# PatientExtraction, and the per-chunk results merged into one record.
+
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+import time
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from dotenv import load_dotenv
+from pydantic import ValidationError
+
+from llm import llm_client
+from metrics import record
+from schemas import PatientExtraction
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+# llama3-8b-8192: chunks leave room for the prompt template and the JSON reply
+EXTRACTION_CHUNK_TOKENS = int(os.getenv("EXTRACTION_CHUNK_TOKENS", "3000"))
+EXTRACTION_CHUNK_OVERLAP = int(os.getenv("EXTRACTION_CHUNK_OVERLAP", "150"))
+EXTRACTION_CONCURRENCY = int(os.getenv("EXTRACTION_CONCURRENCY", "4"))
+EXTRACTION_RETRIES = int(os.getenv("EXTRACTION_RETRIES", "3"))
+EXTRACTION_BACKOFF = float(os.getenv("EXTRACTION_BACKOFF", "0.5"))  # seconds, doubled per retry
+
+# No tokenizer ships with the app; OCR text runs shorter than English prose
+# per token, so ~3 characters per token errs on the side of smaller chunks.
+CHARS_PER_TOKEN = 3
+
+# How each field is merged across chunks
+LIST_FIELDS = {"allergies", "medications", "notable_conditions", "immunizations", "precautions"}
+TEXT_FIELDS = {"insights", "treatment"}
+
+PROMPT = """
+    Patient Name: {name}
+    Symptoms: {symptoms}
+    Extracted Medical Document (OCR), part {part} of {parts}:
+    {text}
+
+    Predicted Disease: {predicted_disease}
+
+    ✅ Your task:
+    Respond strictly in JSON format with keys:
+    - name, birth_date, weight, height, allergies, medications, insurance_provider, insurance_expiry
+    - notable_conditions, immunizations
+    - disease, insights, treatment, precautions
+    Use only this part of the document; use "" for anything it does not mention.
+    """
+
+
+class ExtractionError(Exception):
+    pass
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def split_into_chunks(text: str, max_tokens: int = EXTRACTION_CHUNK_TOKENS,
+                      overlap_tokens: int = EXTRACTION_CHUNK_OVERLAP) -> List[str]:
+    """Split on line boundaries into chunks of at most ``max_tokens``.
+
+    Consecutive chunks share ``overlap_tokens`` worth of trailing lines so a
+    field split across a boundary is seen whole by one of them. A single
+    line longer than the budget is cut on whitespace.
+    """
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    overlap_chars = overlap_tokens * CHARS_PER_TOKEN
+    lines = []
+    for line in text.splitlines(keepends=True):
+        while len(line) > max_chars:
+            cut = line.rfind(" ", 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            lines.append(line[:cut])
+            line = line[cut:]
+        lines.append(line)
+
+    chunks, current, size = [], [], 0
+    for line in lines:
+        if current and size + len(line) > max_chars:
+            chunks.append("".join(current))
+            # Carry the tail of this chunk over as overlap
+            carried, carried_size = [], 0
+            for previous in reversed(current):
+                if carried_size + len(previous) > overlap_chars:
+                    break
+                carried.insert(0, previous)
+                carried_size += len(previous)
+            current, size = carried, carried_size
+        current.append(line)
+        size += len(line)
+    if current and "".join(current).strip():
+        chunks.append("".join(current))
+    return chunks or [""]
+
+
+def parse_json_object(reply: str) -> dict:
+    """The first JSON object in an LLM reply, tolerating code fences, prose and // comments."""
+    start, end = reply.find("{"), reply.rfind("}")
+    if start < 0 or end <= start:
+        raise ExtractionError("No JSON object in reply")
+    candidate = reply[start:end + 1]
+    try:
+        return json.loads(candidate)
+    except json.JSONDecodeError:
+        pass
+    # Line comments outside strings, e.g. "medications": "x", // from page 2
+    stripped = re.sub(r'("(?:[^"\\]|\\.)*")|//[^\n]*', lambda m: m.group(1) or "", candidate)
+    stripped = re.sub(r",\s*([}\]])", r"\1", stripped)  # trailing commas
+    try:
+        return json.loads(stripped)
+    except json.JSONDecodeError as e:
+        raise ExtractionError(f"Invalid JSON in reply: {e}") from e
+
+
+def _split_items(value: str) -> List[str]:
+    return [item.strip() for item in re.split(r"[,;\n]", value) if item.strip()]
+
+
+def merge_extractions(parts: List[PatientExtraction]) -> PatientExtraction:
+    """Combine per-chunk extractions in document order.
+
+    List fields become the union of their items, free-text fields the
+    distinct non-empty texts joined, and single-valued fields take the value
+    most chunks agree on (the earliest one on a tie).
+    """
+    merged = {}
+    for name in PatientExtraction.model_fields:
+        values = [getattr(part, name) for part in parts if getattr(part, name)]
+        if name in LIST_FIELDS:
+            items = {}
+            for value in values:
+                for item in _split_items(value):
+                    items.setdefault(item.lower(), item)
+            merged[name] = ", ".join(items.values())
+        elif name in TEXT_FIELDS:
+            merged[name] = " ".join(dict.fromkeys(values))
+        else:
+            counts = Counter(values)
+            merged[name] = max(values, key=lambda v: (counts[v], -values.index(v))) if values else ""
+    return PatientExtraction(**merged)
+
+
+@dataclass
+class ChunkResult:
+    index: int
+    tokens: int
+    latency_ms: float = 0.0  # time in LLM calls, retries included
+    queued_ms: float = 0.0  # time waiting for the concurrency semaphore
+    attempts: int = 0
+    error: Optional[str] = None
+    reply: Optional[str] = None  # the LLM's raw answer, kept for failure reports
+    fields: Optional[PatientExtraction] = None
+
+
+@dataclass
+class ExtractionResult:
+    fields: Optional[PatientExtraction]
+    chunks: List[ChunkResult] = field(default_factory=list)
+    total_ms: float = 0.0
+
+    def report(self) -> dict:
+        return {
+            "chunks": len(self.chunks),
+            "failed_chunks": sum(1 for c in self.chunks if c.error),
+            "total_ms": round(self.total_ms, 1),
+            "chunk_latency_ms": [round(c.latency_ms, 1) for c in self.chunks],
+            "chunk_queued_ms": [round(c.queued_ms, 1) for c in self.chunks],
+            "attempts": [c.attempts for c in self.chunks],
+        }
+
+
+class ExtractionPipeline:
+    """Map-reduce extraction: chunk, extract each chunk concurrently, merge.
+
+    ``concurrency`` caps in-flight LLM calls across all documents in the
+    process. Failed calls are retried with exponential backoff and jitter; a
+    reply that doesn't parse is not retried, because the LLM client would
+    serve the same cached completion again.
+    """
+
+    def __init__(self, client=llm_client, chunk_tokens: int = EXTRACTION_CHUNK_TOKENS,
+                 overlap_tokens: int = EXTRACTION_CHUNK_OVERLAP, concurrency: int = EXTRACTION_CONCURRENCY,
+                 retries: int = EXTRACTION_RETRIES, backoff: float = EXTRACTION_BACKOFF, sleep=asyncio.sleep):
+        self.client = client
+        self.chunk_tokens = chunk_tokens
+        self.overlap_tokens = overlap_tokens
+        self.retries = retries
+        self.backoff = backoff
+        self.sleep = sleep
+        self.concurrency = max(1, concurrency)
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self.documents = 0
+        self.chunk_calls = 0
+        self.retried = 0
+        self.failed_chunks = 0
+        self.chunk_latency_ms = deque(maxlen=1000)
+
+    async def _call(self, prompt: str, chunk: ChunkResult) -> str:
+        for attempt in range(self.retries + 1):
+            chunk.attempts = attempt + 1
+            waiting = time.perf_counter()
+            try:
+                async with self._semaphore:
+                    started = time.perf_counter()
+                    chunk.queued_ms += (started - waiting) * 1000
+                    try:
+                        return await self.client.complete([{"role": "user", "content": prompt}])
+                    finally:
+                        chunk.latency_ms += (time.perf_counter() - started) * 1000
+            except Exception as e:
+                if attempt == self.retries:
+                    raise
+                self.retried += 1
+                delay = self.backoff * (2 ** attempt) * (1 + random.random())
+                logger.warning("LLM call for chunk %d failed (%s); retrying in %.2fs", chunk.index, e, delay)
+                await self.sleep(delay)
+
+    async def _extract_chunk(self, index: int, parts: int, text: str, context: dict) -> ChunkResult:
+        chunk = ChunkResult(index=index, tokens=estimate_tokens(text))
+        prompt = PROMPT.format(part=index + 1, parts=parts, text=text, **context)
+        try:
+            chunk.reply = await self._call(prompt, chunk)
+            chunk.fields = PatientExtraction.model_validate(parse_json_object(chunk.reply))
+        except (ExtractionError, ValidationError) as e:
+            chunk.error = str(e)
+        except Exception as e:
+            chunk.error = f"LLM call failed: {e}"
+        self.chunk_calls += 1
+        self.chunk_latency_ms.append(chunk.latency_ms)
+        record("llm_extract_chunk", chunk.latency_ms / 1000)
+        if chunk.error:
+            self.failed_chunks += 1
+        return chunk
+
+    async def extract(self, doc_text: str, name: str = "", symptoms: str = "",
+                      predicted_disease: str = "Unknown") -> ExtractionResult:
+        started = time.perf_counter()
+        texts = split_into_chunks(doc_text, self.chunk_tokens, self.overlap_tokens)
+        context = {"name": name, "symptoms": symptoms, "predicted_disease": predicted_disease}
+        chunks = await asyncio.gather(*(
+            self._extract_chunk(i, len(texts), text, context) for i, text in enumerate(texts)
+        ))
+        parsed = [c.fields for c in chunks if c.fields is not None]
+        result = ExtractionResult(
+            fields=merge_extractions(parsed) if parsed else None,
+            chunks=list(chunks),
+            total_ms=(time.perf_counter() - started) * 1000,
+        )
+        self.documents += 1
+        logger.info("Extracted %d chunks in %.1f ms (%d failed), per chunk: %s",
+                    len(chunks), result.total_ms, result.report()["failed_chunks"],
+                    result.report()["chunk_latency_ms"])
+        return result
+
+    def stats(self) -> dict:
+        latencies = sorted(self.chunk_latency_ms)
+        return {
+            "documents": self.documents,
+            "chunk_calls": self.chunk_calls,
+            "retried": self.retried,
+            "failed_chunks": self.failed_chunks,
+            "chunk_p50_ms": round(latencies[len(latencies) // 2], 1) if latencies else None,
+            "chunk_p95_ms": round(latencies[int(len(latencies) * 0.95)], 1) if latencies else None,
+            "chunk_tokens": self.chunk_tokens,
+            "concurrency": self.concurrency,
+        }
+
+
+extraction_pipeline = ExtractionPipeline()
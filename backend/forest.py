@@ -0,0 +1,89 @@
+import numpy as np
+
+
+def flatten_forest(model) -> dict:
+    """Flatten a fitted RandomForestClassifier into plain NumPy arrays.
+
+    All trees are concatenated into one node table. Leaves point to
+    themselves, so a traversal can run a fixed number of steps without
+    branching, and leaf values are stored already normalized the way
+    ``DecisionTreeClassifier.predict_proba`` normalizes them.
+    """
+    features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+    offset = 0
+    max_depth = 0
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        node_ids = np.arange(tree.node_count)
+        is_leaf = tree.children_left == -1
+
+        value = tree.value[:, 0, :].astype(np.float64)
+        normalizer = value.sum(axis=1, keepdims=True)
+        normalizer[normalizer == 0.0] = 1.0
+
+        features.append(np.where(is_leaf, 0, tree.feature))
+        thresholds.append(np.where(is_leaf, 0.0, tree.threshold))
+        lefts.append(np.where(is_leaf, node_ids, tree.children_left) + offset)
+        rights.append(np.where(is_leaf, node_ids, tree.children_right) + offset)
+        values.append(value / normalizer)
+        roots.append(offset)
+
+        offset += tree.node_count
+        max_depth = max(max_depth, tree.max_depth)
+
+    return {
+        "feature": np.concatenate(features).astype(np.int32),
+        "threshold": np.concatenate(thresholds).astype(np.float64),
+        "left": np.concatenate(lefts).astype(np.int32),
+        "right": np.concatenate(rights).astype(np.int32),
+        "value": np.concatenate(values),
+        "roots": np.asarray(roots, dtype=np.int32),
+        "max_depth": int(max_depth),
+        "classes": np.asarray(model.classes_),
+        "n_features": int(model.n_features_in_),
+    }
+
+
+class CompiledForest:
+    """Pure-NumPy evaluator for arrays produced by :func:`flatten_forest`.
+
+    Every tree is walked at once, one depth level per step. Leaf
+    probabilities are accumulated in tree order and divided by the number of
+    trees, mirroring sklearn, so results match ``model.predict_proba``.
+    """
+
+    def __init__(self, arrays: dict):
+        self.feature = arrays["feature"]
+        self.threshold = arrays["threshold"]
+        self.left = arrays["left"]
+        self.right = arrays["right"]
+        self.value = arrays["value"]
+        self.roots = arrays["roots"]
+        self.max_depth = arrays["max_depth"]
+        self.classes_ = arrays["classes"]
+        self.n_features = arrays["n_features"]
+        self._is_internal = self.left != np.arange(len(self.left))
+
+    def predict_proba(self, X) -> np.ndarray:
+        if hasattr(X, "toarray"):
+            X = X.toarray()
+        # sklearn trees compare float32 features against float64 thresholds
+        X = np.asarray(X, dtype=np.float32)
+        rows = np.arange(X.shape[0])[:, None]
+        node = np.repeat(self.roots[None, :], X.shape[0], axis=0)
+        for _ in range(self.max_depth):
+            if not self._is_internal[node].any():
+                break
+            go_left = X[rows, self.feature[node]] <= self.threshold[node]
+            node = np.where(go_left, self.left[node], self.right[node])
+
+        # One tree at a time, the same order sklearn adds them in; gathering every
+        # tree's leaf values at once would take rows x trees x classes memory
+        proba = np.zeros((X.shape[0], self.value.shape[1]), dtype=np.float64)
+        for tree in range(len(self.roots)):
+            proba += self.value[node[:, tree]]
+        proba /= len(self.roots)
+        return proba
+
+    def predict(self, X) -> np.ndarray:
+        return self.classes_.take(self.predict_proba(X).argmax(axis=1))
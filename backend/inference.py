@@ -0,0 +1,141 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from metrics import span
+from model_registry import ModelBundle, registry
+
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", "4096"))
+
+
+def normalize_symptoms(symptoms: Sequence[str]) -> List[str]:
+    return [s.strip().lower().replace(" ", "_") for s in symptoms if s.strip()]
+
+
+def _symptom_key(bundle: ModelBundle, symptoms: Sequence[str]) -> Tuple[int, ...]:
+    # Sorted encoder columns: order, duplicates and unknown symptoms don't change the vector
+    vocabulary = bundle.vocabulary
+    return tuple(sorted({vocabulary[s] for s in symptoms if s in vocabulary}))
+
+
+def _encode_keys(bundle: ModelBundle, keys: Sequence[Tuple[int, ...]]) -> csr_matrix:
+    indptr = [0]
+    indices = []
+    for key in keys:
+        indices.extend(key)
+        indptr.append(len(indices))
+    data = np.ones(len(indices), dtype=np.float32)
+    return csr_matrix((data, indices, indptr), shape=(len(keys), len(bundle.vocabulary)))
+
+
+def encode_symptoms(symptom_lists: Sequence[Sequence[str]], bundle: Optional[ModelBundle] = None) -> csr_matrix:
+    # Same columns as encoder.transform, built straight into CSR; unknown symptoms are ignored
+    bundle = bundle or registry.current()
+    return _encode_keys(bundle, [_symptom_key(bundle, symptoms) for symptoms in symptom_lists])
+
+
+class PredictionMemo:
+    """LRU of predict_proba rows keyed on the encoded symptom set.
+
+    The memo belongs to one model version and empties itself as soon as the
+    registry serves a different one.
+    """
+
+    def __init__(self, maxsize: int = PREDICTION_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._rows = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+
+    def lookup(self, version: str, keys: Sequence[tuple]) -> List:
+        with self._lock:
+            if version != self._version:
+                self._rows.clear()
+                self._version = version
+            found = []
+            for key in keys:
+                row = self._rows.get(key)
+                if row is None:
+                    self.misses += 1
+                else:
+                    self._rows.move_to_end(key)
+                    self.hits += 1
+                found.append(row)
+            return found
+
+    def store(self, version: str, keys: Sequence[tuple], rows: np.ndarray):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            if version != self._version:
+                return  # computed by a model that has since been swapped out
+            for key, row in zip(keys, rows):
+                row = row.copy()
+                row.flags.writeable = False
+                self._rows[key] = row
+                self._rows.move_to_end(key)
+            while len(self._rows) > self.maxsize:
+                self._rows.popitem(last=False)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "version": self._version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            "entries": len(self._rows),
+            "max_entries": self.maxsize,
+        }
+
+
+prediction_memo = PredictionMemo()
+
+
+def _predict_proba(bundle: ModelBundle, symptom_lists: Sequence[Sequence[str]]) -> np.ndarray:
+    keys = [_symptom_key(bundle, symptoms) for symptoms in symptom_lists]
+    rows = prediction_memo.lookup(bundle.version, keys)
+    missing = list(dict.fromkeys(key for key, row in zip(keys, rows) if row is None))
+    if missing:
+        with span("model_predict"):
+            computed = bundle.predictor.predict_proba(_encode_keys(bundle, missing))
+        prediction_memo.store(bundle.version, missing, computed)
+        by_key = dict(zip(missing, computed))
+        rows = [by_key[key] if row is None else row for key, row in zip(keys, rows)]
+    return np.vstack(rows) if rows else np.empty((0, len(bundle.classes_)))
+
+
+def predict_proba(symptom_lists: Sequence[Sequence[str]]) -> np.ndarray:
+    """predict_proba for many normalized symptom lists, answering repeats from the memo.
+
+    Only symptom sets not already memoized reach the forest, in a single call.
+    """
+    return _predict_proba(registry.current(), symptom_lists)
+
+
+def predict_batch(symptom_lists: Sequence[Sequence[str]]):
+    """Returns ``(diseases, probabilities)`` for many normalized symptom lists.
+
+    The argmax over ``predict_proba`` is exactly what
+    ``RandomForestClassifier.predict`` computes.
+    """
+    bundle = registry.current()
+    proba = _predict_proba(bundle, symptom_lists)
+    best = proba.argmax(axis=1)
+    return bundle.classes_.take(best), proba[np.arange(len(best)), best]
+
+
+def top_k(symptoms: Sequence[str], k: int) -> List[dict]:
+    bundle = registry.current()
+    proba = _predict_proba(bundle, [symptoms])[0]
+    order = np.argsort(-proba, kind="stable")[:k]  # ties keep argmax order
+    return [
+        {"disease": str(bundle.classes_[i]), "probability": float(proba[i])}
+        for i in order if proba[i] > 0
+    ]
@@ -0,0 +1,178 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Awaitable, Callable, List, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+INGEST_DB_PATH = os.getenv("INGEST_DB_PATH", "ingest_jobs.sqlite3")
+INGEST_UPLOAD_DIR = os.getenv("INGEST_UPLOAD_DIR", "uploads")
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+INGEST_POLL_INTERVAL = float(os.getenv("INGEST_POLL_INTERVAL", "0.5"))
+# Jobs left "running" longer than this (e.g. by a crashed worker) are picked up again
+INGEST_JOB_TIMEOUT = float(os.getenv("INGEST_JOB_TIMEOUT", "900"))
+# A job claimed this many times without finishing is failed instead of retried: it most
+# likely takes its worker down with it
+INGEST_MAX_ATTEMPTS = int(os.getenv("INGEST_MAX_ATTEMPTS", "3"))
+
+
+def remove_upload(path: Optional[str]):
+    if path:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+class JobQueue:
+    """Durable job queue on a local SQLite file, so no external broker is needed.
+
+    Claiming a job happens inside ``BEGIN IMMEDIATE`` so several API worker
+    processes can share the same queue file without double-processing.
+    """
+
+    def __init__(self, path: str = INGEST_DB_PATH, job_timeout: float = INGEST_JOB_TIMEOUT,
+                 max_attempts: int = INGEST_MAX_ATTEMPTS):
+        self.path = path
+        self.job_timeout = job_timeout
+        self.max_attempts = max(1, max_attempts)
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS ingest_jobs ("
+                " id TEXT PRIMARY KEY, status TEXT NOT NULL, payload TEXT NOT NULL,"
+                " upload_path TEXT, result TEXT, error TEXT, attempts INTEGER NOT NULL DEFAULT 0,"
+                " created_at REAL NOT NULL, started_at REAL, finished_at REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_ingest_jobs_status ON ingest_jobs (status, created_at)")
+            self._conn = conn
+        return self._conn
+
+    def enqueue(self, payload: dict, upload_path: Optional[str] = None, job_id: Optional[str] = None) -> str:
+        job_id = job_id or uuid.uuid4().hex
+        with self._lock:
+            self._connection().execute(
+                "INSERT INTO ingest_jobs (id, status, payload, upload_path, created_at) VALUES (?, 'queued', ?, ?, ?)",
+                (job_id, json.dumps(payload), upload_path, time.time()),
+            )
+        return job_id
+
+    def claim(self) -> Optional[dict]:
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                stale = now - self.job_timeout
+                abandoned = conn.execute(
+                    "SELECT id, upload_path FROM ingest_jobs WHERE status = 'running' AND started_at < ? AND attempts >= ?",
+                    (stale, self.max_attempts),
+                ).fetchall()
+                if abandoned:
+                    conn.execute(
+                        "UPDATE ingest_jobs SET status = 'failed', error = ?, finished_at = ?"
+                        " WHERE status = 'running' AND started_at < ? AND attempts >= ?",
+                        (f"Abandoned after {self.max_attempts} attempts that never finished", now,
+                         stale, self.max_attempts),
+                    )
+                row = conn.execute(
+                    "SELECT * FROM ingest_jobs WHERE status = 'queued'"
+                    " OR (status = 'running' AND started_at < ?)"
+                    " ORDER BY created_at LIMIT 1",
+                    (stale,),
+                ).fetchone()
+                if row is not None:
+                    conn.execute(
+                        "UPDATE ingest_jobs SET status = 'running', started_at = ?, attempts = attempts + 1"
+                        " WHERE id = ?",
+                        (now, row["id"]),
+                    )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        for job in abandoned:
+            logger.error("Ingest job %s abandoned after %d attempts", job["id"], self.max_attempts)
+            remove_upload(job["upload_path"])
+        return self._to_dict(row) if row is not None else None
+
+    def complete(self, job_id: str, result: dict):
+        self._finish(job_id, "done", result=json.dumps(result))
+
+    def fail(self, job_id: str, error: str):
+        self._finish(job_id, "failed", error=error)
+
+    def _finish(self, job_id: str, status: str, result: Optional[str] = None, error: Optional[str] = None):
+        with self._lock:
+            self._connection().execute(
+                "UPDATE ingest_jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ?",
+                (status, result, error, time.time(), job_id),
+            )
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._connection().execute("SELECT * FROM ingest_jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row is not None else None
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> dict:
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+
+class WorkerPool:
+    def __init__(self, queue: JobQueue, size: int = INGEST_WORKERS, poll_interval: float = INGEST_POLL_INTERVAL):
+        self.queue = queue
+        self.size = max(1, size)
+        self.poll_interval = poll_interval
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self, handler: Callable[[dict], Awaitable[dict]]):
+        if self._tasks:
+            return
+        self._tasks = [asyncio.create_task(self._run(handler)) for _ in range(self.size)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _run(self, handler: Callable[[dict], Awaitable[dict]]):
+        while True:
+            job = await asyncio.to_thread(self.queue.claim)
+            if job is None:
+                await asyncio.sleep(self.poll_interval)
+                continue
+            # On cancellation the job stays "running" with its upload intact and is
+            # re-claimed once INGEST_JOB_TIMEOUT passes, up to INGEST_MAX_ATTEMPTS times.
+            try:
+                result = await handler(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.exception("Ingest job %s failed", job["id"])
+                await asyncio.to_thread(self.queue.fail, job["id"], str(e))
+            else:
+                await asyncio.to_thread(self.queue.complete, job["id"], result)
+            await asyncio.to_thread(remove_upload, job["upload_path"])
+
+
+job_queue = JobQueue()
+ingest_workers = WorkerPool(job_queue)
@@ -0,0 +1,228 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict, deque
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from metrics import span
+
+load_dotenv()
+
+LLM_MODEL = os.getenv("LLM_MODEL", "llama3-8b-8192")
+LLM_BACKEND = os.getenv("LLM_BACKEND", "groq")  # "fake" runs fully offline
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "3600"))
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "1024"))
+
+Messages = List[Dict[str, str]]
+
+
+class GroqBackend:
+    def __init__(self, api_key: Optional[str] = None):
+        self.api_key = api_key
+        self._client = None
+
+    @property
+    def client(self):
+        # One AsyncGroq client, so its HTTP connection pool is shared by every call
+        if self._client is None:
+            from groq import AsyncGroq
+            self._client = AsyncGroq(api_key=self.api_key or os.getenv("GROQ_API_KEY"))
+        return self._client
+
+    async def complete(self, model: str, messages: Messages) -> str:
+        response = await self.client.chat.completions.create(model=model, messages=messages)
+        return response.choices[0].message.content
+
+    async def stream(self, model: str, messages: Messages) -> AsyncIterator[str]:
+        stream = await self.client.chat.completions.create(model=model, messages=messages, stream=True)
+        try:
+            async for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    yield delta
+        finally:
+            # Also runs when the consumer stops early, so Groq stops generating
+            await stream.close()
+
+
+class FakeLLMBackend:
+    """Deterministic offline stand-in for Groq, for tests and benchmarks.
+
+    ``reply`` may be a fixed string or a callable receiving the messages;
+    by default it answers with a JSON object carrying every key the app
+    asks the model for.
+    """
+
+    DEFAULT_REPLY = {
+        "name": "", "birth_date": "", "weight": "", "height": "", "allergies": "", "medications": "",
+        "insurance_provider": "", "insurance_expiry": "", "notable_conditions": "", "immunizations": "",
+        "disease": "", "insights": "", "treatment": "Rest and hydration", "precautions": "Monitor symptoms",
+        "tests": "Complete blood count",
+    }
+
+    def __init__(self, reply=None, latency: float = 0.0, token_latency: float = 0.0):
+        self.reply = reply
+        self.latency = latency
+        self.token_latency = token_latency
+        self.calls = 0
+
+    def _reply_for(self, messages: Messages) -> str:
+        if callable(self.reply):
+            return self.reply(messages)
+        if self.reply is not None:
+            return self.reply
+        return json.dumps(self.DEFAULT_REPLY)
+
+    async def complete(self, model: str, messages: Messages) -> str:
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._reply_for(messages)
+
+    async def stream(self, model: str, messages: Messages) -> AsyncIterator[str]:
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        reply = self._reply_for(messages)
+        # Word-sized "tokens", keeping whitespace so the joined stream equals the reply
+        start = 0
+        while start < len(reply):
+            end = reply.find(" ", start + 1)
+            end = len(reply) if end == -1 else end
+            if self.token_latency:
+                await asyncio.sleep(self.token_latency)
+            yield reply[start:end]
+            start = end
+
+
+def make_backend(name: str = LLM_BACKEND):
+    return FakeLLMBackend() if name == "fake" else GroqBackend()
+
+
+class LLMClient:
+    """Caching, request-coalescing front for a chat-completion backend.
+
+    Responses are cached for ``ttl`` seconds in an LRU keyed on a hash of the
+    model and whitespace-normalized messages. Identical requests that arrive
+    while the first is still in flight wait on that one upstream call.
+    """
+
+    def __init__(self, backend=None, ttl: float = LLM_CACHE_TTL, maxsize: int = LLM_CACHE_SIZE,
+                 clock: Callable[[], float] = time.monotonic):
+        self.backend = backend or make_backend()
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.clock = clock
+        self._cache = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.upstream_calls = 0
+        self.ttft_ms = deque(maxlen=1000)
+
+    @staticmethod
+    def cache_key(model: str, messages: Messages) -> str:
+        normalized = [
+            {"role": m["role"].strip().lower(), "content": " ".join(str(m["content"]).split())}
+            for m in messages
+        ]
+        payload = json.dumps({"model": model, "messages": normalized}, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _get(self, key: str) -> Optional[str]:
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        expires, text = entry
+        if expires <= self.clock():
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return text
+
+    def _put(self, key: str, text: str):
+        if self.maxsize <= 0 or self.ttl <= 0:
+            return
+        self._cache[key] = (self.clock() + self.ttl, text)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+
+    async def _fetch(self, key: str, model: str, messages: Messages) -> str:
+        try:
+            self.upstream_calls += 1
+            with span("llm"):
+                text = await self.backend.complete(model, messages)
+            self._put(key, text)
+            return text
+        finally:
+            self._inflight.pop(key, None)
+
+    async def complete(self, messages: Messages, model: str = LLM_MODEL) -> str:
+        key = self.cache_key(model, messages)
+        cached = self._get(key)
+        if cached is not None:
+            self.hits += 1
+            return cached
+        self.misses += 1
+
+        task = self._inflight.get(key)
+        if task is None:
+            # A separate task, so a cancelled caller doesn't cancel the call others wait on
+            task = asyncio.ensure_future(self._fetch(key, model, messages))
+            self._inflight[key] = task
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    async def stream(self, messages: Messages, model: str = LLM_MODEL) -> AsyncIterator[str]:
+        """Yield completion text as it is generated.
+
+        A cached completion is replayed as a single chunk; a freshly streamed
+        one is cached only if the stream ran to the end.
+        """
+        key = self.cache_key(model, messages)
+        cached = self._get(key)
+        if cached is not None:
+            self.hits += 1
+            yield cached
+            return
+        self.misses += 1
+        self.upstream_calls += 1
+
+        parts = []
+        upstream = self.backend.stream(model, messages)
+        try:
+            with span("llm_stream"):
+                async for delta in upstream:
+                    parts.append(delta)
+                    yield delta
+        finally:
+            await upstream.aclose()
+        self._put(key, "".join(parts))
+
+    def record_ttft(self, ms: float):
+        self.ttft_ms.append(ms)
+
+    def stats(self) -> dict:
+        ttft = sorted(self.ttft_ms)
+        return {
+            "stream_ttft_p50_ms": round(ttft[len(ttft) // 2], 1) if ttft else None,
+            "stream_ttft_p95_ms": round(ttft[int(len(ttft) * 0.95)], 1) if ttft else None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "upstream_calls": self.upstream_calls,
+            "entries": len(self._cache),
+            "in_flight": len(self._inflight),
+            "ttl_seconds": self.ttl,
+            "max_entries": self.maxsize,
+        }
+
+
+llm_client = LLMClient()
@@ -0,0 +1,137 @@
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+import httpx
+
+BASE_URL = "http://localhost:8000"
+CONCURRENCY = 50
+DURATION = 30.0
+
+SYMPTOMS = ["fever", "cough", "fatigue", "headache", "nausea", "dizziness"]
+MIXES = ["dashboard", "intake"]
+
+
+def fake_pdf() -> bytes:
+    # Only the bytes matter to a faked OCR engine; a real server would reject this
+    return b"%PDF-1.4\n% load test scan " + random.randbytes(16) + b"\n%%EOF\n"
+
+
+def endpoint_mix(hospital_id: int, patient_ids, mix: str = "dashboard"):
+    """Weighted (weight, name, request factory) tuples.
+
+    ``dashboard`` is the read-heavy traffic of doctors browsing patients;
+    ``intake`` adds document uploads (OCR + prediction + insert) on top.
+    """
+    requests = [
+        (5, "list_patients", lambda: ("GET", f"/patients/hospital/{hospital_id}", {"params": {"limit": 50}})),
+        (3, "get_records", lambda: ("GET", f"/patients/{random.choice(patient_ids)}/records", {})),
+        (2, "predict", lambda: (
+            "POST", "/ai/predict",
+            {"params": {"patient_id": random.choice(patient_ids)},
+             "json": {"symptoms": random.sample(SYMPTOMS, k=random.randint(1, 3))}},
+        )),
+    ]
+    if mix == "intake":
+        requests.append((2, "upload", lambda: (
+            "POST", "/patients/",
+            {"data": {"name": "Load Test", "age": random.randint(1, 90), "hospital_id": hospital_id,
+                      "symptoms": ", ".join(random.sample(SYMPTOMS, k=random.randint(1, 3)))},
+             "files": {"document": ("scan.pdf", fake_pdf(), "application/pdf")}},
+        )))
+    return requests
+
+
+async def worker(client, mix, deadline, latencies, errors):
+    weights = [weight for weight, _, _ in mix]
+    while time.perf_counter() < deadline:
+        _, name, build = random.choices(mix, weights=weights)[0]
+        method, path, kwargs = build()
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, path, **kwargs)
+            ok = response.status_code < 400
+        except httpx.HTTPError:
+            ok = False
+        latencies.setdefault(name, []).append((time.perf_counter() - started) * 1000)
+        if not ok:
+            errors[name] = errors.get(name, 0) + 1
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+async def login(client, email: str, password: str) -> int:
+    response = await client.post("/auth/login", json={"email": email, "password": password})
+    if response.status_code != 200:
+        raise SystemExit(f"Login as {email} failed: {response.status_code} {response.text}")
+    body = response.json()
+    client.headers["Authorization"] = f"Bearer {body['access_token']}"
+    return body["hospital_id"]
+
+
+def summarize(latencies, errors, elapsed: float, concurrency: int) -> dict:
+    total = sum(len(v) for v in latencies.values())
+    return {
+        "requests": total,
+        "seconds": round(elapsed, 2),
+        "concurrency": concurrency,
+        "throughput_rps": round(total / elapsed, 1),
+        "endpoints": {
+            name: {
+                "count": len(values),
+                "errors": errors.get(name, 0),
+                "rps": round(len(values) / elapsed, 1),
+                "mean_ms": round(statistics.fmean(values), 1),
+                "p50_ms": round(percentile(values, 0.50), 1),
+                "p95_ms": round(percentile(values, 0.95), 1),
+                "p99_ms": round(percentile(values, 0.99), 1),
+            }
+            for name, values in sorted(latencies.items())
+        },
+    }
+
+
+def report(summary: dict):
+    print(f"{summary['requests']} requests in {summary['seconds']:.1f}s with {summary['concurrency']} clients: "
+          f"{summary['throughput_rps']:.1f} req/s")
+    print(f"{'endpoint':<16}{'count':>8}{'errors':>8}{'mean':>10}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for name, e in summary["endpoints"].items():
+        print(f"{name:<16}{e['count']:>8}{e['errors']:>8}{e['mean_ms']:>9.1f}ms{e['p50_ms']:>8.1f}ms"
+              f"{e['p95_ms']:>8.1f}ms{e['p99_ms']:>8.1f}ms")
+
+
+async def run(base_url: str, email: str, password: str, concurrency: int, duration: float,
+              mix: str = "dashboard") -> dict:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        hospital_id = await login(client, email, password)
+        page = (await client.get(f"/patients/hospital/{hospital_id}", params={"limit": 200})).json()
+        patient_ids = [p["id"] for p in page["items"]]
+        if not patient_ids:
+            raise SystemExit(f"No patients in hospital {hospital_id}; run seed_patients.py first")
+
+        requests = endpoint_mix(hospital_id, patient_ids, mix)
+        latencies, errors = {}, {}
+        started = time.perf_counter()
+        deadline = started + duration
+        await asyncio.gather(*(worker(client, requests, deadline, latencies, errors) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return summarize(latencies, errors, elapsed, concurrency)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent load test against a running API")
+    parser.add_argument("--base-url", default=BASE_URL)
+    parser.add_argument("--email", required=True, help="hospital login; its patients are the ones exercised")
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    parser.add_argument("--duration", type=float, default=DURATION, help="seconds")
+    parser.add_argument("--mix", choices=MIXES, default="dashboard")
+    args = parser.parse_args()
+    report(asyncio.run(run(args.base_url, args.email, args.password, args.concurrency, args.duration, args.mix)))
@@ -1,10 +1,34 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
-from routers import auth, patient ,ai_assistant
-from database import engine
+from routers import auth, patient ,ai_assistant, disease_history
+from database import engine, async_engine
 from models import Base
+from migrations import run_migrations
+from ocr import ocr_engine
+from ingest_queue import ingest_workers
+from metrics import MetricsMiddleware, instrument_database, render_latest, stats_collector
+from llm import llm_client
+from ocr_cache import ocr_cache
+from inference import prediction_memo
+from timeline import timeline_cache
+from security import token_verifier
+from ratelimit import rate_limiter
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # ✅ Background workers for /patients/ingest uploads
+    ingest_workers.start(patient.process_ingest_job)
+    yield
+    await ingest_workers.stop()
+    # ✅ Stop OCR worker processes on shutdown
+    ocr_engine.shutdown()
+    # ✅ Close pooled database connections
+    await async_engine.dispose()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # ✅ Allow React frontend to access FastAPI backend
 app.add_middleware(
@@ -15,13 +39,32 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# ✅ Per-route and per-stage latency, served on /metrics
+app.add_middleware(MetricsMiddleware)
+instrument_database(engine, async_engine.sync_engine)
+stats_collector.caches.update({
+    "llm": llm_client,
+    "ocr": ocr_cache,
+    "prediction": prediction_memo,
+    "timeline": timeline_cache,
+    "token": token_verifier,
+})
+stats_collector.rate_limiter = rate_limiter
+
 # ✅ Create tables
 Base.metadata.create_all(bind=engine)
+run_migrations(engine)
 
 # ✅ Routers
 app.include_router(auth.router)
 app.include_router(patient.router)
 app.include_router(ai_assistant.router)
+app.include_router(disease_history.router)
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    body, content_type = render_latest()
+    return Response(content=body, media_type=content_type)
 
 @app.get("/")
 def root():
@@ -0,0 +1,177 @@
+# metrics.py
+# Prometheus metrics for the API: a latency histogram per route, a latency
+# histogram per processing stage (OCR rasterize/tesseract, model predict,
+# SQL, commits, LLM calls), and counters read from the in-process caches and
+# the rate limiter at scrape time. Stage timings are also summed per request,
+# so a slow request can be logged with where its time went.
+
+import contextlib
+import contextvars
+import logging
+import os
+import time
+from typing import Dict, Optional
+
+from dotenv import load_dotenv
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, REGISTRY, generate_latest
+from prometheus_client.core import CounterMetricFamily
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "0"))  # 0 disables the slow-request log
+
+_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ["method", "route", "status"], buckets=_BUCKETS
+)
+REQUESTS_IN_PROGRESS = Gauge("http_requests_in_progress", "HTTP requests currently being served")
+STAGE_SECONDS = Histogram(
+    "stage_duration_seconds", "Time spent in one processing stage", ["stage"], buckets=_BUCKETS
+)
+SLOW_REQUESTS = Counter("http_slow_requests_total", "Requests slower than SLOW_REQUEST_MS", ["route"])
+OCR_PAGES = Counter("ocr_pages_total", "Document pages by extraction path (text, ocr, blank)", ["path"])
+
+# Stage name -> seconds, for the request currently being served
+_request_stages: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar(
+    "request_stages", default=None
+)
+
+
+def record(stage: str, seconds: float):
+    STAGE_SECONDS.labels(stage).observe(seconds)
+    stages = _request_stages.get()
+    if stages is not None:
+        stages[stage] = stages.get(stage, 0.0) + seconds
+
+
+@contextlib.contextmanager
+def span(stage: str):
+    """Time the enclosed block as ``stage``; works around sync and async code alike."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - started)
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware: per-route latency, plus the optional slow-request log.
+
+    Requests are labelled with the matched route template (``/patients/{patient_id}``),
+    not the raw path, to keep label cardinality bounded.
+    """
+
+    def __init__(self, app, slow_request_ms: float = SLOW_REQUEST_MS):
+        self.app = app
+        self.slow_request_ms = slow_request_ms
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stages: Dict[str, float] = {}
+        token = _request_stages.set(stages)
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        REQUESTS_IN_PROGRESS.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            REQUESTS_IN_PROGRESS.dec()
+            elapsed = time.perf_counter() - started
+            _request_stages.reset(token)
+            route = getattr(scope.get("route"), "path", "unmatched")
+            REQUEST_SECONDS.labels(scope["method"], route, str(status)).observe(elapsed)
+            if self.slow_request_ms and elapsed * 1000 >= self.slow_request_ms:
+                SLOW_REQUESTS.labels(route).inc()
+                breakdown = ", ".join(f"{name} {seconds * 1000:.1f} ms" for name, seconds in
+                                      sorted(stages.items(), key=lambda item: -item[1]))
+                logger.warning("Slow request %s %s -> %d in %.1f ms (%s)", scope["method"], scope["path"],
+                               status, elapsed * 1000, breakdown or "no stages recorded")
+
+
+class StatsCollector:
+    """Exports hit/miss counters of the in-process caches and the rate limiter at scrape time."""
+
+    def __init__(self):
+        self.caches = {}
+        self.rate_limiter = None
+
+    def collect(self):
+        hits = CounterMetricFamily("cache_hits", "Cache hits", labels=["cache"])
+        misses = CounterMetricFamily("cache_misses", "Cache misses", labels=["cache"])
+        for name, cache in self.caches.items():
+            hits.add_metric([name], cache.hits)
+            misses.add_metric([name], cache.misses)
+        yield hits
+        yield misses
+
+        if self.rate_limiter is not None:
+            allowed = CounterMetricFamily("rate_limit_allowed", "Requests allowed per rate-limit rule", labels=["rule"])
+            rejected = CounterMetricFamily("rate_limit_rejected", "Requests rejected with 429 per rate-limit rule",
+                                           labels=["rule"])
+            stats = self.rate_limiter.stats()["rules"]
+            for rule, counts in stats.items():
+                allowed.add_metric([rule], counts["allowed"])
+                rejected.add_metric([rule], counts["rejected"])
+            yield allowed
+            yield rejected
+
+
+stats_collector = StatsCollector()
+REGISTRY.register(stats_collector)
+
+
+def instrument_database(*engines):
+    """Time every SQL statement as ``db_query`` and every session commit as ``db_commit``.
+
+    Pass sync engines; for an AsyncEngine use ``async_engine.sync_engine``.
+    """
+    for engine in engines:
+        @event.listens_for(engine, "before_cursor_execute")
+        def _before(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def _after(conn, cursor, statement, parameters, context, executemany):
+            record("db_query", time.perf_counter() - conn.info["query_started"].pop())
+
+        @event.listens_for(engine, "handle_error")
+        def _error(context):
+            started = context.connection.info.get("query_started") if context.connection is not None else None
+            if started:
+                started.pop()
+
+
+@event.listens_for(Session, "before_commit")
+def _commit_started(session):
+    session.info["commit_started"] = time.perf_counter()
+
+
+@event.listens_for(Session, "after_commit")
+def _commit_finished(session):
+    # Includes the final flush, so its statements count towards db_query too
+    started = session.info.pop("commit_started", None)
+    if started is not None:
+        record("db_commit", time.perf_counter() - started)
+
+
+@event.listens_for(Session, "after_rollback")
+def _commit_failed(session):
+    session.info.pop("commit_started", None)
+
+
+def render_latest():
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,132 @@
+# migrations.py
+# Ordered, idempotent schema changes for databases created before a model
+# change. Fresh databases get the same schema from Base.metadata.create_all;
+# every step here must therefore be safe to run against either.
+
+from datetime import datetime
+
+from sqlalchemy import Date, DateTime, Float, Integer, String, bindparam, column, inspect, select, table, text, update
+
+from database import engine
+from parsing import parse_date, parse_datetime, parse_number
+from search_index import create_index
+
+BACKFILL_BATCH_SIZE = 5000
+
+
+def _0001_foreign_key_indexes(conn):
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_patients_hospital_id_id ON patients (hospital_id, id)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_medical_records_patient_id ON medical_records (patient_id)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_disease_history_patient_id ON disease_history (patient_id)"))
+
+
+def _0002_patient_search_index(conn):
+    # Creates the full-text index and backfills it from existing patients and records
+    create_index(conn)
+
+
+def _retype_column(conn, table_name: str, name: str, type_, parse):
+    """Convert a String column to ``type_``, parsing each stored value with ``parse``.
+
+    Portable across SQLite and Postgres: the values are parsed in Python into
+    a staging column of the new type, a batch of ids at a time, which then
+    replaces the original. Values that don't parse become NULL.
+    """
+    staging = f"{name}_typed"
+    columns = {c["name"]: c["type"] for c in inspect(conn).get_columns(table_name)}
+    if name not in columns and staging in columns:
+        # Interrupted between the drop and the rename
+        conn.execute(text(f"ALTER TABLE {table_name} RENAME COLUMN {staging} TO {name}"))
+        return
+    if not isinstance(columns[name], String):
+        return  # Created typed by create_all
+    if staging in columns:
+        conn.execute(text(f"ALTER TABLE {table_name} DROP COLUMN {staging}"))
+    conn.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {staging} {type_.compile(dialect=conn.dialect)}"))
+
+    source = table(table_name, column("id", Integer), column(name, String), column(staging, type_))
+    fill = update(source).where(source.c.id == bindparam("row_id")).values({staging: bindparam("value", type_=type_)})
+    last_id, converted, unparsed = 0, 0, 0
+    while True:
+        rows = conn.execute(
+            select(source.c.id, source.c[name])
+            .where(source.c.id > last_id, source.c[name].is_not(None))
+            .order_by(source.c.id)
+            .limit(BACKFILL_BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        values = [{"row_id": row_id, "value": parse(raw)} for row_id, raw in rows]
+        parsed = [v for v in values if v["value"] is not None]
+        if parsed:
+            conn.execute(fill, parsed)
+        converted += len(parsed)
+        unparsed += len(values) - len(parsed)
+        last_id = rows[-1][0]
+
+    conn.execute(text(f"ALTER TABLE {table_name} DROP COLUMN {name}"))
+    conn.execute(text(f"ALTER TABLE {table_name} RENAME COLUMN {staging} TO {name}"))
+    print(f"   {table_name}.{name}: {converted} values converted, {unparsed} blank or unreadable left NULL")
+
+
+def _0003_typed_temporal_columns(conn):
+    # Indexes on the columns being replaced have to go before the columns can
+    for index in ("ix_medical_records_patient_id_visit_date", "ix_disease_history_patient_id_created_at"):
+        conn.execute(text(f"DROP INDEX IF EXISTS {index}"))
+
+    _retype_column(conn, "patients", "dob", Date(), parse_date)
+    for table_name in ("patients", "medical_records"):
+        _retype_column(conn, table_name, "weight", Float(), parse_number)
+        _retype_column(conn, table_name, "height", Float(), parse_number)
+    _retype_column(conn, "medical_records", "visit_date", DateTime(), parse_datetime)
+    _retype_column(conn, "disease_history", "created_at", DateTime(), parse_datetime)
+
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_medical_records_patient_id_visit_date ON medical_records (patient_id, visit_date)"
+    ))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_disease_history_patient_id_created_at ON disease_history (patient_id, created_at)"
+    ))
+    # patient_id alone is now the leading column of the composite indexes
+    conn.execute(text("DROP INDEX IF EXISTS ix_medical_records_patient_id"))
+    conn.execute(text("DROP INDEX IF EXISTS ix_disease_history_patient_id"))
+
+
+def _0004_typed_consent_timestamps(conn):
+    migrated_at = datetime.now()
+    _retype_column(conn, "patient_consents", "granted_at", DateTime(), parse_datetime)
+    # NULL means the consent is active, so an unreadable revocation must stay a revocation
+    _retype_column(conn, "patient_consents", "revoked_at", DateTime(),
+                   lambda value: parse_datetime(value) or migrated_at)
+
+
+MIGRATIONS = [
+    ("0001_foreign_key_indexes", _0001_foreign_key_indexes),
+    ("0002_patient_search_index", _0002_patient_search_index),
+    ("0003_typed_temporal_columns", _0003_typed_temporal_columns),
+    ("0004_typed_consent_timestamps", _0004_typed_consent_timestamps),
+]
+
+
+def run_migrations(bind=engine):
+    with bind.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations (version VARCHAR PRIMARY KEY, applied_at VARCHAR)"
+        ))
+        applied = {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+    for version, migrate in MIGRATIONS:
+        if version in applied:
+            continue
+        # Each migration commits together with its schema_migrations row
+        with bind.begin() as conn:
+            migrate(conn)
+            conn.execute(
+                text("INSERT INTO schema_migrations (version, applied_at) VALUES (:version, :applied_at)"),
+                {"version": version, "applied_at": datetime.now().isoformat()},
+            )
+        print(f"✅ Applied migration {version}")
+
+
+if __name__ == "__main__":
+    run_migrations()
@@ -0,0 +1,220 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Optional, Tuple
+
+import joblib
+from dotenv import load_dotenv
+
+from forest import CompiledForest
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+# Versioned layout: MODEL_DIR/<version>/{disease_model,symptom_encoder,disease_forest}.pkl
+# plus MODEL_DIR/CURRENT naming the active version. Without CURRENT the registry
+# falls back to the legacy pickles in the working directory.
+MODEL_DIR = os.getenv("MODEL_DIR", "models")
+MODEL_POLL_INTERVAL = float(os.getenv("MODEL_POLL_INTERVAL", "5"))
+# train_model.py verifies checksums when it publishes a version; re-hashing on every load is opt-in
+MODEL_VERIFY_CHECKSUMS = os.getenv("MODEL_VERIFY_CHECKSUMS", "false").lower() in ("1", "true", "yes")
+MODEL_LOAD_ATTEMPTS = 3
+
+MODEL_FILE = "disease_model.pkl"
+ENCODER_FILE = "symptom_encoder.pkl"
+FOREST_FILE = "disease_forest.pkl"
+MANIFEST_FILE = "manifest.json"  # written by train_model.py: checksums, metrics, timings
+
+
+@dataclass
+class ModelBundle:
+    version: str
+    path: str
+    encoder: object
+    forest: Optional[CompiledForest]
+    load_ms: float
+    vocabulary: dict = field(default_factory=dict)
+    _model: object = None
+    _model_lock: threading.Lock = field(default_factory=threading.Lock)
+
+    @property
+    def model(self):
+        # The full sklearn forest is only unpickled if something actually needs it
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    self._model = joblib.load(os.path.join(self.path, MODEL_FILE), mmap_mode="r")
+        return self._model
+
+    @property
+    def predictor(self):
+        return self.forest or self.model
+
+    @property
+    def classes_(self):
+        return self.predictor.classes_
+
+
+class ModelRegistry:
+    """Lazily loads the disease model and hot-swaps new versions.
+
+    Arrays are memory-mapped (``mmap_mode="r"``), so every worker process on a
+    host shares the same page-cache copy. A new version is loaded on a
+    background thread while requests keep using the old bundle; the swap is a
+    single reference assignment.
+    """
+
+    def __init__(self, model_dir: str = MODEL_DIR, legacy_dir: str = ".", poll_interval: float = MODEL_POLL_INTERVAL):
+        self.model_dir = model_dir
+        self.legacy_dir = legacy_dir
+        self.poll_interval = poll_interval
+        self._bundle: Optional[ModelBundle] = None
+        self._lock = threading.Lock()
+        self._loading = False
+        self._last_check = 0.0
+
+    def _resolve(self) -> Tuple[str, str]:
+        pointer = os.path.join(self.model_dir, "CURRENT")
+        if os.path.exists(pointer):
+            with open(pointer) as f:
+                version = f.read().strip()
+            return version, os.path.join(self.model_dir, version)
+        return _legacy_version(self.legacy_dir), self.legacy_dir
+
+    def _load(self, version: str, path: str) -> ModelBundle:
+        for attempt in range(MODEL_LOAD_ATTEMPTS):
+            bundle = self._load_bundle(version, path)
+            if path != self.legacy_dir:
+                return bundle  # Published versions are immutable
+            # Legacy pickles are rewritten in place; only accept a load none of them changed during
+            reloaded = _legacy_version(path)
+            if reloaded == version:
+                return bundle
+            logger.warning("Legacy model files changed while loading; retrying")
+            version = reloaded
+            time.sleep(0.5 * (attempt + 1))
+        raise RuntimeError(f"Legacy model files in {path} kept changing while being loaded")
+
+    @staticmethod
+    def _load_bundle(version: str, path: str) -> ModelBundle:
+        started = time.perf_counter()
+        verify_artifacts(path, checksums=MODEL_VERIFY_CHECKSUMS)
+        encoder = joblib.load(os.path.join(path, ENCODER_FILE))
+        forest_path = os.path.join(path, FOREST_FILE)
+        forest = CompiledForest(joblib.load(forest_path, mmap_mode="r")) if os.path.exists(forest_path) else None
+        bundle = ModelBundle(
+            version=version,
+            path=path,
+            encoder=encoder,
+            forest=forest,
+            load_ms=(time.perf_counter() - started) * 1000,
+            vocabulary={symptom: col for col, symptom in enumerate(encoder.classes_)},
+        )
+        if forest is None:
+            # No compiled forest: load sklearn now rather than on the first request
+            _ = bundle.model
+        logger.info("Loaded model version %s from %s in %.1f ms", version, path, bundle.load_ms)
+        return bundle
+
+    def current(self) -> ModelBundle:
+        bundle = self._bundle
+        if bundle is None:
+            with self._lock:
+                if self._bundle is None:
+                    self._bundle = self._load(*self._resolve())
+                    self._last_check = time.monotonic()
+                return self._bundle
+        if time.monotonic() - self._last_check >= self.poll_interval:
+            self._check_for_update()
+        return bundle
+
+    def _check_for_update(self):
+        with self._lock:
+            if self._loading or time.monotonic() - self._last_check < self.poll_interval:
+                return
+            self._last_check = time.monotonic()
+            try:
+                version, path = self._resolve()
+            except OSError:
+                return
+            if version == self._bundle.version:
+                return
+            self._loading = True
+        threading.Thread(target=self._swap, args=(version, path), daemon=True).start()
+
+    def _swap(self, version: str, path: str):
+        try:
+            new_bundle = self._load(version, path)
+            self._bundle = new_bundle
+        except Exception:
+            logger.exception("Failed to load model version %s; keeping %s", version, self._bundle.version)
+        finally:
+            with self._lock:
+                self._loading = False
+
+    def info(self) -> dict:
+        bundle = self._bundle
+        return {
+            "loaded": bundle is not None,
+            "version": bundle.version if bundle else None,
+            "load_ms": round(bundle.load_ms, 1) if bundle else None,
+            "compiled_forest": bool(bundle and bundle.forest is not None),
+            "rss_mb": _rss_mb(),
+        }
+
+
+def _legacy_version(path: str) -> str:
+    # Every pickle counts: a rewrite of any one of them is a new version
+    parts = []
+    for name in (MODEL_FILE, ENCODER_FILE, FOREST_FILE):
+        try:
+            stat = os.stat(os.path.join(path, name))
+        except FileNotFoundError:
+            if name == FOREST_FILE:
+                continue
+            raise
+        parts.append(f"{stat.st_mtime_ns}:{stat.st_size}")
+    return "legacy-" + hashlib.sha256("|".join(parts).encode()).hexdigest()[:12]
+
+
+def verify_artifacts(path: str, checksums: bool = True):
+    """Check every file listed in the version's manifest against it.
+
+    Sizes are always compared; sha256 digests only with ``checksums``, since
+    train_model.py already verified them when it published the version.
+    Raises ValueError on a mismatch, so a truncated or tampered version is
+    never swapped in. Legacy directories without a manifest are not checked.
+    """
+    manifest_path = os.path.join(path, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return
+    with open(manifest_path) as f:
+        files = json.load(f).get("files", {})
+    for name, expected in files.items():
+        file_path = os.path.join(path, name)
+        if "bytes" in expected and os.path.getsize(file_path) != expected["bytes"]:
+            raise ValueError(f"Size mismatch for {name} in {path}")
+        if not checksums:
+            continue
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        if digest.hexdigest() != expected["sha256"]:
+            raise ValueError(f"Checksum mismatch for {name} in {path}")
+
+
+def _rss_mb() -> Optional[float]:
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return round(resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024), 1)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+registry = ModelRegistry()
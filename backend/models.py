@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey
+from sqlalchemy import Column, Date, DateTime, Float, Integer, String, ForeignKey, Index, UniqueConstraint
 from database import Base
 from sqlalchemy.orm import relationship
 
@@ -19,15 +19,19 @@ class Patient(Base):
     name = Column(String)
     age = Column(Integer)
     contact = Column(String)
-    dob = Column(String)
+    dob = Column(Date)
     symptoms = Column(String)
     allergies = Column(String)  # ✅ New
     previous_diseases = Column(String)  # ✅ New
-    weight = Column(String)  # ✅ New
-    height = Column(String)  # ✅ New
+    weight = Column(Float)  # ✅ kg
+    height = Column(Float)  # ✅ cm
     medical_summary = Column(String)
     hospital_id = Column(Integer, ForeignKey("hospitals.id"))
     medications = Column(String) 
+
+    # ✅ Keyset pagination of a hospital's patients: WHERE hospital_id = ? AND id > ? ORDER BY id
+    __table_args__ = (Index("ix_patients_hospital_id_id", "hospital_id", "id"),)
+
     medical_records = relationship(
     "MedicalRecord",
     back_populates="patient",
@@ -51,12 +55,15 @@ class MedicalRecord(Base):
     patient_id = Column(Integer, ForeignKey("patients.id", ondelete="CASCADE"))
     symptoms = Column(String)
     document_summary = Column(String)
-    visit_date = Column(String)
+    visit_date = Column(DateTime)
     allergies = Column(String)
     previous_diseases = Column(String)
     medications = Column(String)
-    weight = Column(String)
-    height = Column(String)
+    weight = Column(Float)
+    height = Column(Float)
+
+    # ✅ A patient's records in a date range: index range scan, already in visit order
+    __table_args__ = (Index("ix_medical_records_patient_id_visit_date", "patient_id", "visit_date"),)
 
     patient = relationship("Patient", back_populates="medical_records")
 
@@ -67,9 +74,12 @@ class DiseaseHistory(Base):
     patient_id = Column(Integer, ForeignKey("patients.id", ondelete="CASCADE"))
     symptoms = Column(String)
     predicted_disease = Column(String)
-    created_at = Column(String)  # Can store timestamp string or use DateTime
+    created_at = Column(DateTime)
+
+    __table_args__ = (Index("ix_disease_history_patient_id_created_at", "patient_id", "created_at"),)
 
     patient = relationship("Patient", back_populates="disease_history")
+    treatment_plans = relationship("TreatmentPlan", back_populates="disease")
 class TreatmentPlan(Base):
     __tablename__ = "treatment_plans"
     id = Column(Integer, primary_key=True, index=True)
@@ -78,3 +88,30 @@ class TreatmentPlan(Base):
     medication = Column(String)
     tests = Column(String)
     precaution = Column(String)
+
+    disease = relationship("DiseaseHistory", back_populates="treatment_plans")
+
+class PatientConsent(Base):
+    """A patient's permission for another hospital to see their records.
+
+    ``patient_id`` is the record being shared; ``linked_patient_id`` is the same
+    person's record at the receiving hospital, whose timeline then includes it.
+    Revoking sets ``revoked_at`` rather than deleting the row.
+    """
+    __tablename__ = "patient_consents"
+
+    id = Column(Integer, primary_key=True, index=True)
+    patient_id = Column(Integer, ForeignKey("patients.id", ondelete="CASCADE"), nullable=False)
+    hospital_id = Column(Integer, ForeignKey("hospitals.id"), nullable=False)
+    linked_patient_id = Column(Integer, ForeignKey("patients.id", ondelete="CASCADE"), index=True)
+    granted_at = Column(DateTime)
+    revoked_at = Column(DateTime)
+
+    __table_args__ = (UniqueConstraint("patient_id", "hospital_id", name="uq_patient_consents_patient_hospital"),)
+
+class UsedRefreshToken(Base):
+    """A refresh token that has been exchanged; shared by every worker so each works once."""
+    __tablename__ = "used_refresh_tokens"
+
+    jti = Column(String, primary_key=True)
+    expires_at = Column(Integer, index=True)  # the token's exp claim, Unix seconds
@@ -0,0 +1,235 @@
+import asyncio
+import hashlib
+import logging
+import os
+import subprocess
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pytesseract
+from pdf2image import convert_from_path, pdfinfo_from_path
+from dotenv import load_dotenv
+from ocr_cache import ocr_cache
+from metrics import OCR_PAGES, record
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+OCR_POOL_SIZE = int(os.getenv("OCR_POOL_SIZE", os.cpu_count() or 2))
+OCR_PAGE_CONCURRENCY = int(os.getenv("OCR_PAGE_CONCURRENCY", "4"))
+OCR_DPI = int(os.getenv("OCR_DPI", "200"))
+OCR_LANG = os.getenv("OCR_LANG", "eng")
+OCR_SPOOL_DIR = os.getenv("OCR_SPOOL_DIR") or None  # None = the system temp dir
+# A page whose embedded text has at least this many letters/digits skips OCR
+OCR_MIN_TEXT_CHARS = int(os.getenv("OCR_MIN_TEXT_CHARS", "32"))
+# A rasterized page with less than this fraction of dark pixels is treated as blank
+OCR_BLANK_INK_RATIO = float(os.getenv("OCR_BLANK_INK_RATIO", "0.002"))
+# Bumped whenever the pipeline changes what text comes out, so stale cache entries stop matching
+OCR_PIPELINE_VERSION = 2
+
+
+@dataclass
+class PageResult:
+    page: int
+    text: str
+    raster_ms: float
+    ocr_ms: float
+    path: str = "ocr"  # "text": embedded text layer, "ocr": Tesseract, "blank": nothing on the page
+
+
+@dataclass
+class OcrResult:
+    text: str
+    pages: List[PageResult]
+    total_ms: float
+    cached: bool = False
+    text_layer_ms: float = 0.0
+
+    @property
+    def page_timings(self) -> List[dict]:
+        return [
+            {"page": p.page, "path": p.path, "raster_ms": round(p.raster_ms, 1), "ocr_ms": round(p.ocr_ms, 1)}
+            for p in self.pages
+        ]
+
+    @property
+    def path_counts(self) -> dict:
+        return dict(Counter(p.path for p in self.pages))
+
+
+def has_usable_text(text: str, min_chars: int = OCR_MIN_TEXT_CHARS) -> bool:
+    return sum(c.isalnum() for c in text) >= min_chars
+
+
+def otsu_threshold(histogram) -> int:
+    """Grey level that best separates ink from paper (Otsu's method), from a 256-bin histogram."""
+    histogram = np.asarray(histogram, dtype=np.float64)
+    levels = np.arange(256)
+    weight_dark = np.cumsum(histogram)
+    weight_light = weight_dark[-1] - weight_dark
+    sum_dark = np.cumsum(histogram * levels)
+    mean_dark = sum_dark / np.maximum(weight_dark, 1)
+    mean_light = (sum_dark[-1] - sum_dark) / np.maximum(weight_light, 1)
+    between = weight_dark * weight_light * (mean_dark - mean_light) ** 2
+    return int(np.argmax(between))
+
+
+def preprocess(image, blank_ink_ratio: float = OCR_BLANK_INK_RATIO):
+    """Grayscale + Otsu binarization; returns None for a blank page."""
+    gray_image = image.convert("L")
+    # PIL's histogram, not np.bincount, which would first copy the page to int64
+    threshold = otsu_threshold(gray_image.histogram())
+    gray = np.asarray(gray_image)
+    ink = gray <= threshold
+    # A near-white scan still gets an Otsu split, so also require some genuinely dark pixels
+    if ink.mean() < blank_ink_ratio or (gray < 128).mean() < blank_ink_ratio:
+        return None
+    from PIL import Image
+    # uint8 scalars keep the result uint8; plain ints would make an int64 copy of the page
+    return Image.fromarray(np.where(ink, np.uint8(0), np.uint8(255)))
+
+
+def sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# Worker-side functions: must stay at module level so the process pool can pickle them.
+# They take the path of the spooled PDF, so no task ships the document bytes to a worker.
+def _page_count(path: str) -> int:
+    return int(pdfinfo_from_path(path)["Pages"])
+
+
+def _text_layer(path: str) -> List[str]:
+    """Embedded text of every page via poppler's pdftotext; [] if it can't be read."""
+    try:
+        out = subprocess.run(["pdftotext", "-layout", "-enc", "UTF-8", path, "-"],
+                             capture_output=True, timeout=120, check=True).stdout
+    except (OSError, subprocess.SubprocessError):
+        return []
+    # One form feed after every page
+    return out.decode("utf-8", errors="replace").split("\f")[:-1]
+
+
+def _inspect(path: str) -> Tuple[int, List[str], float]:
+    started = time.perf_counter()
+    texts = _text_layer(path)
+    return _page_count(path), texts, (time.perf_counter() - started) * 1000
+
+
+def _ocr_page(path: str, page: int, dpi: int, lang: str) -> PageResult:
+    # Exactly one page is rasterized per task and its buffers are released before
+    # returning, so a worker's memory doesn't grow with the document's page count
+    started = time.perf_counter()
+    images = convert_from_path(path, dpi=dpi, first_page=page, last_page=page, grayscale=True)
+    prepared = []
+    try:
+        for image in images:
+            binarized = preprocess(image)
+            image.close()
+            if binarized is not None:
+                prepared.append(binarized)
+        rasterized = time.perf_counter()
+        if not prepared:
+            return PageResult(page=page, text="", raster_ms=(rasterized - started) * 1000, ocr_ms=0.0, path="blank")
+        text = "".join(pytesseract.image_to_string(img, lang=lang) for img in prepared)
+    finally:
+        for image in prepared:
+            image.close()
+    finished = time.perf_counter()
+    return PageResult(
+        page=page,
+        text=text,
+        raster_ms=(rasterized - started) * 1000,
+        ocr_ms=(finished - rasterized) * 1000,
+    )
+
+
+class OcrEngine:
+    """Extracts PDF text in a shared, bounded process pool.
+
+    Pages with an embedded text layer (digitally generated reports) are read
+    directly with pdftotext; only the rest are rasterized in grayscale,
+    binarized and OCR'd, and blank ones skip Tesseract entirely. The pool
+    size caps work across all requests; ``page_concurrency`` caps how many
+    pages of a single document are in flight at once, so one long scan
+    cannot monopolise the pool.
+    """
+
+    def __init__(self, pool_size: int = OCR_POOL_SIZE, page_concurrency: int = OCR_PAGE_CONCURRENCY,
+                 dpi: int = OCR_DPI, lang: str = OCR_LANG, cache=ocr_cache):
+        self.pool_size = max(1, pool_size)
+        self.page_concurrency = max(1, page_concurrency)
+        self.dpi = dpi
+        self.lang = lang
+        self.cache = cache
+        self._executor = None
+
+    def settings(self) -> dict:
+        # Anything that changes the OCR output must be part of the cache key
+        return {"dpi": self.dpi, "lang": self.lang, "pipeline": OCR_PIPELINE_VERSION,
+                "min_text_chars": OCR_MIN_TEXT_CHARS, "blank_ink_ratio": OCR_BLANK_INK_RATIO}
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.pool_size)
+        return self._executor
+
+    async def extract_file(self, path: str, digest: Optional[str] = None) -> OcrResult:
+        """OCR the PDF at ``path``; ``digest`` is its sha256 if the caller already computed it."""
+        started = time.perf_counter()
+        cache_key = None
+        if self.cache is not None:
+            digest = digest or await asyncio.to_thread(sha256_file, path)
+            cache_key = self.cache.make_key(digest, self.settings())
+            cached_text = await asyncio.to_thread(self.cache.get, cache_key)
+            if cached_text is not None:
+                return OcrResult(text=cached_text, pages=[], total_ms=(time.perf_counter() - started) * 1000,
+                                 cached=True)
+
+        loop = asyncio.get_running_loop()
+        pool = self._pool()
+        page_count, texts, text_layer_ms = await loop.run_in_executor(pool, _inspect, path)
+        semaphore = asyncio.Semaphore(self.page_concurrency)
+
+        async def run_page(page: int) -> PageResult:
+            embedded = texts[page - 1] if page <= len(texts) else ""
+            if has_usable_text(embedded):
+                return PageResult(page=page, text=embedded, raster_ms=0.0, ocr_ms=0.0, path="text")
+            async with semaphore:
+                return await loop.run_in_executor(pool, _ocr_page, path, page, self.dpi, self.lang)
+
+        # gather() preserves argument order, so pages come back in document order
+        pages = await asyncio.gather(*(run_page(p) for p in range(1, page_count + 1)))
+        result = OcrResult(
+            text="".join(page.text for page in pages),
+            pages=list(pages),
+            total_ms=(time.perf_counter() - started) * 1000,
+            text_layer_ms=text_layer_ms,
+        )
+        # Summed over pages: the CPU time each stage cost, not its share of wall time
+        record("ocr_text_layer", text_layer_ms / 1000)
+        record("ocr_rasterize", sum(p.raster_ms for p in pages) / 1000)
+        record("ocr_tesseract", sum(p.ocr_ms for p in pages) / 1000)
+        for path, count in result.path_counts.items():
+            OCR_PAGES.labels(path).inc(count)
+        if cache_key is not None:
+            await asyncio.to_thread(self.cache.put, cache_key, result.text)
+        logger.info("OCR finished: %d pages in %.1f ms (%s; text layer %.1f ms), per page: %s",
+                    page_count, result.total_ms, result.path_counts, text_layer_ms, result.page_timings)
+        return result
+
+    def shutdown(self, wait: bool = False):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
+
+
+ocr_engine = OcrEngine()
@@ -0,0 +1,108 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+OCR_CACHE_PATH = os.getenv("OCR_CACHE_PATH", "ocr_cache.sqlite3")
+OCR_CACHE_MAX_BYTES = int(os.getenv("OCR_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+
+class OcrCache:
+    """Persistent OCR text cache keyed by document hash + OCR settings.
+
+    Entries live in a local SQLite file shared by all workers on the host and
+    are evicted least-recently-used first once the stored text exceeds
+    ``max_bytes``. Hit/miss counters are per process.
+    """
+
+    def __init__(self, path: str = OCR_CACHE_PATH, max_bytes: int = OCR_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS ocr_cache ("
+                " key TEXT PRIMARY KEY, text TEXT NOT NULL,"
+                " size INTEGER NOT NULL, last_access REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_ocr_cache_last_access ON ocr_cache (last_access)")
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def make_key(digest: str, settings: dict) -> str:
+        settings_part = json.dumps(settings, sort_keys=True)
+        return hashlib.sha256(f"{digest}:{settings_part}".encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute("SELECT text FROM ocr_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            conn.execute("UPDATE ocr_cache SET last_access = ? WHERE key = ?", (time.time(), key))
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, text: str):
+        size = len(text.encode("utf-8"))
+        if self.max_bytes <= 0 or size > self.max_bytes:
+            return
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    "INSERT OR REPLACE INTO ocr_cache (key, text, size, last_access) VALUES (?, ?, ?, ?)",
+                    (key, text, size, time.time()),
+                )
+                self._evict(conn)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def _evict(self, conn: sqlite3.Connection):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM ocr_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        stale = []
+        for key, size in conn.execute("SELECT key, size FROM ocr_cache ORDER BY last_access ASC"):
+            if total <= self.max_bytes:
+                break
+            stale.append((key,))
+            total -= size
+        conn.executemany("DELETE FROM ocr_cache WHERE key = ?", stale)
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, stored = self._connection().execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM ocr_cache"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            "entries": entries,
+            "bytes": stored,
+            "max_bytes": self.max_bytes,
+        }
+
+
+ocr_cache = OcrCache()
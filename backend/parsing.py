@@ -0,0 +1,58 @@
+# parsing.py
+# Lenient parsers for the date and measurement values that arrive as free
+# text: form fields, bulk-import rows, the frontend's ISO timestamps and the
+# strings older databases stored before these columns were typed. Anything
+# that can't be read as the target type becomes None.
+
+import re
+from datetime import date, datetime
+from typing import Optional
+
+# Tried after datetime.fromisoformat, which covers "2024-05-01", "2024-05-01 13:45",
+# str(datetime.now()) and toISOString()'s "2024-05-01T13:45:00.000Z"
+DATE_FORMATS = ["%d/%m/%Y", "%d-%m-%Y", "%d.%m.%Y", "%Y/%m/%d", "%b %d, %Y", "%B %d, %Y", "%d %b %Y", "%d %B %Y"]
+
+# A number with an optional unit: "72", "72.5 kg", "180cm"; units are not converted
+_MEASUREMENT = re.compile(r"\s*([0-9]+(?:\.[0-9]+)?)\s*[a-zA-Z.]*\s*")
+
+
+def parse_datetime(value) -> Optional[datetime]:
+    """A naive local datetime; timezone-aware input is converted to local time."""
+    if value is None or isinstance(value, datetime):
+        parsed = value
+    elif isinstance(value, date):
+        parsed = datetime(value.year, value.month, value.day)
+    else:
+        text = str(value).strip()
+        if not text:
+            return None
+        try:
+            parsed = datetime.fromisoformat(text)
+        except ValueError:
+            parsed = None
+            for fmt in DATE_FORMATS:
+                try:
+                    parsed = datetime.strptime(text, fmt)
+                    break
+                except ValueError:
+                    continue
+    if parsed is not None and parsed.tzinfo is not None:
+        # Stored like datetime.now(): naive, in the server's local time
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed
+
+
+def parse_date(value) -> Optional[date]:
+    if isinstance(value, date) and not isinstance(value, datetime):
+        return value
+    parsed = parse_datetime(value)
+    return parsed.date() if parsed else None
+
+
+def parse_number(value) -> Optional[float]:
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = _MEASUREMENT.fullmatch(str(value))
+    return float(match.group(1)) if match else None
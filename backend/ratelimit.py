@@ -0,0 +1,239 @@
+# ratelimit.py
+# Sliding-window rate limits for the expensive routes: /auth/login (bcrypt),
+# the OCR uploads and the LLM calls. Each rule keeps two fixed-window
+# counters per key and weights the previous window by how much of it still
+# overlaps the sliding window, so memory is O(1) per key and a burst that
+# straddles a window boundary is still caught.
+
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from dotenv import load_dotenv
+from fastapi import Depends, HTTPException, Request
+
+from security import CurrentHospital, get_current_hospital
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() not in ("0", "false", "no")
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")  # "redis" shares counters across workers
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0")
+RATE_LIMIT_TRUST_PROXY = os.getenv("RATE_LIMIT_TRUST_PROXY", "false").lower() in ("1", "true", "yes")
+
+# "<requests>/<seconds>"; per email only failed logins count
+LOGIN_RATE_PER_IP = os.getenv("LOGIN_RATE_PER_IP", "20/60")
+LOGIN_RATE_PER_EMAIL = os.getenv("LOGIN_RATE_PER_EMAIL", "5/300")
+OCR_RATE_PER_IP = os.getenv("OCR_RATE_PER_IP", "30/60")
+OCR_RATE_PER_HOSPITAL = os.getenv("OCR_RATE_PER_HOSPITAL", "60/60")
+LLM_RATE_PER_IP = os.getenv("LLM_RATE_PER_IP", "30/60")
+LLM_RATE_PER_HOSPITAL = os.getenv("LLM_RATE_PER_HOSPITAL", "60/60")
+
+
+@dataclass(frozen=True)
+class Rule:
+    name: str
+    limit: int
+    window: float  # seconds
+
+    @classmethod
+    def parse(cls, name: str, spec: str) -> "Rule":
+        limit, window = spec.split("/")
+        return cls(name=name, limit=int(limit), window=float(window))
+
+
+class MemoryBackend:
+    """Per-process fixed-window counters; the default backend.
+
+    Also the local stand-in for a shared backend in tests: it implements the
+    same two calls, and ``clock`` lets a test move time forward explicitly.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.time, max_keys: int = 100_000):
+        self.clock = clock
+        self.max_keys = max_keys
+        self._counts: Dict[str, Tuple[int, float]] = {}  # key -> (count, expires_at)
+        self._lock = threading.Lock()
+
+    def get_many(self, keys: Sequence[str]) -> List[int]:
+        now = self.clock()
+        with self._lock:
+            return [count if expires > now else 0 for count, expires in (self._counts.get(k, (0, 0.0)) for k in keys)]
+
+    def incr(self, key: str, ttl: float) -> int:
+        now = self.clock()
+        with self._lock:
+            count, expires = self._counts.get(key, (0, 0.0))
+            if expires <= now:
+                count, expires = 0, now + ttl
+            self._counts[key] = (count + 1, expires)
+            if len(self._counts) > self.max_keys:
+                self._counts = {k: v for k, v in self._counts.items() if v[1] > now}
+            return count + 1
+
+
+class RedisBackend:
+    """Counters in Redis, shared by every worker and host (INCR + EXPIRE)."""
+
+    def __init__(self, url: str = RATE_LIMIT_REDIS_URL):
+        self.url = url
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            import redis
+            self._client = redis.Redis.from_url(self.url)
+        return self._client
+
+    def get_many(self, keys: Sequence[str]) -> List[int]:
+        return [int(v or 0) for v in self.client.mget(list(keys))]
+
+    def incr(self, key: str, ttl: float) -> int:
+        pipe = self.client.pipeline()
+        pipe.incr(key)
+        pipe.expire(key, int(ttl) + 1, nx=True)
+        return pipe.execute()[0]
+
+
+def make_backend(name: str = RATE_LIMIT_BACKEND):
+    if name == "redis":
+        return RedisBackend()
+    return MemoryBackend()
+
+
+class RateLimiter:
+    """Sliding-window counter limiter over a pluggable counter backend.
+
+    The count for the sliding window ending now is estimated as
+    ``current + previous * (1 - elapsed / window)`` from the counters of the
+    current and previous fixed windows. Rejected attempts are not counted,
+    so a client that backs off gets through once the window slides.
+    """
+
+    def __init__(self, backend=None, clock: Optional[Callable[[], float]] = None, enabled: bool = RATE_LIMIT_ENABLED):
+        self.backend = backend or make_backend()
+        self.clock = clock or getattr(self.backend, "clock", time.time)
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.allowed: Dict[str, int] = {}
+        self.rejected: Dict[str, int] = {}
+
+    @staticmethod
+    def _window_key(rule: Rule, key: str, index: int) -> str:
+        return f"rl:{rule.name}:{key}:{index}"
+
+    def check(self, rule: Rule, key: str) -> Optional[float]:
+        """None if one more request for ``key`` is within the limit, else seconds until retry.
+
+        Counts nothing; see :meth:`record`.
+        """
+        if not self.enabled:
+            return None
+        index, offset = divmod(self.clock(), rule.window)
+        index = int(index)
+        current, previous = self.backend.get_many(
+            [self._window_key(rule, key, index), self._window_key(rule, key, index - 1)]
+        )
+        overlap = 1 - offset / rule.window
+        if current + previous * overlap < rule.limit:
+            return None
+        self._count(self.rejected, rule.name)
+        if previous and current < rule.limit:
+            # Wait until enough of the previous window has slid out
+            retry = (current + previous - rule.limit + 1) / previous * rule.window - offset
+        else:
+            retry = rule.window - offset
+        return max(1.0, retry)
+
+    def record(self, rule: Rule, key: str):
+        """Count one request for ``key`` against ``rule``."""
+        if not self.enabled:
+            return
+        index = int(self.clock() // rule.window)
+        self.backend.incr(self._window_key(rule, key, index), ttl=2 * rule.window)
+        self._count(self.allowed, rule.name)
+
+    def hit(self, rule: Rule, key: str) -> Optional[float]:
+        """Count one request for ``key``; returns None if allowed, else seconds until retry."""
+        retry = self.check(rule, key)
+        if retry is None:
+            self.record(rule, key)
+        return retry
+
+    def _count(self, counter: Dict[str, int], name: str):
+        with self._lock:
+            counter[name] = counter.get(name, 0) + 1
+
+    def enforce(self, checks: Sequence[Tuple[Rule, Optional[str]]],
+                uncounted: Sequence[Tuple[Rule, Optional[str]]] = ()):
+        """Raise 429 if any (rule, key) pair is over its limit; pairs with no key are skipped.
+
+        Every pair is checked before anything is counted, so a request one
+        rule rejects doesn't use up the others' quota. Once all pass, the
+        ``checks`` pairs are counted; ``uncounted`` pairs are only checked,
+        for the caller to :meth:`record` when it decides the request counts.
+        """
+        for rule, key in [*checks, *uncounted]:
+            if key is None:
+                continue
+            retry_after = self.check(rule, key)
+            if retry_after is not None:
+                logger.warning("Rate limit %s exceeded for %s", rule.name, key)
+                raise HTTPException(
+                    status_code=429,
+                    detail=f"Too many requests; retry in {int(retry_after + 0.999)}s",
+                    headers={"Retry-After": str(int(retry_after + 0.999))},
+                )
+        for rule, key in checks:
+            if key is not None:
+                self.record(rule, key)
+
+    def stats(self) -> dict:
+        with self._lock:
+            rules = sorted(set(self.allowed) | set(self.rejected))
+            return {
+                "enabled": self.enabled,
+                "backend": type(self.backend).__name__,
+                "rules": {
+                    name: {"allowed": self.allowed.get(name, 0), "rejected": self.rejected.get(name, 0)}
+                    for name in rules
+                },
+            }
+
+
+def client_ip(request: Request) -> str:
+    if RATE_LIMIT_TRUST_PROXY:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+login_per_ip = Rule.parse("login_ip", LOGIN_RATE_PER_IP)
+login_per_email = Rule.parse("login_email", LOGIN_RATE_PER_EMAIL)
+ocr_per_ip = Rule.parse("ocr_ip", OCR_RATE_PER_IP)
+ocr_per_hospital = Rule.parse("ocr_hospital", OCR_RATE_PER_HOSPITAL)
+llm_per_ip = Rule.parse("llm_ip", LLM_RATE_PER_IP)
+llm_per_hospital = Rule.parse("llm_hospital", LLM_RATE_PER_HOSPITAL)
+
+rate_limiter = RateLimiter()
+
+
+def enforce_ocr_limit(request: Request, hospital_id: int):
+    # For routes where the upload is optional: call it only when a document came in
+    rate_limiter.enforce([(ocr_per_ip, client_ip(request)), (ocr_per_hospital, str(hospital_id))])
+
+
+# Route dependencies. FastAPI reads (and spools) a multipart body before it runs
+# dependencies, so for uploads these save the OCR and LLM work, not the transfer
+async def limit_ocr(request: Request, current: CurrentHospital = Depends(get_current_hospital)):
+    enforce_ocr_limit(request, current.id)
+
+
+async def limit_llm(request: Request, current: CurrentHospital = Depends(get_current_hospital)):
+    rate_limiter.enforce([(llm_per_ip, client_ip(request)), (llm_per_hospital, str(current.id))])
@@ -1,42 +1,55 @@
-from fastapi import APIRouter, Depends ,HTTPException
+from fastapi import APIRouter, Depends ,HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import List, Dict
-import joblib
 from datetime import datetime
-from groq import Groq
-import os
+from contextlib import aclosing
 from dotenv import load_dotenv
-from sqlalchemy.orm import Session
-from database import get_db
+import json
+import logging
+import os
+import time
+from sqlalchemy import func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db
 from models import Patient, DiseaseHistory , TreatmentPlan
+from inference import normalize_symptoms, predict_batch, top_k, prediction_memo
+from model_registry import registry
+from llm import llm_client
+from timeline import timeline_cache
+from similarity import similarity_index
+from ratelimit import limit_llm
+from security import CurrentHospital, get_current_hospital, get_scoped_patient, require_hospital
 
 
 
 load_dotenv()
-router = APIRouter(prefix="/ai", tags=["AI Assistant"])
-
-model = joblib.load("disease_model.pkl")
-encoder = joblib.load("symptom_encoder.pkl")
-groq_client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+# ✅ Every AI route needs a valid access token
+router = APIRouter(prefix="/ai", tags=["AI Assistant"], dependencies=[Depends(get_current_hospital)])
+logger = logging.getLogger(__name__)
+MAX_BATCH_PREDICT_ITEMS = int(os.getenv("MAX_BATCH_PREDICT_ITEMS", "5000"))
 
 class PredictRequest(BaseModel):
     symptoms: List[str]
 
 @router.post("/predict")
-def predict_disease(request: PredictRequest, patient_id: int, db: Session = Depends(get_db)):
-    symptoms = [s.strip().lower().replace(" ", "_") for s in request.symptoms]
-    X = encoder.transform([symptoms])
-    prediction = model.predict(X)[0]
-
-    patient = db.query(Patient).filter(Patient.id == patient_id).first()
-    if not patient:
-        return {"error": "Patient not found"}
-
-    latest_record = (
-        db.query(DiseaseHistory)
-        .filter(DiseaseHistory.patient_id == patient_id)
+async def predict_disease(
+    request: PredictRequest,
+    patient_id: int,
+    top: int = 3,
+    patient: Patient = Depends(get_scoped_patient),
+    db: AsyncSession = Depends(get_async_db)
+):
+    # ✅ Differential diagnosis: top-k diseases from predict_proba (memoized per symptom set)
+    differential = await run_in_threadpool(top_k, normalize_symptoms(request.symptoms), max(1, top))
+    prediction = differential[0]["disease"]
+
+    latest_record = await db.scalar(
+        select(DiseaseHistory)
+        .where(DiseaseHistory.patient_id == patient_id)
         .order_by(DiseaseHistory.id.desc())
-        .first()
+        .limit(1)
     )
 
     # Save new record only if symptoms or prediction changed
@@ -45,12 +58,133 @@ def predict_disease(request: PredictRequest, patient_id: int, db: Session = Depe
             patient_id=patient_id,
             symptoms=", ".join(request.symptoms),
             predicted_disease=prediction,
-            created_at=datetime.now().isoformat()
+            created_at=datetime.now()
         )
         db.add(new_history)
-        db.commit()
+        await db.commit()
+
+    return {"predicted_disease": prediction, "differential": differential}
+
+@router.post("/similar")
+async def similar_patients(
+    request: PredictRequest,
+    k: int = 10,
+    patient_id: int = None,
+    db: AsyncSession = Depends(get_async_db),
+    current: CurrentHospital = Depends(get_current_hospital)
+):
+    # ✅ Nearest past patients of the caller's hospital by Jaccard similarity, with the plans they were given
+    neighbours = await run_in_threadpool(
+        similarity_index.search, request.symptoms, max(1, min(k, 100)), current.id, patient_id
+    )
+    ids = [n["patient_id"] for n in neighbours]
+    if ids:
+        # Another worker may have deleted some of them since this process's index was built
+        existing = set(await db.scalars(select(Patient.id).where(Patient.id.in_(ids))))
+        neighbours = [n for n in neighbours if n["patient_id"] in existing]
+        ids = [n["patient_id"] for n in neighbours]
+    plans = {}
+    if ids:
+        rows = await db.execute(
+            select(DiseaseHistory.patient_id, TreatmentPlan)
+            .join(TreatmentPlan, TreatmentPlan.disease_id == DiseaseHistory.id)
+            .where(DiseaseHistory.patient_id.in_(ids))
+            .order_by(TreatmentPlan.id.desc())
+        )
+        for pid, plan in rows:
+            plans.setdefault(pid, []).append({
+                "treatment": plan.treatment,
+                "medication": plan.medication,
+                "tests": plan.tests,
+                "precaution": plan.precaution,
+            })
+    return {"neighbours": [{**n, "treatment_plans": plans.get(n["patient_id"], [])} for n in neighbours]}
 
-    return {"predicted_disease": prediction}
+@router.get("/similar/stats")
+def get_similarity_index_stats():
+    return similarity_index.stats()
+
+@router.get("/predict/cache-stats")
+def get_prediction_cache_stats():
+    return prediction_memo.stats()
+
+@router.get("/model")
+def get_model_info():
+    return registry.info()
+
+class BatchPredictItem(BaseModel):
+    patient_id: int
+    symptoms: List[str]
+
+class BatchPredictRequest(BaseModel):
+    items: List[BatchPredictItem] = []
+    patient_ids: List[int] = []  # score the symptoms already stored on these patients
+
+@router.post("/predict/batch")
+async def predict_disease_batch(
+    request: BatchPredictRequest,
+    db: AsyncSession = Depends(get_async_db),
+    current: CurrentHospital = Depends(get_current_hospital)
+):
+    if len(request.items) + len(request.patient_ids) > MAX_BATCH_PREDICT_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_PREDICT_ITEMS} items per batch")
+    items = [(item.patient_id, item.symptoms) for item in request.items]
+    if request.patient_ids:
+        stored = (await db.execute(
+            select(Patient.id, Patient.symptoms)
+            .where(Patient.id.in_(request.patient_ids), Patient.hospital_id == current.id)
+        )).all()
+        items += [(pid, [s.strip() for s in (symptoms or "").split(",") if s.strip()]) for pid, symptoms in stored]
+    if not items:
+        return {"predictions": [], "saved": 0}
+
+    patient_ids = {pid for pid, _ in items}
+    # Other hospitals' patients are reported as not found
+    hospitals = dict((await db.execute(
+        select(Patient.id, Patient.hospital_id).where(Patient.id.in_(patient_ids), Patient.hospital_id == current.id)
+    )).all())
+    existing = set(hospitals)
+
+    # ✅ One sparse matrix, one predict_proba call for the whole batch
+    diseases, probabilities = await run_in_threadpool(
+        predict_batch, [normalize_symptoms(symptoms) for _, symptoms in items]
+    )
+
+    latest_ids = (
+        select(func.max(DiseaseHistory.id))
+        .where(DiseaseHistory.patient_id.in_(existing))
+        .group_by(DiseaseHistory.patient_id)
+    )
+    latest = {
+        h.patient_id: (h.symptoms, h.predicted_disease)
+        for h in await db.scalars(select(DiseaseHistory).where(DiseaseHistory.id.in_(latest_ids)))
+    }
+
+    now = datetime.now()
+    predictions, new_rows = [], []
+    for (pid, symptoms), disease, probability in zip(items, diseases, probabilities):
+        if pid not in existing:
+            predictions.append({"patient_id": pid, "error": "Patient not found"})
+            continue
+        disease = str(disease)
+        joined = ", ".join(symptoms)
+        predictions.append({"patient_id": pid, "predicted_disease": disease, "probability": float(probability)})
+        # Same rule as /predict: only store a row when symptoms or prediction changed
+        if latest.get(pid) != (joined, disease):
+            new_rows.append({"patient_id": pid, "symptoms": joined, "predicted_disease": disease, "created_at": now})
+            latest[pid] = (joined, disease)
+
+    if new_rows:
+        await db.execute(insert(DiseaseHistory), new_rows)
+        await db.commit()
+        # Core bulk insert skips ORM flush events, so drop cached timelines explicitly
+        timeline_cache.invalidate(row["patient_id"] for row in new_rows)
+        similarity_index.upsert([
+            (row["patient_id"], hospitals[row["patient_id"]], row["symptoms"].split(","), row["predicted_disease"])
+            for row in new_rows
+        ])
+
+    return {"predictions": predictions, "saved": len(new_rows)}
 
 
 class ChatMessage(BaseModel):
@@ -66,17 +200,18 @@ class TreatmentRequest(BaseModel):
     precaution: str
 
 @router.post("/treatment-plan/{patient_id}/add")
-def add_treatment_plan(
+async def add_treatment_plan(
     patient_id: int,
     data: TreatmentRequest,
-    db: Session = Depends(get_db)
+    patient: Patient = Depends(get_scoped_patient),
+    db: AsyncSession = Depends(get_async_db)
 ):
     # Get the latest disease history entry for linking
-    history = (
-        db.query(DiseaseHistory)
-        .filter(DiseaseHistory.patient_id == patient_id)
+    history = await db.scalar(
+        select(DiseaseHistory)
+        .where(DiseaseHistory.patient_id == patient_id)
         .order_by(DiseaseHistory.id.desc())
-        .first()
+        .limit(1)
     )
 
     if not history:
@@ -90,16 +225,10 @@ def add_treatment_plan(
         precaution=data.precaution
     )
     db.add(treatment_plan)
-    db.commit()
+    await db.commit()
 
     return {"message": "✅ Treatment plan saved to TreatmentPlan table."}
-@router.post("/chat")
-def chat_with_ai(request: ChatRequest):
-    # Extract disease from system message or last user message (optional improvement)
-    user_message = next((msg.content for msg in reversed(request.messages) if msg.role == "user"), "")
-    
-    # Optional: Extract predicted disease again (e.g., by parsing input symptoms or saving it earlier)
-
+def build_chat_input(request: ChatRequest):
     # Build system message context
     system_message = {
         "role": "system",
@@ -111,22 +240,59 @@ def chat_with_ai(request: ChatRequest):
     }
 
     # Inject context message (optional if not already provided)
-    chat_input = [system_message] + [msg.dict() for msg in request.messages]
+    return [system_message] + [msg.dict() for msg in request.messages]
+
+@router.post("/chat", dependencies=[Depends(limit_llm)])
+async def chat_with_ai(request: ChatRequest):
+    # ✅ Cached + coalesced: repeated "Get suggestions" clicks reuse one completion
+    reply = await llm_client.complete(build_chat_input(request))
+
+    return {"reply": reply.strip()}
+
+def _sse(data: dict, event: str = None):
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+@router.post("/chat/stream", dependencies=[Depends(limit_llm)])
+async def chat_with_ai_stream(request: ChatRequest, http_request: Request):
+    chat_input = build_chat_input(request)
+
+    async def events():
+        started = time.perf_counter()
+        ttft_ms = None
+        # aclosing() closes the upstream Groq stream on disconnect or cancellation
+        async with aclosing(llm_client.stream(chat_input)) as deltas:
+            async for delta in deltas:
+                if ttft_ms is None:
+                    ttft_ms = (time.perf_counter() - started) * 1000
+                    llm_client.record_ttft(ttft_ms)
+                if await http_request.is_disconnected():
+                    logger.info("Chat stream cancelled by client after %.1f ms", (time.perf_counter() - started) * 1000)
+                    return
+                yield _sse({"delta": delta})
+        total_ms = (time.perf_counter() - started) * 1000
+        logger.info("Chat stream finished: ttft %.1f ms, total %.1f ms", ttft_ms or 0.0, total_ms)
+        yield _sse({"ttft_ms": ttft_ms, "total_ms": total_ms}, event="done")
 
-    response = groq_client.chat.completions.create(
-        model="llama3-8b-8192",
-        messages=chat_input
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
-    return {"reply": response.choices[0].message.content.strip()}
+@router.get("/llm/cache-stats")
+def get_llm_cache_stats():
+    return llm_client.stats()
 
 @router.get("/treatment-plan/{patient_id}/list")
-def get_treatment_plans(patient_id: int, db: Session = Depends(get_db)):
-    from models import TreatmentPlan, DiseaseHistory
-
-    history_ids = db.query(DiseaseHistory.id).filter(DiseaseHistory.patient_id == patient_id).subquery()
+async def get_treatment_plans(
+    patient_id: int,
+    patient: Patient = Depends(get_scoped_patient),
+    db: AsyncSession = Depends(get_async_db)
+):
+    history_ids = select(DiseaseHistory.id).where(DiseaseHistory.patient_id == patient_id)
 
-    plans = db.query(TreatmentPlan).filter(TreatmentPlan.disease_id.in_(history_ids)).all()
+    plans = (await db.scalars(select(TreatmentPlan).where(TreatmentPlan.disease_id.in_(history_ids)))).all()
 
     return [
         {
@@ -139,24 +305,41 @@ def get_treatment_plans(patient_id: int, db: Session = Depends(get_db)):
         for plan in plans
     ]
 
-@router.delete("/treatment-plan/{plan_id}/delete")
-def delete_treatment_plan(plan_id: int, db: Session = Depends(get_db)):
-    plan = db.query(TreatmentPlan).filter(TreatmentPlan.id == plan_id).first()
-    if not plan:
+async def get_scoped_plan(db: AsyncSession, plan_id: int, current: CurrentHospital) -> TreatmentPlan:
+    row = (await db.execute(
+        select(TreatmentPlan, Patient.hospital_id)
+        .join(DiseaseHistory, DiseaseHistory.id == TreatmentPlan.disease_id)
+        .join(Patient, Patient.id == DiseaseHistory.patient_id)
+        .where(TreatmentPlan.id == plan_id)
+    )).first()
+    if not row:
         raise HTTPException(status_code=404, detail="Treatment plan not found")
-    db.delete(plan)
-    db.commit()
+    require_hospital(row.hospital_id, current)
+    return row.TreatmentPlan
+
+@router.delete("/treatment-plan/{plan_id}/delete")
+async def delete_treatment_plan(
+    plan_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current: CurrentHospital = Depends(get_current_hospital)
+):
+    plan = await get_scoped_plan(db, plan_id, current)
+    await db.delete(plan)
+    await db.commit()
     return {"message": "🗑️ Treatment plan deleted successfully."}
 
 @router.put("/treatment-plan/{plan_id}/update")
-def update_treatment_plan(plan_id: int, data: TreatmentRequest, db: Session = Depends(get_db)):
-    plan = db.query(TreatmentPlan).filter(TreatmentPlan.id == plan_id).first()
-    if not plan:
-        raise HTTPException(status_code=404, detail="Treatment plan not found")
+async def update_treatment_plan(
+    plan_id: int,
+    data: TreatmentRequest,
+    db: AsyncSession = Depends(get_async_db),
+    current: CurrentHospital = Depends(get_current_hospital)
+):
+    plan = await get_scoped_plan(db, plan_id, current)
 
     plan.treatment = data.treatment
     plan.medication = data.medication
     plan.tests = data.tests
     plan.precaution = data.precaution
-    db.commit()
+    await db.commit()
     return {"message": "✏️ Treatment plan updated successfully."}
@@ -1,41 +1,78 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from models import Hospital
-from schemas import HospitalCreate, HospitalLogin
-from database import SessionLocal
+from schemas import HospitalCreate, HospitalLogin, RefreshRequest
+from database import get_async_db
 from passlib.hash import bcrypt
+from ratelimit import client_ip, login_per_email, login_per_ip, rate_limiter
+from security import (
+    CurrentHospital, TokenError, decode_token, get_current_hospital, issue_tokens, refresh_tokens, token_verifier
+)
 
 router = APIRouter(prefix="/auth", tags=["Auth"])
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 @router.post("/register")
-def register(hospital: HospitalCreate, db: Session = Depends(get_db)):
+async def register(hospital: HospitalCreate, request: Request, db: AsyncSession = Depends(get_async_db)):
+    # ✅ bcrypt-bound like login, so it shares login's per-IP budget
+    rate_limiter.enforce([(login_per_ip, client_ip(request))])
     db_hospital = Hospital(**hospital.dict())
-    db_hospital.password = bcrypt.hash(db_hospital.password)
+    # bcrypt is deliberately slow; keep it off the event loop
+    db_hospital.password = await run_in_threadpool(bcrypt.hash, db_hospital.password)
     db.add(db_hospital)
-    db.commit()
-    db.refresh(db_hospital)
+    await db.commit()
     return {
         "message": "Hospital registered successfully.",
         "hospital_id": db_hospital.id,
-        "name": db_hospital.name
+        "name": db_hospital.name,
+        **issue_tokens(db_hospital.id, db_hospital.name),
     }
 
 
 @router.post("/login")
-def login(data: HospitalLogin, db: Session = Depends(get_db)):
-    hospital = db.query(Hospital).filter(Hospital.email == data.email).first()
-    if not hospital or not bcrypt.verify(data.password, hospital.password):
+async def login(data: HospitalLogin, request: Request, db: AsyncSession = Depends(get_async_db)):
+    # ✅ Reject brute-force bursts before they reach bcrypt. Every attempt counts per IP; per email
+    # only failures do, so nobody can lock a known account out by logging in as it
+    email = data.email.strip().lower()
+    rate_limiter.enforce([(login_per_ip, client_ip(request))], uncounted=[(login_per_email, email)])
+    hospital = await db.scalar(select(Hospital).where(Hospital.email == data.email).limit(1))
+    if not hospital or not await run_in_threadpool(bcrypt.verify, data.password, hospital.password):
+        rate_limiter.record(login_per_email, email)
         raise HTTPException(status_code=400, detail="Invalid credentials")
     
     return {
-        "access_token": "dummy-jwt-token",
+        **issue_tokens(hospital.id, hospital.name),  # ✅ Signed access + refresh tokens
         "name": hospital.name,              # ✅ Add this
         "hospital_id": hospital.id          # ✅ And this
     }
+
+
+@router.post("/refresh")
+async def refresh(data: RefreshRequest, db: AsyncSession = Depends(get_async_db)):
+    # ✅ Each refresh token works once across all workers, and only while its hospital exists
+    try:
+        claims = decode_token(data.refresh_token, "refresh")
+    except TokenError as e:
+        raise HTTPException(status_code=401, detail=f"Invalid refresh token: {e}")
+    hospital = await db.get(Hospital, int(claims["sub"]))
+    if hospital is None:
+        raise HTTPException(status_code=401, detail="Hospital no longer exists")
+    if not await refresh_tokens.consume(db, claims):
+        raise HTTPException(status_code=401, detail="Refresh token already used")
+    return {**issue_tokens(hospital.id, hospital.name), "hospital_id": hospital.id}
+
+
+@router.get("/me")
+async def me(current: CurrentHospital = Depends(get_current_hospital)):
+    return {"hospital_id": current.id, "name": current.name}
+
+
+@router.get("/rate-limit-stats")
+async def get_rate_limit_stats(current: CurrentHospital = Depends(get_current_hospital)):
+    return rate_limiter.stats()
+
+
+@router.get("/token-cache-stats")
+async def get_token_cache_stats(current: CurrentHospital = Depends(get_current_hospital)):
+    return token_verifier.stats()
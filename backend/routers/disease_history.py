@@ -0,0 +1,27 @@
+from datetime import datetime
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import get_async_db
+from models import Patient, DiseaseHistory
+from security import get_current_hospital, get_scoped_patient
+from timeline import time_range_query
+
+# ✅ Diagnoses per patient, as listed next to the medical records in the dashboard
+router = APIRouter(prefix="/disease-history", tags=["Disease History"], dependencies=[Depends(get_current_hospital)])
+
+
+@router.get("/{patient_id}")
+async def get_disease_history(
+    patient_id: int,
+    since: datetime = Query(None, description="Only diagnoses made at or after this time"),
+    until: datetime = Query(None, description="Only diagnoses made before this time"),
+    before_id: int = Query(None, description="Id of the previous page's last row; pass its date as until too, if it has one"),
+    limit: int = Query(100, ge=1, le=1000),
+    patient: Patient = Depends(get_scoped_patient),
+    db: AsyncSession = Depends(get_async_db)
+):
+    # ✅ Newest first, read from the (patient_id, created_at) index; page with the last row's created_at and id
+    query = time_range_query(DiseaseHistory, DiseaseHistory.created_at, patient_id, since, until, limit, before_id)
+    return (await db.scalars(query)).all()
@@ -1,80 +1,164 @@
 # ✅ backend/routers/patient.py (Updated)
 
-from fastapi import APIRouter, Depends, UploadFile, File, Form
-from sqlalchemy.orm import Session
-from database import get_db
-from models import Patient, MedicalRecord
-from schemas import MedicalRecordCreate
-import pytesseract
-from pdf2image import convert_from_bytes
+from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from database import get_async_db, AsyncSessionLocal, SessionLocal
+from models import Patient, MedicalRecord, DiseaseHistory, PatientConsent
+from schemas import MedicalRecordCreate, ConsentCreate
 import os
-from groq import Groq
 from dotenv import load_dotenv
 from datetime import datetime
+import asyncio
 import json
+import uuid
+import hashlib
+import shutil
+import tempfile
+from ocr import ocr_engine, OCR_SPOOL_DIR
+from extraction import extraction_pipeline
+from ocr_cache import ocr_cache
+from ingest_queue import job_queue, INGEST_UPLOAD_DIR
+from bulk_import import BulkImportError, import_patients, parse_csv, parse_ndjson
+from timeline import get_timeline, time_range_query, timeline_cache
+from similarity import similarity_index
+from search_index import reindex_patients, remove_patients, search_sql, search_params
+from security import CurrentHospital, get_current_hospital, get_scoped_patient, require_hospital
+from ratelimit import enforce_ocr_limit, limit_llm, limit_ocr
+from metrics import span
+from uploads import MAX_UPLOAD_BYTES, SpooledUpload, UploadRoute, too_large
+from parsing import parse_date, parse_number
+import io
 
-# ✅ Import ML model & encoder
-from routers.ai_assistant import model, encoder
+# ✅ Import ML prediction helpers
+from inference import normalize_symptoms, predict_batch
 
 load_dotenv()
-router = APIRouter(prefix="/patients", tags=["Patients"])
-client = Groq(api_key=os.getenv("GROQ_API_KEY"))
-
-def extract_text_from_pdf(file: UploadFile):
-    images = convert_from_bytes(file.file.read())
-    full_text = ""
-    for img in images:
-        full_text += pytesseract.image_to_string(img)
-    return full_text
-
-def generate_llm_summary(name: str, symptoms: str, doc_text: str, predicted_disease: str):
-    prompt = f"""
-    Patient Name: {name}
-    Symptoms: {symptoms}
-    Extracted Medical Document (OCR):
-    {doc_text}
-
-    Predicted Disease: {predicted_disease}
-
-    ✅ Your task:
-    Respond strictly in JSON format with keys:
-    - name, birth_date, weight, height, allergies, medications, insurance_provider, insurance_expiry
-    - notable_conditions, immunizations
-    - disease, insights, treatment, precautions
+# ✅ Every patient route needs a valid access token
+# ✅ Uploads stream straight to a spool file and stop at MAX_UPLOAD_BYTES (see uploads.py)
+router = APIRouter(prefix="/patients", tags=["Patients"], dependencies=[Depends(get_current_hospital)],
+                   route_class=UploadRoute)
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "500"))
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+async def spool_upload(file: UploadFile, path: str = None):
+    """The upload as a file at ``path`` (a new temp file by default).
+
+    Returns ``(path, sha256)``. Uploads parsed by UploadRoute are already on
+    disk and are moved, not copied; anything else is copied a chunk at a
+    time. Uploads over MAX_UPLOAD_BYTES get a 413 and leave no file behind.
     """
-    response = client.chat.completions.create(
-        model="llama3-8b-8192",
-        messages=[{"role": "user", "content": prompt}]
-    )
-    return response.choices[0].message.content.strip()
+    if isinstance(file, SpooledUpload):
+        if path is None:
+            return file.path, file.sha256
+        await asyncio.to_thread(shutil.move, file.path, path)
+        return path, file.sha256
+    if file.size is not None and file.size > MAX_UPLOAD_BYTES:
+        raise too_large()
+    if path is None:
+        fd, path = tempfile.mkstemp(suffix=".pdf", dir=OCR_SPOOL_DIR)
+        out = os.fdopen(fd, "wb")
+    else:
+        out = open(path, "wb")
+    digest = hashlib.sha256()
+    written = 0
+    try:
+        with out:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                written += len(chunk)
+                if written > MAX_UPLOAD_BYTES:
+                    raise too_large()
+                digest.update(chunk)
+                await asyncio.to_thread(out.write, chunk)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path, digest.hexdigest()
 
-@router.post("/extract-info")
-async def extract_patient_info(document: UploadFile = File(...)):
-    extracted_text = extract_text_from_pdf(document)
-    dummy_symptoms = "headache, fever"
-    predicted_disease = "Unknown"
+async def extract_text_from_pdf(file: UploadFile):
+    # ✅ Spooled to disk and OCR'd page by page in the shared process pool; never held in memory whole
+    path, digest = await spool_upload(file)
     try:
-        summary_raw = generate_llm_summary("", dummy_symptoms, extracted_text, predicted_disease)
+        with span("ocr"):
+            result = await ocr_engine.extract_file(path, digest)
+    finally:
+        await asyncio.to_thread(os.remove, path)
+    return result.text
 
-        # ✅ Remove markdown/code block formatting
-        if "```" in summary_raw:
-            summary_raw = summary_raw.split("```")[1].strip()
+@router.get("/ocr/cache-stats")
+def get_ocr_cache_stats():
+    return ocr_cache.stats()
 
-        # ✅ Remove comments (like // IMMUNE) to make valid JSON
-        import re
-        summary_raw = re.sub(r"//.*", "", summary_raw)  # removes // comments
+@router.get("/extraction/stats")
+def get_extraction_stats():
+    return extraction_pipeline.stats()
 
-        structured = json.loads(summary_raw)
-        return structured
-    except Exception as e:
+@router.post("/extract-info", dependencies=[Depends(limit_ocr), Depends(limit_llm)])
+async def extract_patient_info(document: UploadFile = File(...)):
+    extracted_text = await extract_text_from_pdf(document)
+    # ✅ Long documents are chunked to fit the context window and extracted concurrently
+    result = await extraction_pipeline.extract(extracted_text)
+    if result.fields is None:
         return {
             "error": "LLM parsing failed",
-            "raw_response": summary_raw,
-            "exception": str(e)
+            "raw_response": "\n\n".join(chunk.reply for chunk in result.chunks if chunk.reply is not None),
+            "exception": "; ".join(chunk.error for chunk in result.chunks if chunk.error),
+            "extraction": result.report(),
         }
+    return {**result.fields.model_dump(), "extraction": result.report()}
 
 
-@router.post("/")
+PATIENT_FIELDS = ["name", "age", "contact", "dob", "symptoms", "allergies", "previous_diseases",
+                  "weight", "height", "hospital_id", "medications"]
+
+def predict_from_symptom_text(symptoms: str):
+    diseases, _ = predict_batch([normalize_symptoms(symptoms.split(","))])
+    return str(diseases[0])
+
+async def reindex_for_search(db: AsyncSession, patient_id: int):
+    # ✅ Keep the full-text index in the same transaction as the write it reflects
+    await db.flush()
+    await db.run_sync(reindex_patients, [patient_id])
+
+async def save_patient_with_record(db: AsyncSession, fields: dict, extracted_text: str):
+    new_patient = Patient(
+        name=fields.get("name") or "Unknown",
+        age=fields.get("age") or 0,
+        contact=fields.get("contact") or "N/A",
+        dob=parse_date(fields.get("dob")),
+        symptoms=fields["symptoms"],
+        allergies=fields.get("allergies"),
+        previous_diseases=fields.get("previous_diseases"),
+        weight=parse_number(fields.get("weight")),
+        height=parse_number(fields.get("height")),
+        medical_summary=extracted_text,
+        hospital_id=fields["hospital_id"],
+        medications=fields.get("medications"),
+    )
+    db.add(new_patient)
+    # ✅ Flush to get the patient id so patient + initial record share one commit
+    await db.flush()
+
+    new_record = MedicalRecord(
+        patient_id=new_patient.id,
+        symptoms=fields["symptoms"],
+        document_summary=extracted_text,
+        visit_date=datetime.now(),
+        allergies=fields.get("allergies"),
+        previous_diseases=fields.get("previous_diseases"),
+        medications=fields.get("medications"),
+        weight=new_patient.weight,
+        height=new_patient.height
+    )
+    db.add(new_record)
+    await reindex_for_search(db, new_patient.id)
+    await db.commit()
+    return new_patient
+
+@router.post("/", dependencies=[Depends(limit_ocr)])
 async def create_patient(
     name: str = Form(None),
     age: int = Form(None),
@@ -88,45 +172,15 @@ async def create_patient(
     hospital_id: int = Form(...),
     medications: str = Form(None),
     document: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db),
+    current: CurrentHospital = Depends(get_current_hospital)
 ):
-    extracted_text = extract_text_from_pdf(document)
-    input_symptoms = [s.strip().lower().replace(" ", "_") for s in symptoms.split(",")]
-    X = encoder.transform([input_symptoms])
-    predicted_disease = model.predict(X)[0]
-
-    new_patient = Patient(
-        name=name or "Unknown",
-        age=age or 0,
-        contact=contact or "N/A",
-        dob=dob or "Unknown",
-        symptoms=symptoms,
-        allergies=allergies,
-        previous_diseases=previous_diseases,
-        weight=weight,
-        height=height,
-        medical_summary=extracted_text,
-        hospital_id=hospital_id,
-        medications=medications,
-    )
-    db.add(new_patient)
-    db.commit()
-    db.refresh(new_patient)
-
-    # ✅ Add initial medical record
-    new_record = MedicalRecord(
-        patient_id=new_patient.id,
-        symptoms=symptoms,
-        document_summary=extracted_text,
-        visit_date=str(datetime.now()),
-        allergies=allergies,
-        previous_diseases=previous_diseases,
-        medications=medications,
-        weight=weight,
-        height=height
-    )
-    db.add(new_record)
-    db.commit()
+    require_hospital(hospital_id, current)
+    params = locals()
+    fields = {field: params[field] for field in PATIENT_FIELDS}
+    extracted_text = await extract_text_from_pdf(document)
+    predicted_disease = await run_in_threadpool(predict_from_symptom_text, symptoms)
+    new_patient = await save_patient_with_record(db, fields, extracted_text)
 
     return {
         "message": "✅ Patient and initial medical record added",
@@ -138,23 +192,211 @@ async def create_patient(
         }
     }
 
+def import_roster_file(file, is_csv: bool, hospital_id: int) -> dict:
+    # Reading the spooled upload, parsing and the inserts all block: run in a worker thread
+    lines = io.TextIOWrapper(file, encoding="utf-8", newline="")
+    rows = parse_csv(lines) if is_csv else parse_ndjson(lines)
+    with SessionLocal() as db:
+        return import_patients(db, rows, hospital_id)
+
+@router.post("/import")
+async def import_patient_roster(
+    hospital_id: int = Form(...),
+    file: UploadFile = File(...),
+    current: CurrentHospital = Depends(get_current_hospital)
+):
+    require_hospital(hospital_id, current)
+    # ✅ CSV (by .csv extension or text/csv) or NDJSON, one patient per row
+    is_csv = (file.filename or "").lower().endswith(".csv") or file.content_type == "text/csv"
+    try:
+        # Chunked executemany inserts on the sync engine, the same implementation the seeder uses
+        stats = await asyncio.to_thread(import_roster_file, file.file, is_csv, hospital_id)
+    except (BulkImportError, ValueError) as e:
+        raise HTTPException(status_code=400, detail={
+            "error": str(e),
+            "imported": getattr(e, "imported", None),
+        })
+    # Core bulk inserts skip the ORM hooks; rebuild the similarity index on next use
+    similarity_index.invalidate()
+    return {"message": "✅ Patients imported", **stats}
+
+@router.post("/ingest", status_code=202, dependencies=[Depends(limit_ocr)])
+async def ingest_patient(
+    name: str = Form(None),
+    age: int = Form(None),
+    contact: str = Form(None),
+    dob: str = Form(None),
+    symptoms: str = Form(...),
+    allergies: str = Form(None),
+    previous_diseases: str = Form(None),
+    weight: str = Form(None),
+    height: str = Form(None),
+    hospital_id: int = Form(...),
+    medications: str = Form(None),
+    document: UploadFile = File(...),
+    current: CurrentHospital = Depends(get_current_hospital),
+):
+    require_hospital(hospital_id, current)
+    params = locals()
+    fields = {field: params[field] for field in PATIENT_FIELDS}
+    job_id = uuid.uuid4().hex
+    os.makedirs(INGEST_UPLOAD_DIR, exist_ok=True)
+    upload_path, _ = await spool_upload(document, os.path.join(INGEST_UPLOAD_DIR, f"{job_id}.pdf"))
+
+    await asyncio.to_thread(job_queue.enqueue, fields, upload_path, job_id)
+    return {"job_id": job_id, "status": "queued"}
+
+@router.get("/jobs/{job_id}")
+async def get_ingest_job(job_id: str, current: CurrentHospital = Depends(get_current_hospital)):
+    job = await asyncio.to_thread(job_queue.get, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    require_hospital(job["payload"].get("hospital_id"), current)
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "result": job["result"],
+        "error": job["error"],
+        "attempts": job["attempts"],
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+    }
+
+# ✅ Background handler for /patients/ingest: OCR, predict and persist one upload
+async def process_ingest_job(job: dict):
+    fields = job["payload"]
+    with span("ocr"):
+        ocr = await ocr_engine.extract_file(job["upload_path"])
+    predicted_disease = await asyncio.to_thread(predict_from_symptom_text, fields["symptoms"])
+
+    async with AsyncSessionLocal() as db:
+        patient = await save_patient_with_record(db, fields, ocr.text)
+    return {"patient_id": patient.id, "predicted_disease": predicted_disease,
+            "ocr": {"cached": ocr.cached, "total_ms": round(ocr.total_ms, 1), "pages": ocr.path_counts}}
+
+# ✅ Columns for list views: everything except the large OCR text
+PATIENT_LIST_COLUMNS = [
+    Patient.id, Patient.name, Patient.age, Patient.contact, Patient.dob, Patient.symptoms,
+    Patient.allergies, Patient.previous_diseases, Patient.weight, Patient.height,
+    Patient.medications, Patient.hospital_id,
+]
+
 @router.get("/hospital/{hospital_id}")
-def get_patients(hospital_id: int, db: Session = Depends(get_db)):
-    return db.query(Patient).filter(Patient.hospital_id == hospital_id).all()
+async def get_patients(
+    hospital_id: int,
+    after_id: int = Query(None, description="Cursor: return patients with id greater than this"),
+    limit: int = Query(50, ge=1, le=500),
+    name: str = None,
+    symptom: str = None,
+    min_age: int = None,
+    max_age: int = None,
+    db: AsyncSession = Depends(get_async_db),
+    current: CurrentHospital = Depends(get_current_hospital)
+):
+    require_hospital(hospital_id, current)
+    query = select(*PATIENT_LIST_COLUMNS).where(Patient.hospital_id == hospital_id)
+    if after_id is not None:
+        query = query.where(Patient.id > after_id)
+    if name:
+        query = query.where(Patient.name.ilike(f"%{name}%"))
+    if symptom:
+        query = query.where(Patient.symptoms.ilike(f"%{symptom}%"))
+    if min_age is not None:
+        query = query.where(Patient.age >= min_age)
+    if max_age is not None:
+        query = query.where(Patient.age <= max_age)
+
+    # Fetch one extra row to know whether another page exists
+    rows = (await db.execute(query.order_by(Patient.id).limit(limit + 1))).all()
+    items = [row._asdict() for row in rows[:limit]]
+    next_cursor = items[-1]["id"] if len(rows) > limit else None
+    return {"items": items, "next_cursor": next_cursor}
+
+@router.get("/hospital/{hospital_id}/search")
+async def search_patients(
+    hospital_id: int,
+    q: str = Query(..., min_length=1, description="Words to find in summaries, records, symptoms, medications..."),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: AsyncSession = Depends(get_async_db),
+    current: CurrentHospital = Depends(get_current_hospital)
+):
+    require_hospital(hospital_id, current)
+    # ✅ Ranked full-text search (tsvector + GIN on Postgres, FTS5 on SQLite, unranked LIKE scan elsewhere)
+    dialect = db.get_bind().dialect.name
+    params = search_params(dialect, q)
+    if not params["q"]:
+        return {"items": [], "next_offset": None}
+    matches = (await db.execute(
+        search_sql(dialect, params), {**params, "hospital_id": hospital_id, "limit": limit + 1, "offset": offset}
+    )).all()
+
+    page = matches[:limit]
+    ids = [m.patient_id for m in page]
+    patients = {
+        row.id: row._asdict()
+        for row in (await db.execute(select(*PATIENT_LIST_COLUMNS).where(Patient.id.in_(ids)))).all()
+    }
+    items = [
+        {**patients[m.patient_id], "rank": m.rank, "snippet": m.snippet}
+        for m in page if m.patient_id in patients
+    ]
+    next_offset = offset + limit if len(matches) > limit else None
+    return {"items": items, "next_offset": next_offset}
+
+def _columns(obj):
+    return {column.key: getattr(obj, column.key) for column in obj.__table__.columns}
+
+async def _export_lines(hospital_id: int):
+    # Own session: the request-scoped one is closed before the body finishes streaming
+    async with AsyncSessionLocal() as db:
+        patients = await db.stream_scalars(
+            select(Patient)
+            .where(Patient.hospital_id == hospital_id)
+            .order_by(Patient.id)
+            .options(
+                selectinload(Patient.medical_records),
+                selectinload(Patient.disease_history).selectinload(DiseaseHistory.treatment_plans),
+            )
+            # ✅ Server-side batches; related rows are loaded once per batch, not per patient
+            .execution_options(yield_per=EXPORT_BATCH_SIZE)
+        )
+        async for patient in patients:
+            line = _columns(patient)
+            line["medical_records"] = [_columns(record) for record in patient.medical_records]
+            line["disease_history"] = [
+                {**_columns(history), "treatment_plans": [_columns(plan) for plan in history.treatment_plans]}
+                for history in patient.disease_history
+            ]
+            yield json.dumps(line, default=str) + "\n"
+
+@router.get("/hospital/{hospital_id}/export")
+async def export_hospital_patients(hospital_id: int, current: CurrentHospital = Depends(get_current_hospital)):
+    require_hospital(hospital_id, current)
+    return StreamingResponse(
+        _export_lines(hospital_id),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="hospital-{hospital_id}-patients.ndjson"'},
+    )
 
 @router.delete("/{patient_id}")
-def delete_patient(patient_id: int, db: Session = Depends(get_db)):
-    patient = db.query(Patient).filter(Patient.id == patient_id).first()
-    if not patient:
-        return {"error": "Patient not found"}
-    db.query(MedicalRecord).filter(MedicalRecord.patient_id == patient_id).delete()
-    db.delete(patient)
-    db.commit()
+async def delete_patient(
+    patient_id: int,
+    patient: Patient = Depends(get_scoped_patient),
+    db: AsyncSession = Depends(get_async_db)
+):
+    await db.execute(delete(MedicalRecord).where(MedicalRecord.patient_id == patient_id))
+    await db.run_sync(remove_patients, [patient_id])
+    await db.delete(patient)
+    await db.commit()
+    similarity_index.remove([patient_id])
     return {"message": "✅ Patient and all related medical records deleted"}
 
 @router.post("/update/{patient_id}")
-def update_patient(
+async def update_patient(
     patient_id: int,
+    request: Request,
     name: str = Form(None),
     age: int = Form(None),
     contact: str = Form(None),
@@ -166,48 +408,68 @@ def update_patient(
     height: str = Form(None),
     medications: str = Form(None),
     document: UploadFile = File(None),
-    db: Session = Depends(get_db)
+    patient: Patient = Depends(get_scoped_patient),
+    db: AsyncSession = Depends(get_async_db),
+    current: CurrentHospital = Depends(get_current_hospital)
 ):
-    patient = db.query(Patient).filter(Patient.id == patient_id).first()
-    if not patient:
-        return {"error": "Patient not found"}
+    # ✅ Only updates that bring a document spend the OCR quota
+    if document:
+        enforce_ocr_limit(request, current.id)
+    params = locals()
+    # ✅ Typed columns: keep the stored value when the submitted one doesn't parse
+    params.update(dob=parse_date(dob), weight=parse_number(weight), height=parse_number(height))
 
     for field in ["name", "age", "contact", "dob", "symptoms", "allergies", "previous_diseases", "weight", "height", "medications"]:
-        value = locals()[field]
+        value = params[field]
         if value:
             setattr(patient, field, value)
 
     extracted_text = ""
     if document:
-        extracted_text = extract_text_from_pdf(document)
+        extracted_text = await extract_text_from_pdf(document)
 
     new_record = MedicalRecord(
         patient_id=patient_id,
         symptoms=symptoms or patient.symptoms,
         document_summary=extracted_text or "N/A",
-        visit_date=str(datetime.now()),
+        visit_date=datetime.now(),
         allergies=allergies or patient.allergies,
         previous_diseases=previous_diseases or patient.previous_diseases,
         medications=medications or patient.medications,
-        weight=weight or patient.weight,
-        height=height or patient.height
+        weight=patient.weight,
+        height=patient.height
     )
     db.add(new_record)
-    db.commit()
-    db.refresh(patient)
+    await reindex_for_search(db, patient_id)
+    await db.commit()
     return {"message": "✅ Patient updated and medical record added"}
 
 @router.get("/{patient_id}/records")
-def get_medical_records(patient_id: int, db: Session = Depends(get_db)):
-    return db.query(MedicalRecord).filter(MedicalRecord.patient_id == patient_id).all()
+async def get_medical_records(
+    patient_id: int,
+    since: datetime = Query(None, description="Only records visited at or after this time"),
+    until: datetime = Query(None, description="Only records visited before this time"),
+    before_id: int = Query(None, description="Id of the previous page's last row; pass its date as until too, if it has one"),
+    limit: int = Query(100, ge=1, le=1000),
+    patient: Patient = Depends(get_scoped_patient),
+    db: AsyncSession = Depends(get_async_db)
+):
+    # ✅ Newest first, read from the (patient_id, visit_date) index; page with the last row's visit_date and id
+    query = time_range_query(MedicalRecord, MedicalRecord.visit_date, patient_id, since, until, limit, before_id)
+    return (await db.scalars(query)).all()
 
 @router.post("/{patient_id}/records")
-def add_medical_record(patient_id: int, record: MedicalRecordCreate, db: Session = Depends(get_db)):
+async def add_medical_record(
+    patient_id: int,
+    record: MedicalRecordCreate,
+    patient: Patient = Depends(get_scoped_patient),
+    db: AsyncSession = Depends(get_async_db)
+):
     new_record = MedicalRecord(
         patient_id=patient_id,
         symptoms=record.symptoms,
         document_summary=record.document_summary,
-        visit_date=record.visit_date,
+        visit_date=record.visit_date or datetime.now(),
         allergies=record.allergies,
         previous_diseases=record.previous_diseases,
         medications=record.medications,
@@ -216,17 +478,100 @@ def add_medical_record(patient_id: int, record: MedicalRecordCreate, db: Session
     )
     db.add(new_record)
 
-    patient = db.query(Patient).filter(Patient.id == patient_id).first()
-    if patient:
-        patient.symptoms = record.symptoms
-        patient.allergies = record.allergies
-        patient.previous_diseases = record.previous_diseases
-        patient.medications = record.medications
-        patient.weight = record.weight
-        patient.height = record.height
-        db.add(patient)
+    patient.symptoms = record.symptoms
+    patient.allergies = record.allergies
+    patient.previous_diseases = record.previous_diseases
+    patient.medications = record.medications
+    patient.weight = record.weight
+    patient.height = record.height
+    db.add(patient)
 
-    db.commit()
-    db.refresh(patient)
+    await reindex_for_search(db, patient_id)
+    await db.commit()
 
     return {"message": "✅ Medical record added and patient updated"}
+
+# -------------------------------
+# Consent-based sharing and timeline
+# -------------------------------
+
+@router.get("/timeline/cache-stats")
+def get_timeline_cache_stats():
+    return timeline_cache.stats()
+
+@router.get("/{patient_id}/timeline")
+async def get_patient_timeline(
+    patient_id: int,
+    patient: Patient = Depends(get_scoped_patient),
+    db: AsyncSession = Depends(get_async_db)
+):
+    # ✅ Records, diagnoses and treatment plans from every consenting hospital, cached per patient
+    timeline = await get_timeline(db, patient_id)
+    if timeline is None:
+        raise HTTPException(status_code=404, detail="Patient not found")
+    return timeline
+
+@router.post("/{patient_id}/consents")
+async def grant_consent(
+    patient_id: int,
+    consent: ConsentCreate,
+    patient: Patient = Depends(get_scoped_patient),
+    db: AsyncSession = Depends(get_async_db)
+):
+    if consent.linked_patient_id is not None:
+        linked = await db.get(Patient, consent.linked_patient_id)
+        if not linked or linked.hospital_id != consent.hospital_id:
+            raise HTTPException(status_code=400, detail="Linked patient does not belong to that hospital")
+
+    existing = await db.scalar(select(PatientConsent).where(
+        PatientConsent.patient_id == patient_id, PatientConsent.hospital_id == consent.hospital_id
+    ))
+    if existing:
+        # Re-granting reactivates the same row
+        existing.linked_patient_id = consent.linked_patient_id
+        existing.granted_at = datetime.now()
+        existing.revoked_at = None
+    else:
+        db.add(PatientConsent(
+            patient_id=patient_id,
+            hospital_id=consent.hospital_id,
+            linked_patient_id=consent.linked_patient_id,
+            granted_at=datetime.now(),
+        ))
+    await db.commit()
+    return {"message": "✅ Consent granted", "patient_id": patient_id, "hospital_id": consent.hospital_id}
+
+@router.get("/{patient_id}/consents")
+async def list_consents(
+    patient_id: int,
+    patient: Patient = Depends(get_scoped_patient),
+    db: AsyncSession = Depends(get_async_db)
+):
+    consents = await db.scalars(select(PatientConsent).where(PatientConsent.patient_id == patient_id))
+    return [
+        {
+            "hospital_id": c.hospital_id,
+            "linked_patient_id": c.linked_patient_id,
+            "granted_at": c.granted_at,
+            "revoked_at": c.revoked_at,
+        }
+        for c in consents
+    ]
+
+@router.delete("/{patient_id}/consents/{hospital_id}")
+async def revoke_consent(
+    patient_id: int,
+    hospital_id: int,
+    patient: Patient = Depends(get_scoped_patient),
+    db: AsyncSession = Depends(get_async_db)
+):
+    consent = await db.scalar(select(PatientConsent).where(
+        PatientConsent.patient_id == patient_id,
+        PatientConsent.hospital_id == hospital_id,
+        PatientConsent.revoked_at.is_(None),
+    ))
+    if not consent:
+        raise HTTPException(status_code=404, detail="No active consent for that hospital")
+    consent.revoked_at = datetime.now()
+    await db.commit()
+    return {"message": "🗑️ Consent revoked"}
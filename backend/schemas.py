@@ -1,6 +1,16 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, field_validator
 from typing import List, Optional
-from datetime import datetime
+from datetime import date, datetime
+
+from parsing import parse_date, parse_datetime, parse_number
+
+
+def _lenient(parse, value):
+    # Blank means missing; text that doesn't parse is left for pydantic to reject
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return None
+    parsed = parse(value)
+    return value if parsed is None else parsed
 
 # -------------------------------
 # Hospital Schemas
@@ -17,6 +27,9 @@ class HospitalLogin(BaseModel):
     email: str
     password: str
 
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
 # -------------------------------
 # Patient Schemas
 # -------------------------------
@@ -25,27 +38,48 @@ class PatientCreate(BaseModel):
     name: str
     age: int
     contact: str
-    dob: str
+    dob: Optional[date] = None
     symptoms: str
     allergies: Optional[str] = None
     previous_diseases: Optional[str] = None
-    weight: Optional[str] = None
-    height: Optional[str] = None
+    weight: Optional[float] = None  # kg
+    height: Optional[float] = None  # cm
     hospital_id: int
     medications: Optional[str] = None
 
+    @field_validator("dob", mode="before")
+    @classmethod
+    def parse_dob(cls, value):
+        return _lenient(parse_date, value)
+
+    @field_validator("weight", "height", mode="before")
+    @classmethod
+    def parse_measurement(cls, value):
+        return _lenient(parse_number, value)
+
 # -------------------------------
 # Medical Record Schemas
 # -------------------------------
 
 class MedicalRecordCreate(BaseModel):
     symptoms: str
-    visit_date: str
+    visit_date: Optional[datetime] = None  # defaults to now
     allergies: str
     previous_diseases: str
     medications: str
-    weight: str
-    height: str
+    weight: Optional[float] = None  # kg
+    height: Optional[float] = None  # cm
+    document_summary: Optional[str] = None
+
+    @field_validator("visit_date", mode="before")
+    @classmethod
+    def parse_visit_date(cls, value):
+        return _lenient(parse_datetime, value)
+
+    @field_validator("weight", "height", mode="before")
+    @classmethod
+    def parse_measurement(cls, value):
+        return _lenient(parse_number, value)
 
 # -------------------------------
 # Disease History Schemas
@@ -54,7 +88,12 @@ class MedicalRecordCreate(BaseModel):
 class DiseaseHistoryCreate(BaseModel):
     symptoms: str
     predicted_disease: str
-    created_at: Optional[str] = None  # Optional during creation
+    created_at: Optional[datetime] = None  # Optional during creation
+
+    @field_validator("created_at", mode="before")
+    @classmethod
+    def parse_created_at(cls, value):
+        return _lenient(parse_datetime, value)
 
 # -------------------------------
 # Treatment Plan Schemas
@@ -66,3 +105,44 @@ class TreatmentPlanCreate(BaseModel):
     tests: str
     precaution: str
     disease_id: int  # FK to DiseaseHistory
+
+# -------------------------------
+# Consent Schemas
+# -------------------------------
+
+class ConsentCreate(BaseModel):
+    hospital_id: int  # hospital being granted access
+    linked_patient_id: Optional[int] = None  # same person's record at that hospital
+
+# -------------------------------
+# Document Extraction Schemas
+# -------------------------------
+
+class PatientExtraction(BaseModel):
+    """Fields the LLM extracts from an uploaded document; missing ones are empty strings."""
+    name: str = ""
+    birth_date: str = ""
+    weight: str = ""
+    height: str = ""
+    allergies: str = ""
+    medications: str = ""
+    insurance_provider: str = ""
+    insurance_expiry: str = ""
+    notable_conditions: str = ""
+    immunizations: str = ""
+    disease: str = ""
+    insights: str = ""
+    treatment: str = ""
+    precautions: str = ""
+
+    @field_validator("*", mode="before")
+    @classmethod
+    def flatten(cls, value):
+        # Models answer with lists, numbers or null about as often as with strings
+        if value is None:
+            return ""
+        if isinstance(value, (list, tuple)):
+            return ", ".join(str(v).strip() for v in value if v not in (None, ""))
+        if isinstance(value, dict):
+            return ", ".join(f"{k}: {v}" for k, v in value.items() if v not in (None, ""))
+        return str(value).strip()
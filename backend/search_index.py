@@ -0,0 +1,155 @@
+# search_index.py
+# Full-text index over each patient's free text: demographics, symptoms,
+# medical_summary and every MedicalRecord.document_summary, one document per
+# patient. Postgres keeps it in patient_search_documents with a generated
+# tsvector column and a GIN index; SQLite uses an FTS5 virtual table whose
+# rowid is the patient id. Writers call reindex_patients() inside their own
+# transaction so the index commits together with the rows it describes.
+# Other databases have no index and fall back to an unranked LIKE scan.
+
+import re
+from typing import Iterable
+
+from sqlalchemy import text, bindparam
+
+SEARCH_LANGUAGE = "english"
+
+_DOCUMENT_COLUMNS = ["name", "symptoms", "allergies", "previous_diseases", "medications", "medical_summary"]
+
+
+def _document_sql(dialect: str) -> str:
+    # One SELECT producing (patient_id, hospital_id, document) for the patients in :ids
+    if dialect == "postgresql":
+        parts = ", ".join(f"p.{c}" for c in _DOCUMENT_COLUMNS)
+        records = "(SELECT string_agg(r.document_summary, ' ') FROM medical_records r WHERE r.patient_id = p.id)"
+        document = f"concat_ws(' ', {parts}, {records})"
+    else:
+        parts = " || ' ' || ".join(f"coalesce(p.{c}, '')" for c in _DOCUMENT_COLUMNS)
+        records = "coalesce((SELECT group_concat(r.document_summary, ' ') FROM medical_records r WHERE r.patient_id = p.id), '')"
+        document = f"{parts} || ' ' || {records}"
+    return f"SELECT p.id, p.hospital_id, {document} FROM patients p"
+
+
+def create_index(conn):
+    dialect = conn.dialect.name
+    if dialect == "postgresql":
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS patient_search_documents ("
+            " patient_id INTEGER PRIMARY KEY REFERENCES patients (id) ON DELETE CASCADE,"
+            " hospital_id INTEGER,"
+            " document TEXT,"
+            f" document_tsv tsvector GENERATED ALWAYS AS (to_tsvector('{SEARCH_LANGUAGE}', coalesce(document, ''))) STORED)"
+        ))
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_patient_search_documents_tsv ON patient_search_documents USING GIN (document_tsv)"
+        ))
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_patient_search_documents_hospital_id ON patient_search_documents (hospital_id)"
+        ))
+        conn.execute(text(
+            f"INSERT INTO patient_search_documents (patient_id, hospital_id, document) {_document_sql(dialect)} "
+            "ON CONFLICT (patient_id) DO NOTHING"
+        ))
+    elif dialect == "sqlite":
+        conn.execute(text(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS patient_search USING fts5("
+            "hospital_id UNINDEXED, document, tokenize = 'porter unicode61')"
+        ))
+        conn.execute(text(
+            f"INSERT INTO patient_search (rowid, hospital_id, document) {_document_sql(dialect)} "
+            "WHERE p.id NOT IN (SELECT rowid FROM patient_search)"
+        ))
+
+
+def reindex_patients(session, patient_ids: Iterable[int]):
+    """Rebuild the search documents of ``patient_ids`` in the session's transaction."""
+    ids = sorted({pid for pid in patient_ids if pid is not None})
+    if not ids:
+        return
+    dialect = session.get_bind().dialect.name
+    select_docs = _document_sql(dialect) + " WHERE p.id IN :ids"
+    if dialect == "postgresql":
+        session.execute(text(
+            f"INSERT INTO patient_search_documents (patient_id, hospital_id, document) {select_docs} "
+            "ON CONFLICT (patient_id) DO UPDATE SET hospital_id = excluded.hospital_id, document = excluded.document"
+        ).bindparams(bindparam("ids", expanding=True)), {"ids": ids})
+    elif dialect == "sqlite":
+        # FTS5 has no upsert; replacing by rowid touches only this patient's postings
+        session.execute(text("DELETE FROM patient_search WHERE rowid IN :ids")
+                        .bindparams(bindparam("ids", expanding=True)), {"ids": ids})
+        session.execute(text(f"INSERT INTO patient_search (rowid, hospital_id, document) {select_docs}")
+                        .bindparams(bindparam("ids", expanding=True)), {"ids": ids})
+
+
+def remove_patients(session, patient_ids: Iterable[int]):
+    ids = sorted(set(patient_ids))
+    if not ids:
+        return
+    dialect = session.get_bind().dialect.name
+    if dialect == "postgresql":
+        statement = text("DELETE FROM patient_search_documents WHERE patient_id IN :ids")
+    elif dialect == "sqlite":
+        statement = text("DELETE FROM patient_search WHERE rowid IN :ids")
+    else:
+        return
+    session.execute(statement.bindparams(bindparam("ids", expanding=True)), {"ids": ids})
+
+
+def _fts5_query(query: str) -> str:
+    # Quote every term so user input can't inject FTS5 syntax; terms are ANDed like websearch_to_tsquery
+    return " ".join('"' + term + '"' for term in re.findall(r"\w+", query))
+
+
+def _like_term(term: str) -> str:
+    # "!" as the LIKE escape: a backslash would need quoting differently per database
+    escaped = term.lower().replace("!", "!!").replace("%", "!%").replace("_", "!_")
+    return f"%{escaped}%"
+
+
+def _like_scan_sql(terms: int):
+    # Every term must appear in one of the patient's columns or any of their records
+    conditions = []
+    for i in range(terms):
+        columns = " OR ".join(f"lower(p.{c}) LIKE :term_{i} ESCAPE '!'" for c in _DOCUMENT_COLUMNS)
+        records = (f"EXISTS (SELECT 1 FROM medical_records r WHERE r.patient_id = p.id"
+                   f" AND lower(r.document_summary) LIKE :term_{i} ESCAPE '!')")
+        conditions.append(f"({columns} OR {records})")
+    return text(
+        "SELECT p.id AS patient_id, 0.0 AS rank, NULL AS snippet FROM patients p"
+        f" WHERE p.hospital_id = :hospital_id AND {' AND '.join(conditions) or '1 = 0'}"
+        " ORDER BY p.id LIMIT :limit OFFSET :offset"
+    )
+
+
+def search_sql(dialect: str, params: dict = None):
+    """Ranked (patient_id, rank, snippet) rows for :q within :hospital_id, best first.
+
+    ``params`` from :func:`search_params` is only needed for the LIKE fallback,
+    whose statement has one placeholder per term.
+    """
+    if dialect == "postgresql":
+        return text(
+            "SELECT d.patient_id, ts_rank_cd(d.document_tsv, q) AS rank,"
+            f" ts_headline('{SEARCH_LANGUAGE}', d.document, q, 'MaxFragments=2, MaxWords=12, MinWords=4') AS snippet"
+            f" FROM patient_search_documents d, websearch_to_tsquery('{SEARCH_LANGUAGE}', :q) q"
+            " WHERE d.hospital_id = :hospital_id AND d.document_tsv @@ q"
+            " ORDER BY rank DESC, d.patient_id LIMIT :limit OFFSET :offset"
+        )
+    if dialect == "sqlite":
+        # bm25() is lower-is-better; negate it so both backends rank descending
+        return text(
+            "SELECT rowid AS patient_id, -bm25(patient_search) AS rank,"
+            " snippet(patient_search, 1, '<b>', '</b>', '…', 12) AS snippet"
+            " FROM patient_search WHERE patient_search MATCH :q AND hospital_id = :hospital_id"
+            " ORDER BY bm25(patient_search), rowid LIMIT :limit OFFSET :offset"
+        )
+    return _like_scan_sql(sum(1 for key in (params or {}) if key.startswith("term_")))
+
+
+def search_params(dialect: str, query: str) -> dict:
+    if dialect == "postgresql":
+        return {"q": query}
+    if dialect == "sqlite":
+        return {"q": _fts5_query(query)}
+    terms = re.findall(r"\w+", query)
+    return {"q": " ".join(terms), **{f"term_{i}": _like_term(term) for i, term in enumerate(terms)}}
@@ -0,0 +1,185 @@
+import logging
+import os
+import secrets
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+import jwt
+from dotenv import load_dotenv
+from fastapi import Depends, HTTPException
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from sqlalchemy import delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import get_async_db
+from models import Patient, UsedRefreshToken
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+JWT_SECRET = os.getenv("JWT_SECRET")
+JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
+ACCESS_TOKEN_TTL = int(os.getenv("ACCESS_TOKEN_TTL", "900"))  # seconds
+REFRESH_TOKEN_TTL = int(os.getenv("REFRESH_TOKEN_TTL", str(7 * 24 * 3600)))
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+# Local development only: without JWT_SECRET, sign with a random secret of this process
+JWT_DEV_SECRET = os.getenv("JWT_DEV_SECRET", "false").lower() in ("1", "true", "yes")
+
+if not JWT_SECRET:
+    if not JWT_DEV_SECRET:
+        # A per-process secret breaks every token issued by another worker or before a restart
+        raise RuntimeError("JWT_SECRET is not set; set it, or JWT_DEV_SECRET=true for local development")
+    JWT_SECRET = secrets.token_urlsafe(32)
+    logger.warning("JWT_SECRET is not set; using a random per-process secret (JWT_DEV_SECRET)")
+
+
+@dataclass(frozen=True)
+class CurrentHospital:
+    id: int
+    name: str
+
+
+class TokenError(Exception):
+    pass
+
+
+def _issue(hospital_id: int, name: str, token_type: str, ttl: int) -> str:
+    now = int(time.time())
+    claims = {
+        "sub": str(hospital_id),
+        "name": name,
+        "type": token_type,
+        "iat": now,
+        "exp": now + ttl,
+        "jti": uuid.uuid4().hex,
+    }
+    return jwt.encode(claims, JWT_SECRET, algorithm=JWT_ALGORITHM)
+
+
+def issue_tokens(hospital_id: int, name: str) -> dict:
+    return {
+        "access_token": _issue(hospital_id, name, "access", ACCESS_TOKEN_TTL),
+        "refresh_token": _issue(hospital_id, name, "refresh", REFRESH_TOKEN_TTL),
+        "token_type": "bearer",
+        "expires_in": ACCESS_TOKEN_TTL,
+    }
+
+
+def decode_token(token: str, token_type: str) -> dict:
+    try:
+        claims = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM], options={"require": ["exp", "sub"]})
+    except jwt.PyJWTError as e:
+        raise TokenError(str(e)) from e
+    if claims.get("type") != token_type:
+        raise TokenError(f"Expected a {token_type} token")
+    return claims
+
+
+class TokenVerifier:
+    """Access-token verification with an LRU of already-verified tokens.
+
+    A token's signature and claims never change, so once verified only its
+    expiry needs re-checking; a cache hit is a dict lookup and a clock read.
+    """
+
+    def __init__(self, maxsize: int = TOKEN_CACHE_SIZE, clock: Callable[[], float] = time.time):
+        self.maxsize = maxsize
+        self.clock = clock
+        self._verified = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def verify(self, token: str) -> CurrentHospital:
+        with self._lock:
+            entry = self._verified.get(token)
+            if entry is not None:
+                expires, hospital = entry
+                if expires > self.clock():
+                    self._verified.move_to_end(token)
+                    self.hits += 1
+                    return hospital
+                del self._verified[token]
+            self.misses += 1
+
+        claims = decode_token(token, "access")
+        hospital = CurrentHospital(id=int(claims["sub"]), name=claims.get("name", ""))
+        if self.maxsize > 0:
+            with self._lock:
+                self._verified[token] = (claims["exp"], hospital)
+                while len(self._verified) > self.maxsize:
+                    self._verified.popitem(last=False)
+        return hospital
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else None,
+            "entries": len(self._verified),
+        }
+
+
+class RefreshTokenStore:
+    """Single-use refresh tokens: each jti can be exchanged once, on any worker.
+
+    Used ids are rows of ``used_refresh_tokens`` keyed on the jti, so the
+    primary key decides which of two concurrent exchanges wins. Rows are
+    purged once the token would have expired anyway.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.time, purge_every: int = 1000):
+        self.clock = clock
+        self.purge_every = purge_every
+        self._consumed = 0
+
+    async def consume(self, db: AsyncSession, claims: dict) -> bool:
+        db.add(UsedRefreshToken(jti=claims["jti"], expires_at=int(claims["exp"])))
+        try:
+            await db.commit()
+        except IntegrityError:
+            await db.rollback()
+            return False
+        self._consumed += 1
+        if self._consumed % self.purge_every == 0:
+            await db.execute(delete(UsedRefreshToken).where(UsedRefreshToken.expires_at <= int(self.clock())))
+            await db.commit()
+        return True
+
+
+token_verifier = TokenVerifier()
+refresh_tokens = RefreshTokenStore()
+bearer = HTTPBearer(auto_error=False)
+
+
+async def get_current_hospital(credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer)) -> CurrentHospital:
+    if credentials is None:
+        raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+    try:
+        return token_verifier.verify(credentials.credentials)
+    except TokenError as e:
+        raise HTTPException(status_code=401, detail=f"Invalid token: {e}", headers={"WWW-Authenticate": "Bearer"})
+
+
+def require_hospital(hospital_id: Optional[int], current: CurrentHospital):
+    if hospital_id != current.id:
+        raise HTTPException(status_code=403, detail="Not allowed for this hospital")
+
+
+async def get_scoped_patient(
+    patient_id: int,
+    current: CurrentHospital = Depends(get_current_hospital),
+    db: AsyncSession = Depends(get_async_db),
+) -> Patient:
+    # Loaded into the request's session, so the endpoint's own db.get() is an identity-map hit
+    patient = await db.get(Patient, patient_id)
+    if not patient:
+        raise HTTPException(status_code=404, detail="Patient not found")
+    require_hospital(patient.hospital_id, current)
+    return patient
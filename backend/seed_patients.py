@@ -1,13 +1,15 @@
-from faker import Faker
+import argparse
 import random
+from faker import Faker
 from sqlalchemy.orm import Session
 from database import SessionLocal
-from models import Patient, MedicalRecord, DiseaseHistory
+from bulk_import import import_patients, IMPORT_CHUNK_SIZE
 
 faker = Faker()
 
 HOSPITAL_ID = 1
 NUM_PATIENTS = 100
+LOAD_TEST_PATIENTS = 1_000_000
 
 SYMPTOMS = [
     "Fever", "Cough", "Fatigue", "Headache", "Shortness of breath", "Chest pain",
@@ -18,17 +20,26 @@ ALLERGIES = ["Dust", "Pollen", "Peanuts", "None", "Seafood", "Penicillin"]
 DISEASES = ["Asthma", "Diabetes", "Hypertension", "Migraine", "COVID-19", "Tuberculosis"]
 MEDICATIONS = ["Paracetamol", "Ibuprofen", "Metformin", "Aspirin", "Antihistamines"]
 
-def generate_dummy_patient():
-    name = faker.name()
-    age = random.randint(1, 90)
-    contact = faker.phone_number()
-    dob = faker.date_of_birth(minimum_age=1, maximum_age=90).strftime("%Y-%m-%d")
+# Faker is slow per call; sampling from pre-built pools keeps million-row runs fast
+POOL_SIZE = 2000
+
+
+def build_pools():
+    return {
+        "names": [faker.name() for _ in range(POOL_SIZE)],
+        "contacts": [faker.phone_number() for _ in range(POOL_SIZE)],
+        "dobs": [faker.date_of_birth(minimum_age=1, maximum_age=90) for _ in range(POOL_SIZE)],
+        "visit_dates": [faker.date_time_this_year() for _ in range(POOL_SIZE)],
+        "history_dates": [faker.date_time_this_year() for _ in range(POOL_SIZE)],
+    }
+
+
+def generate_dummy_patient(pools):
     symptoms_list = random.sample(SYMPTOMS, k=random.randint(1, 4))
-    symptoms = ", ".join(symptoms_list)
     allergies = random.choice(ALLERGIES)
     previous_diseases = random.choice(DISEASES)
-    weight = str(random.randint(30, 100))
-    height = str(random.randint(120, 200))
+    weight = random.randint(30, 100)
+    height = random.randint(120, 200)
     medications = random.choice(MEDICATIONS)
 
     summary = (
@@ -37,57 +48,43 @@ def generate_dummy_patient():
         f"Currently taking {medications}. Vitals: {weight}kg, {height}cm."
     )
 
-    return Patient(
-        name=name,
-        age=age,
-        contact=contact,
-        dob=dob,
-        symptoms=symptoms,
-        allergies=allergies,
-        previous_diseases=previous_diseases,
-        weight=weight,
-        height=height,
-        medical_summary=summary,
-        hospital_id=HOSPITAL_ID,
-        medications=medications,
-    )
-
-def seed_database():
-    db: Session = SessionLocal()
+    return {
+        "name": random.choice(pools["names"]),
+        "age": random.randint(1, 90),
+        "contact": random.choice(pools["contacts"]),
+        "dob": random.choice(pools["dobs"]),
+        "symptoms": ", ".join(symptoms_list),
+        "allergies": allergies,
+        "previous_diseases": previous_diseases,
+        "weight": weight,
+        "height": height,
+        "medical_summary": summary,
+        "medications": medications,
+        # Initial medical record and disease history rows
+        "visit_date": random.choice(pools["visit_dates"]),
+        "predicted_disease": previous_diseases,
+        "created_at": random.choice(pools["history_dates"]),
+    }
 
-    for _ in range(NUM_PATIENTS):
-        patient = generate_dummy_patient()
-        db.add(patient)
-        db.commit()
-        db.refresh(patient)
 
-        # Create medical record
-        record = MedicalRecord(
-            patient_id=patient.id,
-            symptoms=patient.symptoms,
-            document_summary=patient.medical_summary,
-            visit_date=faker.date_this_year().strftime("%Y-%m-%d"),
-            allergies=patient.allergies,
-            previous_diseases=patient.previous_diseases,
-            medications=patient.medications,
-            weight=patient.weight,
-            height=patient.height
-        )
-        db.add(record)
-
-        # Create disease history
-        disease = DiseaseHistory(
-            patient_id=patient.id,
-            symptoms=patient.symptoms,
-            predicted_disease=patient.previous_diseases,
-            created_at=faker.date_time_this_year().strftime("%Y-%m-%d %H:%M")
-        )
-        db.add(disease)
-
-        db.commit()
+def seed_database(num_patients: int = NUM_PATIENTS, hospital_id: int = HOSPITAL_ID, chunk_size: int = IMPORT_CHUNK_SIZE):
+    db: Session = SessionLocal()
+    pools = build_pools()
+    try:
+        rows = (generate_dummy_patient(pools) for _ in range(num_patients))
+        stats = import_patients(db, rows, hospital_id, chunk_size=chunk_size)
+    finally:
+        db.close()
+    print(f"✅ Seeded {stats['patients']} patients with records into hospital_id={hospital_id} "
+          f"in {stats['seconds']}s ({stats['rows_per_sec']} rows/sec)")
 
-    db.close()
-    print(f"✅ Seeded {NUM_PATIENTS} patients with records into hospital_id={HOSPITAL_ID}")
 
 if __name__ == "__main__":
-    seed_database()
+    parser = argparse.ArgumentParser(description="Seed synthetic patients")
+    parser.add_argument("--count", type=int, default=NUM_PATIENTS)
+    parser.add_argument("--hospital-id", type=int, default=HOSPITAL_ID)
+    parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+    parser.add_argument("--load-test", action="store_true",
+                        help=f"generate {LOAD_TEST_PATIENTS:,} patients for load testing")
+    args = parser.parse_args()
+    seed_database(LOAD_TEST_PATIENTS if args.load_test else args.count, args.hospital_id, args.chunk_size)
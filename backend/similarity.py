@@ -0,0 +1,353 @@
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from inference import _encode_keys, _symptom_key, normalize_symptoms
+from model_registry import ModelBundle, registry
+from models import Patient, DiseaseHistory
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+SIMILARITY_BUILD_CHUNK = int(os.getenv("SIMILARITY_BUILD_CHUNK", "100000"))
+# Rebuild from the database after this many seconds (0: only on model changes), which bounds
+# how long writes made by other worker processes go unseen
+SIMILARITY_INDEX_TTL = float(os.getenv("SIMILARITY_INDEX_TTL", "600"))
+
+# Bits set per byte, for NumPy builds without np.bitwise_count
+_POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+_HAS_BITWISE_COUNT = hasattr(np, "bitwise_count")
+
+# (patient_id, hospital_id, symptoms, predicted_disease)
+Profile = Tuple[int, Optional[int], Sequence[str], Optional[str]]
+
+
+def popcount(words: np.ndarray) -> np.ndarray:
+    """Number of set bits in each element of a 1-D uint64 array."""
+    if _HAS_BITWISE_COUNT:
+        return np.bitwise_count(words)
+    return _POPCOUNT8[words.view(np.uint8)].reshape(-1, 8).sum(axis=1, dtype=np.uint8)
+
+
+def pack_keys(bundle: ModelBundle, keys: Sequence[Tuple[int, ...]], n_words: int) -> np.ndarray:
+    # Encoder columns -> one bit each, little-endian within 64-bit words
+    dense = _encode_keys(bundle, keys).toarray().astype(bool)
+    packed = np.packbits(dense, axis=1, bitorder="little")
+    padded = np.zeros((len(keys), n_words * 8), dtype=np.uint8)
+    padded[:, :packed.shape[1]] = packed
+    return padded.view(np.uint64)
+
+
+class SimilarityIndex:
+    """Exact Jaccard nearest neighbours over every patient's latest symptom set.
+
+    Each patient is one column of a packed bit matrix: one bit per encoder
+    column, 64 symptoms per uint64 word, stored word-major so each word of
+    every patient is one contiguous array. A query ANDs only its non-zero
+    words against those arrays, popcounts the result, and turns
+    intersection sizes into Jaccard scores using each patient's
+    precomputed popcount. Rows are upserted in place when a patient gets a new
+    DiseaseHistory entry and removed when the patient is deleted; the matrix
+    is rebuilt from the database when the model (and so the symptom
+    vocabulary) changes, and every ``ttl`` seconds to pick up other
+    processes' writes.
+    """
+
+    def __init__(self, model_registry=registry, ttl: float = SIMILARITY_INDEX_TTL,
+                 clock: Callable[[], float] = time.monotonic):
+        self.registry = model_registry
+        self.ttl = ttl
+        self.clock = clock
+        self.built_at: Optional[float] = None
+        self.version: Optional[str] = None
+        self.n_words = 0
+        self.size = 0
+        self._bits = np.zeros((0, 0), dtype=np.uint64)
+        self._counts = np.zeros(0, dtype=np.int32)
+        self._patient_ids = np.zeros(0, dtype=np.int64)
+        self._hospital_ids = np.zeros(0, dtype=np.int64)
+        self._disease_codes = np.zeros(0, dtype=np.int32)
+        self._diseases: List[Optional[str]] = []
+        self._disease_code: Dict[Optional[str], int] = {}
+        self._row_of: Dict[int, int] = {}
+        self._lock = threading.RLock()
+        self._pending: Dict[int, Optional[Profile]] = {}  # None: remove the patient
+        self._pending_lock = threading.Lock()
+        self.build_ms: Optional[float] = None
+        self.upserts = 0
+        self.removals = 0
+
+    # -- storage -----------------------------------------------------------
+
+    def _reset(self, bundle: ModelBundle, capacity: int):
+        self.version = bundle.version
+        self.n_words = max(1, -(-len(bundle.vocabulary) // 64))
+        self.size = 0
+        capacity = max(capacity, 1024)
+        self._bits = np.zeros((self.n_words, capacity), dtype=np.uint64)
+        self._counts = np.zeros(capacity, dtype=np.int32)
+        self._patient_ids = np.zeros(capacity, dtype=np.int64)
+        self._hospital_ids = np.full(capacity, -1, dtype=np.int64)
+        self._disease_codes = np.zeros(capacity, dtype=np.int32)
+        self._diseases = []
+        self._disease_code = {}
+        self._row_of = {}
+
+    def _reserve(self, needed: int):
+        capacity = len(self._counts)
+        if needed <= capacity:
+            return
+        capacity = max(needed, capacity * 2)
+        # Amortized doubling; queries only ever look at rows [:size]
+        bits = np.zeros((self.n_words, capacity), dtype=np.uint64)
+        bits[:, :self._bits.shape[1]] = self._bits
+        self._bits = bits
+        self._counts = np.resize(self._counts, capacity)
+        self._patient_ids = np.resize(self._patient_ids, capacity)
+        self._hospital_ids = np.resize(self._hospital_ids, capacity)
+        self._disease_codes = np.resize(self._disease_codes, capacity)
+
+    def _code(self, disease: Optional[str]) -> int:
+        code = self._disease_code.get(disease)
+        if code is None:
+            code = self._disease_code[disease] = len(self._diseases)
+            self._diseases.append(disease)
+        return code
+
+    def _write(self, bundle: ModelBundle, profiles: List[Profile]):
+        keys = [_symptom_key(bundle, normalize_symptoms(symptoms)) for _, _, symptoms, _ in profiles]
+        bits = pack_keys(bundle, keys, self.n_words)
+        rows = []
+        for patient_id, _, _, _ in profiles:
+            row = self._row_of.get(patient_id)
+            if row is None:
+                row = self._row_of[patient_id] = self.size
+                self.size += 1
+                self._reserve(self.size)
+            rows.append(row)
+        rows = np.asarray(rows, dtype=np.int64)
+        self._bits[:, rows] = bits.T
+        self._counts[rows] = [len(key) for key in keys]
+        self._patient_ids[rows] = [p[0] for p in profiles]
+        self._hospital_ids[rows] = [-1 if p[1] is None else p[1] for p in profiles]
+        self._disease_codes[rows] = [self._code(p[3]) for p in profiles]
+
+    def _delete(self, patient_ids: List[int]):
+        # Move the last row into each freed slot so rows [:size] stay dense
+        for patient_id in patient_ids:
+            row = self._row_of.pop(patient_id, None)
+            if row is None:
+                continue
+            last = self.size - 1
+            if row != last:
+                self._bits[:, row] = self._bits[:, last]
+                self._counts[row] = self._counts[last]
+                self._patient_ids[row] = self._patient_ids[last]
+                self._hospital_ids[row] = self._hospital_ids[last]
+                self._disease_codes[row] = self._disease_codes[last]
+                self._row_of[int(self._patient_ids[row])] = row
+            self.size -= 1
+            self.removals += 1
+
+    # -- building and updating ---------------------------------------------
+
+    def build(self, profiles: Iterable[Profile], bundle: Optional[ModelBundle] = None, expected_rows: int = 0):
+        bundle = bundle or self.registry.current()
+        started = time.perf_counter()
+        with self._lock:
+            self._reset(bundle, expected_rows)
+            chunk = []
+            for profile in profiles:
+                chunk.append(profile)
+                if len(chunk) >= SIMILARITY_BUILD_CHUNK:
+                    self._write(bundle, chunk)
+                    chunk = []
+            if chunk:
+                self._write(bundle, chunk)
+            self._drain()
+            self.built_at = self.clock()
+        self.build_ms = (time.perf_counter() - started) * 1000
+        logger.info("Built similarity index over %d patients in %.1f ms", self.size, self.build_ms)
+
+    def upsert(self, profiles: List[Profile]):
+        """Replace (or add) the rows of these patients.
+
+        Called from commit hooks on the event loop, so it never waits for a
+        search or rebuild: profiles are queued and applied by whichever call
+        holds the index lock next.
+        """
+        if not profiles:
+            return
+        self._enqueue({profile[0]: profile for profile in profiles})
+
+    def remove(self, patient_ids: Iterable[int]):
+        """Drop these patients' rows, e.g. after the patients were deleted; queued like upsert."""
+        self._enqueue({patient_id: None for patient_id in patient_ids})
+
+    def _enqueue(self, changes: Dict[int, Optional[Profile]]):
+        if not changes or self.version is None:
+            return
+        with self._pending_lock:
+            self._pending.update(changes)
+        if self._lock.acquire(blocking=False):
+            try:
+                self._drain()
+            finally:
+                self._lock.release()
+
+    def _drain(self):
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+        if not pending or self.version is None:
+            return
+        self._delete([patient_id for patient_id, profile in pending.items() if profile is None])
+        profiles = [profile for profile in pending.values() if profile is not None]
+        if not profiles:
+            return
+        bundle = self.registry.current()
+        if bundle.version != self.version:
+            return  # the next search rebuilds against the new vocabulary anyway
+        self._write(bundle, profiles)
+        self.upserts += len(profiles)
+
+    def invalidate(self):
+        with self._lock:
+            self.version = None
+
+    def _expired(self) -> bool:
+        return bool(self.ttl) and self.built_at is not None and self.clock() - self.built_at >= self.ttl
+
+    def ensure_current(self, loader=None) -> ModelBundle:
+        # (Re)build from the database on first use, when the model version changes and when the TTL runs out
+        bundle = self.registry.current()
+        with self._lock:
+            if self.version != bundle.version or self._expired():
+                (loader or load_profiles_from_db)(self, bundle)
+        return bundle
+
+    # -- querying ----------------------------------------------------------
+
+    def search(self, symptoms: Sequence[str], k: int = 10, hospital_id: Optional[int] = None,
+               exclude_patient_id: Optional[int] = None) -> List[dict]:
+        with self._lock:
+            bundle = self.ensure_current()
+            self._drain()
+            key = _symptom_key(bundle, normalize_symptoms(symptoms))
+            if not key or self.size == 0:
+                return []
+            query = pack_keys(bundle, [key], self.n_words)[0]
+            n = self.size
+            intersection = np.zeros(n, dtype=np.uint16)
+            for word in np.flatnonzero(query):
+                intersection += popcount(self._bits[word, :n] & query[word])
+
+            # Only patients sharing at least one symptom can score above zero
+            candidates = intersection > 0
+            if hospital_id is not None:
+                candidates &= self._hospital_ids[:n] == hospital_id
+            if exclude_patient_id is not None and exclude_patient_id in self._row_of:
+                candidates[self._row_of[exclude_patient_id]] = False
+            rows = np.flatnonzero(candidates)
+            if len(rows) == 0:
+                return []
+
+            shared = intersection[rows]
+            # |a ∪ b| >= len(key) >= 1, so no division by zero
+            scores = np.divide(shared, self._counts[rows] + len(key) - shared, dtype=np.float32)
+            k = min(k, len(rows))
+            kth = np.partition(scores, len(rows) - k)[len(rows) - k]
+            # Everything tied with the k-th best is kept, so the cut doesn't depend on row order
+            keep = scores >= kth
+            rows, scores = rows[keep], scores[keep]
+            # Best score first; lower patient id breaks ties so results are stable
+            order = np.lexsort((self._patient_ids[rows], -scores))[:k]
+            rows, scores = rows[order], scores[order]
+            return [
+                {
+                    "patient_id": int(self._patient_ids[row]),
+                    "hospital_id": None if self._hospital_ids[row] < 0 else int(self._hospital_ids[row]),
+                    "similarity": round(float(score), 4),
+                    "predicted_disease": self._diseases[self._disease_codes[row]],
+                }
+                for row, score in zip(rows, scores)
+            ]
+
+    def stats(self) -> dict:
+        return {
+            "version": self.version,
+            "patients": self.size,
+            "words_per_row": self.n_words,
+            "matrix_mb": round(self._bits.nbytes / (1024 * 1024), 2),
+            "build_ms": round(self.build_ms, 1) if self.build_ms is not None else None,
+            "upserts": self.upserts,
+            "removals": self.removals,
+            "age_seconds": round(self.clock() - self.built_at, 1) if self.built_at is not None else None,
+            "ttl_seconds": self.ttl,
+        }
+
+
+def latest_profiles_query():
+    # Each patient's most recent DiseaseHistory row: the symptoms and the diagnosis given for them
+    latest_ids = select(func.max(DiseaseHistory.id)).group_by(DiseaseHistory.patient_id)
+    return (
+        select(DiseaseHistory.patient_id, Patient.hospital_id, DiseaseHistory.symptoms, DiseaseHistory.predicted_disease)
+        .join(Patient, Patient.id == DiseaseHistory.patient_id)
+        .where(DiseaseHistory.id.in_(latest_ids))
+    )
+
+
+def load_profiles_from_db(index: SimilarityIndex, bundle: ModelBundle):
+    db = SessionLocal()
+    try:
+        expected = db.scalar(select(func.count(func.distinct(DiseaseHistory.patient_id)))) or 0
+        rows = db.execute(latest_profiles_query().execution_options(yield_per=SIMILARITY_BUILD_CHUNK))
+        index.build(
+            ((pid, hospital_id, (symptoms or "").split(","), disease) for pid, hospital_id, symptoms, disease in rows),
+            bundle=bundle,
+            expected_rows=expected,
+        )
+    finally:
+        db.close()
+
+
+similarity_index = SimilarityIndex()
+
+
+# ---------------------------------------------------------------------------
+# Incremental updates: new DiseaseHistory rows replace the patient's profile
+# ---------------------------------------------------------------------------
+
+@event.listens_for(Session, "before_flush")
+def _collect_history(session, flush_context, instances):
+    new_rows = [obj for obj in session.new if isinstance(obj, DiseaseHistory)]
+    if not new_rows or similarity_index.version is None:
+        return
+    hospitals = dict(session.connection().execute(
+        select(Patient.id, Patient.hospital_id).where(Patient.id.in_({h.patient_id for h in new_rows}))
+    ).all())
+    pending = session.info.setdefault("similarity_pending", {})
+    for history in new_rows:
+        pending[history.patient_id] = (
+            history.patient_id, hospitals.get(history.patient_id),
+            (history.symptoms or "").split(","), history.predicted_disease,
+        )
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_history(session):
+    pending = session.info.pop("similarity_pending", None)
+    if pending:
+        similarity_index.upsert(list(pending.values()))
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_history(session):
+    session.info.pop("similarity_pending", None)
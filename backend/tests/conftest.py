@@ -0,0 +1,60 @@
+import os
+import sys
+import tempfile
+import uuid
+
+import pytest
+
+# Modules live flat in backend/, the way the API and scripts import them
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Never a real database or cache: everything goes into a throwaway directory
+_workdir = tempfile.mkdtemp(prefix="medicare-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_workdir, 'test.db')}"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+os.environ["OCR_CACHE_PATH"] = os.path.join(_workdir, "ocr_cache.sqlite3")
+os.environ["INGEST_DB_PATH"] = os.path.join(_workdir, "ingest_jobs.sqlite3")
+os.environ["OCR_SPOOL_DIR"] = os.path.join(_workdir, "spool")
+os.makedirs(os.environ["OCR_SPOOL_DIR"])
+os.environ["INGEST_UPLOAD_DIR"] = os.path.join(_workdir, "uploads")
+os.environ["JWT_SECRET"] = "test-only-secret-not-for-production-use"
+os.environ["LLM_BACKEND"] = "fake"
+
+
+@pytest.fixture
+def client():
+    from fastapi.testclient import TestClient
+
+    import main
+    from ratelimit import MemoryBackend, rate_limiter
+
+    # Fresh counters per test, so earlier tests' logins don't trip the limits, and time
+    # stopped at the start of a window, so a test never straddles a window boundary
+    def frozen():
+        return 3600.0 * 500_000
+
+    saved = rate_limiter.backend, rate_limiter.clock
+    rate_limiter.backend, rate_limiter.clock = MemoryBackend(clock=frozen), frozen
+    try:
+        with TestClient(main.app) as test_client:
+            yield test_client
+    finally:
+        rate_limiter.backend, rate_limiter.clock = saved
+
+
+@pytest.fixture
+def hospital(client):
+    """A registered hospital: its id, credentials and an Authorization header."""
+    email = f"{uuid.uuid4().hex[:12]}@example.com"
+    password = "correct horse battery staple"
+    response = client.post("/auth/register", json={
+        "name": "Test Hospital", "address": "1 Test Street", "email": email, "phone": "000", "password": password,
+    })
+    response.raise_for_status()
+    body = response.json()
+    return {
+        "id": body["hospital_id"],
+        "email": email,
+        "password": password,
+        "headers": {"Authorization": f"Bearer {body['access_token']}"},
+    }
@@ -0,0 +1,38 @@
+from database import SessionLocal
+from models import Hospital
+
+
+def register(client, email="auth@example.com"):
+    response = client.post("/auth/register", json={
+        "name": "Auth Hospital", "address": "1 Test Street", "email": email, "phone": "000", "password": "pw",
+    })
+    response.raise_for_status()
+    return response.json()
+
+
+def test_refresh_token_works_once(client, hospital):
+    refresh_token = client.post("/auth/login", json={
+        "email": hospital["email"], "password": hospital["password"],
+    }).json()["refresh_token"]
+    first = client.post("/auth/refresh", json={"refresh_token": refresh_token})
+    assert first.status_code == 200
+    assert first.json()["hospital_id"] == hospital["id"]
+    assert client.get("/auth/me", headers={"Authorization": f"Bearer {first.json()['access_token']}"}).json() == {
+        "hospital_id": hospital["id"], "name": "Test Hospital",
+    }
+    assert client.post("/auth/refresh", json={"refresh_token": refresh_token}).status_code == 401
+
+
+def test_access_token_is_not_a_refresh_token(client, hospital):
+    access_token = hospital["headers"]["Authorization"].split()[1]
+    assert client.post("/auth/refresh", json={"refresh_token": access_token}).status_code == 401
+
+
+def test_deleted_hospital_cannot_refresh(client):
+    body = register(client, "deleted@example.com")
+    with SessionLocal() as db:
+        db.delete(db.get(Hospital, body["hospital_id"]))
+        db.commit()
+    response = client.post("/auth/refresh", json={"refresh_token": body["refresh_token"]})
+    assert response.status_code == 401
+    assert response.json()["detail"] == "Hospital no longer exists"
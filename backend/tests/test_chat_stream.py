@@ -0,0 +1,91 @@
+import asyncio
+import json
+from contextlib import aclosing
+
+import pytest
+
+from llm import FakeLLMBackend, LLMClient
+
+REPLY = "Stay hydrated, rest, and see a doctor if the fever lasts more than three days."
+
+
+class TrackingBackend(FakeLLMBackend):
+    """Records whether each upstream stream was closed, as Groq's would be."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.closed = []
+
+    async def stream(self, model, messages):
+        try:
+            async for delta in super().stream(model, messages):
+                yield delta
+        finally:
+            self.closed.append(True)
+
+
+def ask(text: str):
+    return [{"role": "user", "content": text}]
+
+
+def test_stream_yields_the_reply_in_pieces_and_caches_it():
+    backend = TrackingBackend(reply=REPLY)
+    client = LLMClient(backend=backend)
+
+    async def collect():
+        return [delta async for delta in client.stream(ask("fever?"))]
+
+    deltas = asyncio.run(collect())
+    assert len(deltas) > 1 and "".join(deltas) == REPLY
+    assert backend.closed == [True]
+    # Replayed from the cache as one chunk, also for complete()
+    assert asyncio.run(collect()) == [REPLY]
+    assert asyncio.run(client.complete(ask("fever?"))) == REPLY
+    assert backend.calls == 1
+
+
+def test_stopping_early_closes_upstream_and_caches_nothing():
+    backend = TrackingBackend(reply=REPLY)
+    client = LLMClient(backend=backend)
+
+    async def first_delta():
+        async with aclosing(client.stream(ask("fever?"))) as deltas:
+            async for delta in deltas:
+                return delta
+
+    assert REPLY.startswith(asyncio.run(first_delta()))
+    assert backend.closed == [True]
+    assert client.stats()["entries"] == 0
+
+
+def sse_events(body: str):
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields.get("event", "message"), json.loads(fields["data"])))
+    return events
+
+
+@pytest.fixture
+def chat_backend(monkeypatch):
+    import routers.ai_assistant
+
+    backend = TrackingBackend(reply=REPLY)
+    monkeypatch.setattr(routers.ai_assistant, "llm_client", LLMClient(backend=backend))
+    return backend
+
+
+def test_chat_stream_endpoint_sends_deltas_then_done(client, hospital, chat_backend):
+    body = {"messages": [{"role": "user", "content": "Any advice?"}]}
+    with client.stream("POST", "/ai/chat/stream", headers=hospital["headers"], json=body) as response:
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        assert response.headers["cache-control"] == "no-cache"
+        events = sse_events(response.read().decode())
+
+    *deltas, (event, done) = events
+    assert len(deltas) > 1 and all(name == "message" for name, _ in deltas)
+    assert "".join(data["delta"] for _, data in deltas) == REPLY
+    assert event == "done"
+    assert 0 <= done["ttft_ms"] <= done["total_ms"]
+    assert chat_backend.closed == [True]
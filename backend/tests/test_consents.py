@@ -0,0 +1,58 @@
+from datetime import datetime
+
+from sqlalchemy import DateTime, create_engine, inspect, text
+
+from database import SessionLocal
+from migrations import _0004_typed_consent_timestamps
+from models import Patient
+
+
+def test_consent_timestamps_round_trip_as_datetimes(client, hospital):
+    with SessionLocal() as db:
+        patient = Patient(name="Ada", age=36, contact="000", symptoms="cough", hospital_id=hospital["id"])
+        db.add(patient)
+        db.commit()
+        patient_id = patient.id
+    other = client.post("/auth/register", json={
+        "name": "Other", "address": "2 Test Street", "email": "consent-other@example.com", "phone": "0", "password": "pw",
+    }).json()["hospital_id"]
+    url = f"/patients/{patient_id}/consents"
+
+    before = datetime.now()
+    assert client.post(url, headers=hospital["headers"], json={"hospital_id": other}).status_code == 200
+    [consent] = client.get(url, headers=hospital["headers"]).json()
+    assert consent["revoked_at"] is None
+    assert datetime.fromisoformat(consent["granted_at"]) >= before.replace(microsecond=0)
+
+    assert client.delete(f"{url}/{other}", headers=hospital["headers"]).status_code == 200
+    [consent] = client.get(url, headers=hospital["headers"]).json()
+    assert datetime.fromisoformat(consent["revoked_at"]) >= datetime.fromisoformat(consent["granted_at"])
+    assert client.delete(f"{url}/{other}", headers=hospital["headers"]).status_code == 404
+
+
+def test_migration_types_stored_consent_strings(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE patient_consents (id INTEGER PRIMARY KEY, patient_id INTEGER, hospital_id INTEGER, "
+            "linked_patient_id INTEGER, granted_at VARCHAR, revoked_at VARCHAR)"
+        ))
+        conn.execute(text(
+            "INSERT INTO patient_consents (id, patient_id, hospital_id, granted_at, revoked_at) VALUES "
+            "(1, 1, 2, '2024-05-01T09:30:00.123456', NULL), "
+            "(2, 1, 3, '2024-05-01T09:30:00', '2024-06-01T10:00:00'), "
+            "(3, 1, 4, 'yesterday', 'some time ago')"
+        ))
+    with engine.begin() as conn:
+        _0004_typed_consent_timestamps(conn)
+        # Running it again is a no-op
+        _0004_typed_consent_timestamps(conn)
+
+    columns = {c["name"]: c["type"] for c in inspect(engine).get_columns("patient_consents")}
+    assert isinstance(columns["granted_at"], DateTime) and isinstance(columns["revoked_at"], DateTime)
+    with engine.connect() as conn:
+        rows = {row.id: row for row in conn.execute(text("SELECT id, granted_at, revoked_at FROM patient_consents"))}
+    assert rows[1].granted_at.startswith("2024-05-01 09:30:00.123456") and rows[1].revoked_at is None
+    assert rows[2].revoked_at.startswith("2024-06-01 10:00:00")
+    # An unreadable revocation stays revoked rather than reactivating the consent
+    assert rows[3].granted_at is None and rows[3].revoked_at is not None
@@ -0,0 +1,189 @@
+import asyncio
+import json
+import re
+
+import pytest
+
+from extraction import (CHARS_PER_TOKEN, ExtractionError, ExtractionPipeline, merge_extractions,
+                        parse_json_object, split_into_chunks)
+from llm import FakeLLMBackend, LLMClient
+from schemas import PatientExtraction
+
+
+class Sleeps:
+    """Records backoff delays instead of waiting them out."""
+
+    def __init__(self):
+        self.delays = []
+
+    async def __call__(self, delay):
+        self.delays.append(delay)
+
+
+def pipeline(reply, **kwargs):
+    backend = FakeLLMBackend(reply=reply)
+    kwargs.setdefault("sleep", Sleeps())
+    return ExtractionPipeline(client=LLMClient(backend=backend), **kwargs), backend
+
+
+def prompt_text(messages) -> str:
+    return messages[-1]["content"]
+
+
+def part_of(messages) -> int:
+    return int(re.search(r"part (\d+) of \d+", prompt_text(messages)).group(1))
+
+
+# Chunking
+
+def test_short_text_is_one_chunk():
+    assert split_into_chunks("Patient: Ada\nAllergies: none\n", max_tokens=100) == ["Patient: Ada\nAllergies: none\n"]
+    assert split_into_chunks("", max_tokens=100) == [""]
+
+
+def test_chunks_fit_the_token_budget_and_overlap():
+    lines = [f"line {i:03d} " + "x" * 20 + "\n" for i in range(40)]  # 30 characters each
+    chunks = split_into_chunks("".join(lines), max_tokens=40, overlap_tokens=10)
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 40 * CHARS_PER_TOKEN for chunk in chunks)
+    for previous, current in zip(chunks, chunks[1:]):
+        # One 30-character line fits the 30-character overlap
+        assert current.startswith(previous.splitlines(keepends=True)[-1])
+    seen = {line for chunk in chunks for line in chunk.splitlines(keepends=True)}
+    assert seen == set(lines)
+
+
+def test_overlong_line_is_cut_on_whitespace():
+    line = " ".join(["word"] * 100)  # 499 characters
+    chunks = split_into_chunks(line, max_tokens=20, overlap_tokens=0)
+    assert all(len(chunk) <= 20 * CHARS_PER_TOKEN for chunk in chunks)
+    assert "".join(chunks) == line
+    assert all(not chunk.startswith("ord") for chunk in chunks)
+
+
+# Reply parsing
+
+@pytest.mark.parametrize("reply", [
+    '{"name": "Ada", "allergies": "penicillin"}',
+    'Here is the JSON:\n```json\n{"name": "Ada", "allergies": "penicillin"}\n```\nLet me know!',
+    '{\n  "name": "Ada", // from the header\n  "allergies": "penicillin"\n}',
+    '{"name": "Ada", "allergies": "penicillin",}',
+    '```\n{\n  "name": "Ada",\n  "allergies": "penicillin", // page 2\n}\n```',
+])
+def test_parse_json_object_tolerates_llm_formatting(reply):
+    assert parse_json_object(reply) == {"name": "Ada", "allergies": "penicillin"}
+
+
+def test_parse_json_object_keeps_slashes_inside_strings():
+    assert parse_json_object('{"notes": "see http://example.com", "x": 1,}') == {"notes": "see http://example.com", "x": 1}
+
+
+@pytest.mark.parametrize("reply", ["I could not find any patient data.", '{"name": "Ada"', '{"name": Ada}'])
+def test_parse_json_object_rejects_non_json(reply):
+    with pytest.raises(ExtractionError):
+        parse_json_object(reply)
+
+
+# Merging
+
+def test_merge_extractions():
+    merged = merge_extractions([
+        PatientExtraction(name="Ada Lovelace", allergies="Penicillin, peanuts", insights="Stable.", weight="60 kg"),
+        PatientExtraction(name="A. Lovelace", allergies="peanuts; latex", insights="Stable.", weight="61 kg"),
+        PatientExtraction(name="A. Lovelace", medications="ibuprofen", insights="Improving.", weight=""),
+    ])
+    assert merged.name == "A. Lovelace"  # the value most chunks agree on
+    assert merged.weight == "60 kg"  # a tie goes to the earliest chunk
+    assert merged.allergies == "Penicillin, peanuts, latex"  # union, case-insensitive
+    assert merged.medications == "ibuprofen"
+    assert merged.insights == "Stable. Improving."  # distinct texts joined
+    assert merged.disease == ""
+
+
+# The pipeline against the fake backend
+
+def test_pipeline_extracts_every_chunk_and_merges():
+    def reply(messages):
+        part = part_of(messages)
+        return json.dumps({"name": "Ada", "medications": f"drug{part}", "insights": f"Part {part}."})
+
+    extraction, backend = pipeline(reply, chunk_tokens=40, overlap_tokens=10)
+    text = "".join(f"line {i:03d} " + "x" * 20 + "\n" for i in range(40))
+    expected_chunks = len(split_into_chunks(text, 40, 10))
+
+    result = asyncio.run(extraction.extract(text, name="Ada"))
+    assert len(result.chunks) == expected_chunks and backend.calls == expected_chunks
+    assert result.fields.name == "Ada"
+    assert result.fields.medications == ", ".join(f"drug{i}" for i in range(1, expected_chunks + 1))
+    assert result.report()["failed_chunks"] == 0
+    assert extraction.stats()["chunk_calls"] == expected_chunks
+
+
+def test_failed_calls_are_retried_with_backoff():
+    failures = {"left": 2}
+
+    def reply(messages):
+        if failures["left"]:
+            failures["left"] -= 1
+            raise RuntimeError("429 Too Many Requests")
+        return '{"name": "Ada"}'
+
+    sleeps = Sleeps()
+    extraction, backend = pipeline(reply, retries=3, backoff=0.5, sleep=sleeps)
+    result = asyncio.run(extraction.extract("Patient: Ada"))
+    assert result.fields.name == "Ada"
+    assert result.chunks[0].attempts == 3 and backend.calls == 3
+    assert extraction.retried == 2
+    # Exponential backoff with up to 100% jitter
+    assert 0.5 <= sleeps.delays[0] < 1.0 and 1.0 <= sleeps.delays[1] < 2.0
+
+
+def test_retries_give_up():
+    def reply(messages):
+        raise RuntimeError("upstream down")
+
+    extraction, backend = pipeline(reply, retries=2)
+    result = asyncio.run(extraction.extract("Patient: Ada"))
+    assert result.fields is None
+    assert result.chunks[0].attempts == 3 and backend.calls == 3
+    assert result.chunks[0].error == "LLM call failed: upstream down"
+    assert extraction.stats()["failed_chunks"] == 1
+
+
+def test_unparseable_reply_is_not_retried():
+    extraction, backend = pipeline("Sorry, I can't help with that.", retries=3)
+    result = asyncio.run(extraction.extract("Patient: Ada"))
+    assert result.fields is None
+    assert result.chunks[0].attempts == 1 and backend.calls == 1
+    assert "No JSON object" in result.chunks[0].error
+
+
+def test_one_failed_chunk_does_not_lose_the_others():
+    def reply(messages):
+        return "not json" if part_of(messages) == 2 else json.dumps({"allergies": f"a{part_of(messages)}"})
+
+    extraction, _ = pipeline(reply, chunk_tokens=40, overlap_tokens=0)
+    text = "".join(f"line {i:03d} " + "x" * 20 + "\n" for i in range(12))
+    result = asyncio.run(extraction.extract(text))
+    assert [chunk.error is not None for chunk in result.chunks] == [False, True, False]
+    assert result.fields.allergies == "a1, a3"
+
+
+def test_concurrency_is_bounded():
+    active, peak = 0, 0
+
+    class SlowBackend(FakeLLMBackend):
+        async def complete(self, model, messages):
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+            return await super().complete(model, messages)
+
+    extraction = ExtractionPipeline(client=LLMClient(backend=SlowBackend()), chunk_tokens=40,
+                                    overlap_tokens=0, concurrency=2)
+    text = "".join(f"line {i:03d} " + "x" * 20 + "\n" for i in range(40))
+    result = asyncio.run(extraction.extract(text))
+    assert len(result.chunks) > 2
+    assert peak == 2
@@ -0,0 +1,58 @@
+import asyncio
+
+from ingest_queue import JobQueue, WorkerPool
+
+
+def crash(queue, job):
+    """What a worker dying mid-job leaves behind: a running job, started long ago."""
+    queue._connection().execute("UPDATE ingest_jobs SET started_at = 0 WHERE id = ?", (job["id"],))
+
+
+def test_a_job_that_keeps_crashing_its_worker_is_failed(tmp_path):
+    upload = tmp_path / "scan.pdf"
+    upload.write_bytes(b"%PDF-1.4")
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"), job_timeout=60, max_attempts=2)
+    job_id = queue.enqueue({"name": "Ada"}, upload_path=str(upload))
+
+    for attempt in (1, 2):
+        job = queue.claim()
+        assert job["id"] == job_id and queue.get(job_id)["attempts"] == attempt
+        crash(queue, job)
+
+    assert queue.claim() is None
+    job = queue.get(job_id)
+    assert job["status"] == "failed" and "2 attempts" in job["error"]
+    assert job["finished_at"] is not None
+    assert not upload.exists()
+
+
+def test_a_running_job_is_not_reclaimed_before_the_timeout(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"), job_timeout=60, max_attempts=1)
+    job_id = queue.enqueue({"name": "Ada"})
+
+    assert queue.claim()["id"] == job_id
+    assert queue.claim() is None
+    assert queue.get(job_id)["status"] == "running"
+
+
+def test_workers_remove_the_upload_once_the_job_finishes(tmp_path):
+    upload = tmp_path / "scan.pdf"
+    upload.write_bytes(b"%PDF-1.4")
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"))
+    job_id = queue.enqueue({"name": "Ada"}, upload_path=str(upload))
+
+    async def handler(job):
+        return {"patient_id": 1}
+
+    async def run():
+        pool = WorkerPool(queue, size=1, poll_interval=0.01)
+        pool.start(handler)
+        try:
+            while queue.get(job_id)["status"] != "done":
+                await asyncio.sleep(0.01)
+        finally:
+            await pool.stop()
+
+    asyncio.run(asyncio.wait_for(run(), timeout=5))
+    assert queue.get(job_id)["result"] == {"patient_id": 1}
+    assert not upload.exists()
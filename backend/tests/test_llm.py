@@ -0,0 +1,135 @@
+import asyncio
+
+import pytest
+
+from llm import FakeLLMBackend, LLMClient
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def ask(text: str, role: str = "user"):
+    return [{"role": role, "content": text}]
+
+
+def test_repeated_requests_are_served_from_the_cache():
+    backend = FakeLLMBackend(reply="Rest and fluids.")
+    client = LLMClient(backend=backend)
+
+    async def main():
+        first = await client.complete(ask("What helps a cold?"))
+        # Whitespace and role case don't change the key
+        second = await client.complete(ask("  What helps\n a cold? ", role="User"))
+        return first, second
+
+    assert asyncio.run(main()) == ("Rest and fluids.", "Rest and fluids.")
+    assert backend.calls == 1
+    assert client.stats()["hits"] == 1 and client.stats()["misses"] == 1
+
+
+def test_different_models_and_messages_are_cached_separately():
+    assert LLMClient.cache_key("a", ask("x")) != LLMClient.cache_key("b", ask("x"))
+    assert LLMClient.cache_key("a", ask("x")) != LLMClient.cache_key("a", ask("y"))
+
+
+def test_entries_expire_after_the_ttl():
+    clock = Clock()
+    backend = FakeLLMBackend(reply="ok")
+    client = LLMClient(backend=backend, ttl=60, clock=clock)
+    asyncio.run(client.complete(ask("x")))
+    clock.now = 59
+    asyncio.run(client.complete(ask("x")))
+    assert backend.calls == 1
+    clock.now = 61
+    asyncio.run(client.complete(ask("x")))
+    assert backend.calls == 2
+
+
+def test_least_recently_used_entry_is_evicted():
+    backend = FakeLLMBackend(reply=lambda messages: messages[0]["content"].upper())
+    client = LLMClient(backend=backend, maxsize=2)
+
+    async def main():
+        for text in ["a", "b", "a", "c", "a", "b"]:
+            await client.complete(ask(text))
+
+    asyncio.run(main())
+    # "b" was evicted by "c" and fetched again; "a" stayed warm throughout
+    assert backend.calls == 4
+    assert client.stats()["entries"] == 2
+
+
+def test_concurrent_identical_requests_share_one_upstream_call():
+    backend = FakeLLMBackend(reply="shared", latency=0.02)
+    client = LLMClient(backend=backend)
+
+    async def main():
+        return await asyncio.gather(*(client.complete(ask("same question")) for _ in range(10)))
+
+    assert asyncio.run(main()) == ["shared"] * 10
+    assert backend.calls == 1
+    stats = client.stats()
+    assert stats["upstream_calls"] == 1 and stats["coalesced"] == 9 and stats["in_flight"] == 0
+
+
+def test_a_cancelled_caller_does_not_cancel_the_shared_call():
+    backend = FakeLLMBackend(reply="done", latency=0.05)
+    client = LLMClient(backend=backend)
+
+    async def main():
+        first = asyncio.ensure_future(client.complete(ask("q")))
+        second = asyncio.ensure_future(client.complete(ask("q")))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(main()) == "done"
+    assert backend.calls == 1
+
+
+def test_failures_reach_every_waiter_and_are_not_cached():
+    failures = {"left": 1}
+
+    def reply(messages):
+        if failures["left"]:
+            failures["left"] -= 1
+            raise RuntimeError("503 from upstream")
+        return "recovered"
+
+    backend = FakeLLMBackend(reply=reply, latency=0.01)
+    client = LLMClient(backend=backend)
+
+    async def main():
+        return await asyncio.gather(client.complete(ask("q")), client.complete(ask("q")), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert client.stats()["in_flight"] == 0
+    assert asyncio.run(client.complete(ask("q"))) == "recovered"
+
+
+@pytest.mark.parametrize("ttl, maxsize", [(0, 10), (60, 0)])
+def test_caching_can_be_turned_off(ttl, maxsize):
+    backend = FakeLLMBackend(reply="ok")
+    client = LLMClient(backend=backend, ttl=ttl, maxsize=maxsize)
+    asyncio.run(client.complete(ask("x")))
+    asyncio.run(client.complete(ask("x")))
+    assert backend.calls == 2
+
+
+def test_chat_endpoint_reuses_the_cached_completion(client, hospital, monkeypatch):
+    import routers.ai_assistant
+
+    backend = FakeLLMBackend(reply="  Drink water.  ")
+    monkeypatch.setattr(routers.ai_assistant, "llm_client", LLMClient(backend=backend))
+    body = {"messages": [{"role": "user", "content": "Any advice?"}]}
+    for _ in range(3):
+        response = client.post("/ai/chat", headers=hospital["headers"], json=body)
+        assert response.status_code == 200
+        assert response.json() == {"reply": "Drink water."}
+    assert backend.calls == 1
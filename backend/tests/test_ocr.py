@@ -0,0 +1,161 @@
+import asyncio
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+
+import ocr
+
+
+def is_closed(image) -> bool:
+    try:
+        image.getpixel((0, 0))
+    except ValueError:
+        return True
+    return False
+
+
+class FakePoppler:
+    """Stands in for convert_from_path, recording what each call rasterized."""
+
+    def __init__(self, blank_pages=(), delay: float = 0.0, size=(200, 100)):
+        self.blank_pages = set(blank_pages)
+        self.delay = delay
+        self.size = size
+        self.calls = []
+        self.images = []
+        self.active = 0
+        self.peak = 0
+        self.peak_open = 0  # rasters not yet closed when a new one is made
+        self._lock = threading.Lock()
+
+    def __call__(self, path, dpi, first_page, last_page, grayscale):
+        with self._lock:
+            self.calls.append((first_page, last_page))
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(self.delay)
+        width, height = self.size
+        image = Image.new("L", self.size, 255)
+        if first_page not in self.blank_pages:
+            ImageDraw.Draw(image).rectangle((width // 10, height // 5, width * 9 // 10, height * 4 // 5), fill=0)
+        with self._lock:
+            self.images.append(image)
+            self.peak_open = max(self.peak_open, sum(not is_closed(i) for i in self.images))
+            self.active -= 1
+        return [image]
+
+
+class FakeTesseract:
+    def __init__(self):
+        self.images = []
+
+    def image_to_string(self, image, lang):
+        self.images.append(image)
+        return f"text {len(self.images)}\n"
+
+
+@pytest.fixture
+def poppler(monkeypatch):
+    fake = FakePoppler()
+    monkeypatch.setattr(ocr, "convert_from_path", fake)
+    return fake
+
+
+@pytest.fixture
+def tesseract(monkeypatch):
+    fake = FakeTesseract()
+    monkeypatch.setattr(ocr, "pytesseract", fake)
+    return fake
+
+
+def test_ocr_page_rasterizes_one_page_and_closes_every_image(poppler, tesseract):
+    result = ocr._ocr_page("doc.pdf", 3, 200, "eng")
+    assert poppler.calls == [(3, 3)]
+    assert result.page == 3 and result.path == "ocr" and result.text == "text 1\n"
+    # The raster and the binarized copy handed to Tesseract are both released
+    assert len(tesseract.images) == 1
+    assert all(is_closed(image) for image in poppler.images + tesseract.images)
+
+
+def test_blank_page_skips_tesseract(poppler, tesseract):
+    poppler.blank_pages = {1}
+    result = ocr._ocr_page("doc.pdf", 1, 200, "eng")
+    assert result.path == "blank" and result.text == ""
+    assert tesseract.images == []
+    assert all(is_closed(image) for image in poppler.images)
+
+
+def test_preprocess_binarizes():
+    image = Image.new("L", (50, 50), 230)
+    ImageDraw.Draw(image).rectangle((10, 10, 40, 40), fill=30)
+    binarized = np.asarray(ocr.preprocess(image))
+    assert set(np.unique(binarized)) == {0, 255}
+    assert ocr.preprocess(Image.new("L", (50, 50), 250)) is None
+
+
+def test_engine_ocrs_each_page_once_in_order_with_bounded_concurrency(poppler, tesseract, monkeypatch, tmp_path):
+    poppler.delay = 0.02
+    texts = ["", "Embedded text layer with more than enough characters to skip OCR.", "", "", ""]
+    monkeypatch.setattr(ocr, "_page_count", lambda path: len(texts))
+    monkeypatch.setattr(ocr, "_text_layer", lambda path: texts)
+    document = tmp_path / "doc.pdf"
+    document.write_bytes(b"%PDF-1.4 test")
+
+    engine = ocr.OcrEngine(pool_size=4, page_concurrency=2, cache=None)
+    # Threads instead of worker processes, so the fakes above apply
+    engine._executor = ThreadPoolExecutor(max_workers=4)
+    try:
+        result = asyncio.run(engine.extract_file(str(document)))
+    finally:
+        engine.shutdown(wait=True)
+
+    assert [p.page for p in result.pages] == [1, 2, 3, 4, 5]
+    assert [p.path for p in result.pages] == ["ocr", "text", "ocr", "ocr", "ocr"]
+    assert sorted(poppler.calls) == [(1, 1), (3, 3), (4, 4), (5, 5)]
+    assert poppler.peak <= 2
+    assert all(is_closed(image) for image in poppler.images + tesseract.images)
+
+
+def run_document(monkeypatch, tmp_path, poppler, pages: int, pool_size: int, page_concurrency: int):
+    monkeypatch.setattr(ocr, "_page_count", lambda path: pages)
+    monkeypatch.setattr(ocr, "_text_layer", lambda path: [])
+    document = tmp_path / "doc.pdf"
+    document.write_bytes(b"%PDF-1.4 test")
+    engine = ocr.OcrEngine(pool_size=pool_size, page_concurrency=page_concurrency, cache=None)
+    engine._executor = ThreadPoolExecutor(max_workers=pool_size)
+    tracemalloc.start()
+    try:
+        result = asyncio.run(engine.extract_file(str(document)))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        engine.shutdown(wait=True)
+    assert len(result.pages) == pages
+    return peak
+
+
+def test_memory_ceiling_does_not_grow_with_page_count(poppler, tesseract, monkeypatch, tmp_path):
+    # Letter-size pages at 100 dpi, ~0.9 MB per raster
+    poppler.size = (850, 1100)
+    poppler.delay = 0.002
+    pool_size, page_concurrency = 4, 2
+
+    tracemalloc.start()
+    try:
+        ocr._ocr_page("doc.pdf", 1, 100, "eng")
+        _, one_page = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    peak = run_document(monkeypatch, tmp_path, poppler, 60, pool_size, page_concurrency)
+
+    # No more pages in flight, or rasters alive, than one document may have at once
+    assert poppler.peak <= min(pool_size, page_concurrency)
+    assert poppler.peak_open <= min(pool_size, page_concurrency)
+    assert all(is_closed(image) for image in poppler.images + tesseract.images)
+    # So the whole document peaks at about page_concurrency pages' worth of buffers
+    assert peak < page_concurrency * one_page * 1.5
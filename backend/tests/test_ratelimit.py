@@ -0,0 +1,164 @@
+import pytest
+from fastapi import HTTPException
+
+from ratelimit import MemoryBackend, RateLimiter, Rule
+
+
+class Clock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def limiter(clock):
+    return RateLimiter(backend=MemoryBackend(clock=clock), enabled=True)
+
+
+def test_rule_parse():
+    assert Rule.parse("login_ip", "20/60") == Rule(name="login_ip", limit=20, window=60.0)
+
+
+def test_limit_within_window(limiter):
+    rule = Rule("r", limit=3, window=60)
+    assert [limiter.hit(rule, "k") for _ in range(3)] == [None, None, None]
+    retry = limiter.hit(rule, "k")
+    assert retry is not None and 1.0 <= retry <= 60
+    # Other keys have their own counters
+    assert limiter.hit(rule, "other") is None
+
+
+def test_previous_window_is_weighted_by_overlap(limiter, clock):
+    rule = Rule("r", limit=4, window=60)
+    clock.now = 60 * 100  # start of a window
+    for _ in range(4):
+        assert limiter.hit(rule, "k") is None
+    # A quarter into the next window, 3/4 of the previous 4 still count
+    clock.now += 60 + 15
+    assert limiter.hit(rule, "k") is None  # 0 + 4 * 0.75 = 3 < 4
+    assert limiter.hit(rule, "k") is not None  # 1 + 3 = 4
+    # Near the end of the window the previous one has almost slid out
+    clock.now += 44
+    assert limiter.hit(rule, "k") is None
+
+
+def test_rejected_requests_are_not_counted(limiter, clock):
+    rule = Rule("r", limit=2, window=60)
+    clock.now = 60 * 100
+    limiter.hit(rule, "k")
+    limiter.hit(rule, "k")
+    for _ in range(10):
+        assert limiter.hit(rule, "k") is not None
+    clock.now += 120  # both windows have passed
+    assert limiter.hit(rule, "k") is None
+    assert limiter.stats()["rules"]["r"] == {"allowed": 3, "rejected": 10}
+
+
+def test_enforce_raises_429_with_retry_after(limiter):
+    rule = Rule("r", limit=1, window=30)
+    limiter.enforce([(rule, "k")])
+    with pytest.raises(HTTPException) as excinfo:
+        limiter.enforce([(rule, "k")])
+    assert excinfo.value.status_code == 429
+    assert 1 <= int(excinfo.value.headers["Retry-After"]) <= 30
+
+
+def test_enforce_does_not_spend_other_quota_when_one_rule_rejects(limiter):
+    per_ip, per_hospital = Rule("ip", limit=5, window=60), Rule("hospital", limit=1, window=60)
+    limiter.enforce([(per_ip, "1.2.3.4"), (per_hospital, "7")])
+    for _ in range(3):
+        with pytest.raises(HTTPException):
+            limiter.enforce([(per_ip, "1.2.3.4"), (per_hospital, "7")])
+    # Only the request that passed counted against the IP
+    assert limiter.stats()["rules"]["ip"]["allowed"] == 1
+    for _ in range(4):
+        assert limiter.hit(per_ip, "1.2.3.4") is None
+
+
+def test_uncounted_pairs_are_checked_but_only_recorded_explicitly(limiter):
+    rule = Rule("failures", limit=2, window=60)
+    for _ in range(5):
+        limiter.enforce([], uncounted=[(rule, "a@example.com")])
+    limiter.record(rule, "a@example.com")
+    limiter.record(rule, "a@example.com")
+    with pytest.raises(HTTPException):
+        limiter.enforce([], uncounted=[(rule, "a@example.com")])
+
+
+def test_disabled_limiter_allows_everything(clock):
+    limiter = RateLimiter(backend=MemoryBackend(clock=clock), enabled=False)
+    rule = Rule("r", limit=1, window=60)
+    assert all(limiter.hit(rule, "k") is None for _ in range(5))
+
+
+def _login(client, hospital, password):
+    return client.post("/auth/login", json={"email": hospital["email"], "password": password})
+
+
+def test_successful_logins_do_not_count_against_the_email(client, hospital):
+    from ratelimit import login_per_email
+
+    for _ in range(login_per_email.limit + 2):
+        assert _login(client, hospital, hospital["password"]).status_code == 200
+
+
+def test_failed_logins_lock_the_email(client, hospital):
+    from ratelimit import login_per_email
+
+    for _ in range(login_per_email.limit):
+        assert _login(client, hospital, "wrong").status_code == 400
+    response = _login(client, hospital, hospital["password"])
+    assert response.status_code == 429
+    assert "Retry-After" in response.headers
+
+
+def test_register_shares_the_login_ip_limit(client):
+    from ratelimit import login_per_ip
+
+    def register(i):
+        return client.post("/auth/register", json={
+            "name": "H", "address": "A", "email": f"limit-{i}@example.com", "phone": "0", "password": "pw",
+        })
+
+    assert all(register(i).status_code == 200 for i in range(login_per_ip.limit))
+    response = register(login_per_ip.limit)
+    assert response.status_code == 429
+    assert "Retry-After" in response.headers
+
+
+def test_patient_updates_spend_ocr_quota_only_with_a_document(client, hospital, monkeypatch):
+    import ratelimit
+    import routers.patient
+    from database import SessionLocal
+    from models import Patient
+    from ocr import OcrResult
+
+    class FakeOcr:
+        async def extract_file(self, path, digest=None):
+            return OcrResult(text="Follow-up visit.", pages=[], total_ms=0.0)
+
+    monkeypatch.setattr(routers.patient, "ocr_engine", FakeOcr())
+    monkeypatch.setattr(ratelimit, "ocr_per_hospital", Rule("ocr_hospital", limit=1, window=60))
+    with SessionLocal() as db:
+        patient = Patient(name="Ada", age=36, contact="000", symptoms="cough", hospital_id=hospital["id"])
+        db.add(patient)
+        db.commit()
+        patient_id = patient.id
+
+    def update(**kwargs):
+        return client.post(f"/patients/update/{patient_id}", headers=hospital["headers"], **kwargs)
+
+    for _ in range(3):
+        assert update(data={"medications": "ibuprofen"}).status_code == 200
+    document = {"document": ("scan.pdf", b"%PDF-1.4 test", "application/pdf")}
+    assert update(data={"symptoms": "cough"}, files=document).status_code == 200
+    assert update(data={"symptoms": "cough"}, files=document).status_code == 429
+    # Field edits still go through once the OCR quota is spent
+    assert update(data={"medications": "paracetamol"}).status_code == 200
@@ -0,0 +1,96 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from sqlalchemy.dialects import postgresql
+
+from database import SessionLocal
+from models import DiseaseHistory, MedicalRecord, Patient
+from timeline import time_range_query
+
+IMPORTED_AT = datetime(2024, 5, 1, 9, 30)
+
+
+@pytest.fixture
+def patient(hospital):
+    """A patient whose history came in through a bulk import: most rows share one timestamp."""
+    with SessionLocal() as db:
+        patient = Patient(name="Ada", age=36, contact="000", symptoms="cough", hospital_id=hospital["id"])
+        db.add(patient)
+        db.flush()
+        # Undated rows are what migration 0003 leaves behind for values it couldn't parse
+        visits = [None, IMPORTED_AT] + [IMPORTED_AT] * 6 + [None, IMPORTED_AT + timedelta(days=3),
+                                                            IMPORTED_AT - timedelta(days=10), None]
+        for i, visit in enumerate(visits):
+            db.add(MedicalRecord(patient_id=patient.id, symptoms=f"visit {i}", visit_date=visit))
+            db.add(DiseaseHistory(patient_id=patient.id, symptoms=f"visit {i}", predicted_disease="Flu",
+                                  created_at=visit))
+        db.commit()
+        return patient.id
+
+
+def pages(client, hospital, path, limit):
+    rows, params = [], {"limit": limit}
+    while True:
+        response = client.get(path, headers=hospital["headers"], params=params)
+        assert response.status_code == 200, response.text
+        page = response.json()
+        rows.extend(page)
+        if len(page) < limit:
+            return rows
+        last = page[-1]
+        params = {"limit": limit, "before_id": last["id"]}
+        date = last.get("visit_date", last.get("created_at"))
+        if date is not None:
+            params["until"] = date
+
+
+@pytest.mark.parametrize("path, column", [("/patients/{id}/records", "visit_date"),
+                                          ("/disease-history/{id}", "created_at")])
+@pytest.mark.parametrize("limit", [1, 2, 3, 5])
+def test_paging_visits_every_row_once(client, hospital, patient, path, column, limit):
+    rows = pages(client, hospital, path.format(id=patient), limit)
+    assert len(rows) == 12 and len({row["id"] for row in rows}) == 12
+    # Newest first, then the undated rows by id
+    dated = [row for row in rows if row[column] is not None]
+    assert len(dated) == 9
+    assert rows[:9] == dated
+    keys = [(row[column], row["id"]) for row in dated]
+    assert keys == sorted(keys, reverse=True)
+    undated = [row["id"] for row in rows[9:]]
+    assert undated == sorted(undated, reverse=True)
+
+
+@pytest.mark.parametrize("model, column", [(MedicalRecord, MedicalRecord.visit_date),
+                                           (DiseaseHistory, DiseaseHistory.created_at)])
+def test_undated_rows_sort_last_on_postgres_too(model, column):
+    # SQLite sorts NULLs last on DESC by itself; Postgres needs to be told
+    sql = str(time_range_query(model, column, 1).compile(dialect=postgresql.dialect()))
+    assert f"ORDER BY {model.__tablename__}.{column.key} DESC NULLS LAST" in sql
+
+
+def test_cursor_on_an_undated_row_continues_through_undated_rows(client, hospital, patient):
+    undated = [row for row in client.get(f"/patients/{patient}/records", headers=hospital["headers"]).json()
+               if row["visit_date"] is None]
+    newest = max(row["id"] for row in undated)
+    response = client.get(f"/patients/{patient}/records", headers=hospital["headers"],
+                          params={"before_id": newest})
+    assert [row["id"] for row in response.json()] == sorted((r["id"] for r in undated if r["id"] < newest),
+                                                            reverse=True)
+
+
+def test_until_alone_is_still_strictly_before(client, hospital, patient):
+    response = client.get(f"/patients/{patient}/records", headers=hospital["headers"],
+                          params={"until": IMPORTED_AT.isoformat()})
+    assert [row["symptoms"] for row in response.json()] == ["visit 10"]
+
+
+def test_timeline_is_sorted_by_date_with_undated_entries_last(client, hospital, patient):
+    response = client.get(f"/patients/{patient}/timeline", headers=hospital["headers"])
+    assert response.status_code == 200
+    entries = response.json()["entries"]
+    dates = [entry["date"] for entry in entries]
+    assert dates[-6:] == [None] * 6  # three undated records, three undated diagnoses
+    parsed = [datetime.fromisoformat(date) for date in dates[:-6]]
+    assert parsed == sorted(parsed, reverse=True)
+    assert parsed[0] == IMPORTED_AT + timedelta(days=3)
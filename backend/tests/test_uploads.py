@@ -0,0 +1,147 @@
+import hashlib
+import os
+
+import pytest
+
+import routers.patient
+import uploads
+from extraction import ExtractionPipeline
+from llm import FakeLLMBackend, LLMClient
+from ocr import OCR_SPOOL_DIR, OcrResult
+
+
+class RecordingOcrEngine:
+    def __init__(self):
+        self.calls = []
+
+    async def extract_file(self, path, digest=None):
+        with open(path, "rb") as f:
+            self.calls.append({"path": path, "digest": digest, "data": f.read()})
+        return OcrResult(text="Patient reports headache and fever.", pages=[], total_ms=0.0)
+
+
+@pytest.fixture
+def ocr_calls(monkeypatch):
+    engine = RecordingOcrEngine()
+    monkeypatch.setattr(routers.patient, "ocr_engine", engine)
+    return engine.calls
+
+
+def pdf(size: int) -> bytes:
+    return b"%PDF-1.4\n" + os.urandom(size - 9)
+
+
+def test_upload_is_written_once_to_the_spool_dir(client, hospital, ocr_calls, monkeypatch):
+    parsed = []
+    parse_multipart = uploads.parse_multipart
+
+    async def recording_parse(*args):
+        form = await parse_multipart(*args)
+        parsed.append(form)
+        return form
+
+    monkeypatch.setattr(uploads, "parse_multipart", recording_parse)
+    data = pdf(3 * 1024 * 1024 + 7)
+    response = client.post("/patients/extract-info", headers=hospital["headers"],
+                           files={"document": ("scan.pdf", data, "application/pdf")})
+    assert response.status_code == 200
+    [call] = ocr_calls
+    # OCR read the file the parser wrote, not a copy of it
+    assert call["path"] == parsed[0]["document"].path
+    assert call["data"] == data
+    assert call["digest"] == hashlib.sha256(data).hexdigest()
+    assert os.path.dirname(call["path"]) == OCR_SPOOL_DIR
+    assert os.listdir(OCR_SPOOL_DIR) == []
+
+
+@pytest.mark.parametrize("size", [4 * 1024, 512 * 1024])  # streamed past the limit / rejected on Content-Length
+def test_oversized_upload_is_rejected_without_leftovers(client, hospital, ocr_calls, monkeypatch, size):
+    monkeypatch.setattr(uploads, "MAX_UPLOAD_BYTES", 1024)
+    response = client.post("/patients/extract-info", headers=hospital["headers"],
+                           files={"document": ("scan.pdf", pdf(size), "application/pdf")})
+    assert response.status_code == 413
+    assert ocr_calls == []
+    assert os.listdir(OCR_SPOOL_DIR) == []
+
+
+def test_chunked_upload_without_content_length_is_cut_off(client, hospital, ocr_calls, monkeypatch):
+    monkeypatch.setattr(uploads, "MAX_UPLOAD_BYTES", 1024)
+    boundary = "testboundary"
+
+    def body():
+        yield (f"--{boundary}\r\nContent-Disposition: form-data; name=\"document\"; filename=\"scan.pdf\"\r\n"
+               "Content-Type: application/pdf\r\n\r\n").encode()
+        for _ in range(64):
+            yield b"x" * 1024
+        yield f"\r\n--{boundary}--\r\n".encode()
+
+    response = client.post("/patients/extract-info", content=body(), headers={
+        **hospital["headers"], "Content-Type": f"multipart/form-data; boundary={boundary}",
+    })
+    assert response.status_code == 413
+    assert os.listdir(OCR_SPOOL_DIR) == []
+
+
+def test_ingest_moves_the_spooled_upload_into_the_queue_dir(client, hospital, monkeypatch):
+    queued = []
+    monkeypatch.setattr(routers.patient.job_queue, "enqueue",
+                        lambda fields, path, job_id: queued.append((fields, path, job_id)))
+    data = pdf(200 * 1024)
+    response = client.post("/patients/ingest", headers=hospital["headers"],
+                           data={"symptoms": "headache", "hospital_id": str(hospital["id"]), "name": "Ada"},
+                           files={"document": ("scan.pdf", data, "application/pdf")})
+    assert response.status_code == 202
+    [(fields, path, job_id)] = queued
+    assert fields["name"] == "Ada" and fields["hospital_id"] == hospital["id"]
+    assert path == os.path.join(routers.patient.INGEST_UPLOAD_DIR, f"{job_id}.pdf")
+    with open(path, "rb") as f:
+        assert f.read() == data
+    assert os.listdir(OCR_SPOOL_DIR) == []
+
+
+def test_form_fields_are_parsed_alongside_the_file(client, hospital, monkeypatch):
+    queued = []
+    monkeypatch.setattr(routers.patient.job_queue, "enqueue",
+                        lambda fields, path, job_id: queued.append(fields))
+    response = client.post("/patients/ingest", headers=hospital["headers"],
+                           data={"symptoms": "tos, fièvre", "hospital_id": str(hospital["id"])},
+                           files={"document": ("empty.pdf", b"", "application/pdf")})
+    assert response.status_code == 202
+    assert queued[0]["symptoms"] == "tos, fièvre"
+    # A missing required field is still a validation error
+    response = client.post("/patients/ingest", headers=hospital["headers"],
+                           data={"hospital_id": str(hospital["id"])},
+                           files={"document": ("scan.pdf", pdf(100), "application/pdf")})
+    assert response.status_code == 422
+    assert os.listdir(OCR_SPOOL_DIR) == []
+
+
+def test_roster_import_reads_the_spooled_file(client, hospital):
+    roster = "name,age,symptoms\nAda,36,cough\nGrace,45,fever\n".encode()
+    response = client.post("/patients/import", headers=hospital["headers"],
+                           data={"hospital_id": str(hospital["id"])},
+                           files={"file": ("roster.csv", roster, "text/csv")})
+    assert response.status_code == 200, response.text
+    assert response.json()["patients"] == 2
+    assert os.listdir(OCR_SPOOL_DIR) == []
+
+
+def test_failed_extraction_reports_the_raw_llm_response(client, hospital, ocr_calls, monkeypatch):
+    prompts = []
+
+    def reply(messages):
+        prompts.append(messages[-1]["content"])
+        return "Sorry, I can't read that."
+
+    backend = FakeLLMBackend(reply=reply)
+    monkeypatch.setattr(routers.patient, "extraction_pipeline", ExtractionPipeline(client=LLMClient(backend=backend)))
+    response = client.post("/patients/extract-info", headers=hospital["headers"],
+                           files={"document": ("scan.pdf", pdf(1024), "application/pdf")})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["error"] == "LLM parsing failed"
+    assert body["raw_response"] == "Sorry, I can't read that."
+    assert body["extraction"]["failed_chunks"] == 1
+    # No made-up symptoms reach the prompt; the document is all the endpoint knows
+    [prompt] = prompts
+    assert "Symptoms: \n" in prompt
@@ -0,0 +1,267 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Optional, Set
+
+from dotenv import load_dotenv
+from sqlalchemy import and_, event, or_, select, union
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload
+
+from models import Patient, MedicalRecord, DiseaseHistory, TreatmentPlan, PatientConsent
+from parsing import parse_datetime
+
+load_dotenv()
+
+TIMELINE_CACHE_TTL = float(os.getenv("TIMELINE_CACHE_TTL", "300"))
+TIMELINE_CACHE_SIZE = int(os.getenv("TIMELINE_CACHE_SIZE", "2048"))
+
+RECORD_FIELDS = ["id", "symptoms", "document_summary", "visit_date", "allergies", "previous_diseases",
+                 "medications", "weight", "height"]
+PLAN_FIELDS = ["id", "treatment", "medication", "tests", "precaution"]
+
+
+class TimelineCache:
+    """Per-process LRU of built timelines, keyed on the viewing patient id.
+
+    Each entry remembers which patients' rows it was built from, so a write to
+    any of them drops every timeline that included it. Entries also expire
+    after ``ttl`` seconds, which bounds staleness from writes made by other
+    processes.
+    """
+
+    def __init__(self, ttl: float = TIMELINE_CACHE_TTL, maxsize: int = TIMELINE_CACHE_SIZE,
+                 clock: Callable[[], float] = time.monotonic):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._dependents: Dict[int, Set[int]] = {}
+        self._lock = threading.Lock()
+        self._epoch = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def epoch(self) -> int:
+        return self._epoch
+
+    def get(self, patient_id: int) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(patient_id)
+            if entry is None or entry[0] <= self.clock():
+                if entry is not None:
+                    self._drop(patient_id)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(patient_id)
+            self.hits += 1
+            return entry[2]
+
+    def put(self, patient_id: int, sources: Iterable[int], timeline: dict, epoch: Optional[int] = None):
+        if self.maxsize <= 0 or self.ttl <= 0:
+            return
+        sources = set(sources) | {patient_id}
+        with self._lock:
+            if epoch is not None and epoch != self._epoch:
+                # Something was invalidated while this timeline was being built; it may be stale
+                return
+            self._drop(patient_id)
+            self._entries[patient_id] = (self.clock() + self.ttl, sources, timeline)
+            for source in sources:
+                self._dependents.setdefault(source, set()).add(patient_id)
+            while len(self._entries) > self.maxsize:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate(self, patient_ids: Iterable[int]):
+        with self._lock:
+            self._epoch += 1
+            for patient_id in set(patient_ids):
+                for viewer in self._dependents.pop(patient_id, set()):
+                    if self._drop(viewer):
+                        self.invalidations += 1
+
+    def _drop(self, patient_id: int) -> bool:
+        entry = self._entries.pop(patient_id, None)
+        if entry is None:
+            return False
+        for source in entry[1]:
+            viewers = self._dependents.get(source)
+            if viewers is not None:
+                viewers.discard(patient_id)
+                if not viewers:
+                    del self._dependents[source]
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._dependents.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else None,
+            "invalidations": self.invalidations,
+            "entries": len(self._entries),
+            "ttl_seconds": self.ttl,
+            "max_entries": self.maxsize,
+        }
+
+
+timeline_cache = TimelineCache()
+
+
+# ---------------------------------------------------------------------------
+# Invalidation: collect touched patient ids during flush, drop them on commit
+# ---------------------------------------------------------------------------
+
+def _touched_patients(session: Session) -> Set[int]:
+    patient_ids, disease_ids = set(), set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Patient):
+            patient_ids.add(obj.id)
+        elif isinstance(obj, (MedicalRecord, DiseaseHistory)):
+            patient_ids.add(obj.patient_id)
+        elif isinstance(obj, PatientConsent):
+            patient_ids.update((obj.patient_id, obj.linked_patient_id))
+        elif isinstance(obj, TreatmentPlan):
+            disease_ids.add(obj.disease_id)
+    disease_ids.discard(None)
+    if disease_ids:
+        patient_ids.update(session.connection().scalars(
+            select(DiseaseHistory.patient_id).where(DiseaseHistory.id.in_(disease_ids))
+        ))
+    patient_ids.discard(None)
+    return patient_ids
+
+
+@event.listens_for(Session, "before_flush")
+def _collect_before_flush(session, flush_context, instances):
+    # Before the flush, so deleted rows still carry their foreign keys
+    session.info.setdefault("timeline_dirty", set()).update(_touched_patients(session))
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session):
+    dirty = session.info.pop("timeline_dirty", None)
+    if dirty:
+        timeline_cache.invalidate(dirty)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session):
+    session.info.pop("timeline_dirty", None)
+
+
+# ---------------------------------------------------------------------------
+# Building a timeline
+# ---------------------------------------------------------------------------
+
+def _fields(obj, fields):
+    return {field: getattr(obj, field) for field in fields}
+
+
+def _consenting_sources(patient_id: int):
+    # The patient itself plus every record another hospital currently shares into it
+    shared = select(PatientConsent.patient_id).where(
+        PatientConsent.linked_patient_id == patient_id,
+        PatientConsent.revoked_at.is_(None),
+    )
+    return union(select(Patient.id).where(Patient.id == patient_id), shared)
+
+
+async def build_timeline(db: AsyncSession, patient_id: int) -> Optional[dict]:
+    """Every record, diagnosis and treatment plan visible to ``patient_id``, newest first.
+
+    A single SELECT with joined eager loading pulls the patient and each
+    consenting hospital's record together with their child rows.
+    """
+    sources = (await db.scalars(
+        select(Patient)
+        .where(Patient.id.in_(_consenting_sources(patient_id)))
+        .options(
+            joinedload(Patient.medical_records),
+            joinedload(Patient.disease_history).joinedload(DiseaseHistory.treatment_plans),
+        )
+    )).unique().all()
+
+    if not any(p.id == patient_id for p in sources):
+        return None
+
+    entries = []
+    for source in sources:
+        origin = {"patient_id": source.id, "hospital_id": source.hospital_id}
+        for record in source.medical_records:
+            entries.append({
+                "type": "medical_record", "date": record.visit_date, **origin,
+                **_fields(record, RECORD_FIELDS),
+            })
+        for history in source.disease_history:
+            entries.append({
+                "type": "diagnosis", "date": history.created_at, **origin,
+                "id": history.id,
+                "symptoms": history.symptoms,
+                "predicted_disease": history.predicted_disease,
+                "treatment_plans": [_fields(plan, PLAN_FIELDS) for plan in history.treatment_plans],
+            })
+    # Undated entries last
+    entries.sort(key=lambda e: (e["date"] is not None, e["date"] or datetime.min), reverse=True)
+
+    return {
+        "patient_id": patient_id,
+        "sources": [{"patient_id": s.id, "hospital_id": s.hospital_id} for s in sources],
+        "entries": entries,
+    }
+
+
+def time_range_query(model, column, patient_id: int, since: Optional[datetime] = None,
+                     until: Optional[datetime] = None, limit: int = 100, before_id: Optional[int] = None):
+    """One patient's ``model`` rows with ``since <= column < until``, newest first.
+
+    Matches the (patient_id, <column>) composite indexes: an equality on the
+    leading column and a range on the second, read backwards, so only the
+    returned rows are touched however long the history is.
+
+    Rows are ordered by ``(column, id)``, undated rows (values migration 0003
+    couldn't parse) last. To get the next page, pass the last row's date as
+    ``until`` and its id as ``before_id``: rows at exactly that date with a
+    smaller id are included, so rows sharing a timestamp (a bulk import gives
+    them all the same one) are neither skipped nor repeated, and the undated
+    rows follow the dated ones. If the last row had no date, pass only
+    ``before_id`` to continue through the undated rows.
+    """
+    query = select(model).where(model.patient_id == patient_id)
+    if since is not None:
+        query = query.where(column >= parse_datetime(since))
+    if until is not None:
+        until = parse_datetime(until)
+        if before_id is None:
+            query = query.where(column < until)
+        else:
+            query = query.where(or_(
+                column < until,
+                and_(column == until, model.id < before_id),
+                column.is_(None),
+            ))
+    elif before_id is not None:
+        query = query.where(column.is_(None), model.id < before_id)
+    # Postgres puts NULLs first on a DESC sort unless told otherwise
+    return query.order_by(column.desc().nulls_last(), model.id.desc()).limit(limit)
+
+
+async def get_timeline(db: AsyncSession, patient_id: int) -> Optional[dict]:
+    timeline = timeline_cache.get(patient_id)
+    if timeline is not None:
+        return {**timeline, "cached": True}
+    epoch = timeline_cache.epoch
+    timeline = await build_timeline(db, patient_id)
+    if timeline is not None:
+        timeline_cache.put(patient_id, [s["patient_id"] for s in timeline["sources"]], timeline, epoch)
+        return {**timeline, "cached": False}
+    return None
@@ -1,39 +1,226 @@
-# train_disease_model.py
+# train_model.py
+# Trains the symptom -> disease RandomForest and publishes it as a new
+# model version: MODEL_DIR/<version>/ holds the pickles, the flattened
+# forest and a manifest.json with checksums, metrics, timings and peak
+# memory; MODEL_DIR/CURRENT is switched to it unless --no-activate is given.
+# A running API picks the new version up through the model registry.
 
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import resource
+import shutil
+import sys
+import time
+from datetime import datetime
+
+import joblib
+import numpy as np
 import pandas as pd
+from scipy.sparse import csr_matrix
 from sklearn.ensemble import RandomForestClassifier
-from sklearn.preprocessing import MultiLabelBinarizer
+from sklearn.metrics import accuracy_score, classification_report, f1_score
 from sklearn.model_selection import train_test_split
-from sklearn.metrics import classification_report
-import joblib
+from sklearn.preprocessing import MultiLabelBinarizer
+
+from forest import flatten_forest
+from model_registry import MODEL_DIR, MODEL_FILE, ENCODER_FILE, FOREST_FILE, MANIFEST_FILE, verify_artifacts
+
+DATASET = "dataset.csv"
+
+
+@contextlib.contextmanager
+def timed(stages: dict, name: str):
+    started = time.perf_counter()
+    yield
+    stages[name] = round(time.perf_counter() - started, 3)
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return round(peak * scale / (1024 * 1024), 1)
+
+
+def sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def normalize(values: pd.Series) -> pd.Series:
+    # Vectorized form of s.strip().lower().replace(" ", "_") used at inference time
+    return values.astype(str).str.strip().str.lower().str.replace(" ", "_", regex=False)
+
+
+def load_csv(path: str):
+    """Long (row, symptom) pairs plus one label per row from the wide Kaggle CSV."""
+    df = pd.read_csv(path, dtype=str).fillna("")
+    symptom_columns = [col for col in df.columns if col.lower().startswith("symptom")]
+    values = df[symptom_columns].to_numpy()
+    pairs = pd.DataFrame({
+        "row": np.repeat(np.arange(len(df)), len(symptom_columns)),
+        "symptom": values.ravel(),
+    })
+    labels = df["Disease"].str.strip().str.lower()
+    return pairs, labels
+
+
+def load_database(confirmed_only: bool):
+    """(row, symptom) pairs and labels from DiseaseHistory.
+
+    With ``confirmed_only`` only diagnoses a doctor attached a TreatmentPlan to
+    are used, since the rest are just the model's own predictions.
+    """
+    from sqlalchemy import exists, select
+    from database import SessionLocal
+    from models import DiseaseHistory, TreatmentPlan
+
+    query = select(DiseaseHistory.symptoms, DiseaseHistory.predicted_disease).where(
+        DiseaseHistory.predicted_disease.isnot(None)
+    )
+    if confirmed_only:
+        query = query.where(exists().where(TreatmentPlan.disease_id == DiseaseHistory.id))
+    db = SessionLocal()
+    try:
+        history = pd.DataFrame(db.execute(query).all(), columns=["symptoms", "disease"])
+    finally:
+        db.close()
+    exploded = history["symptoms"].fillna("").str.split(",").explode()
+    pairs = pd.DataFrame({"row": exploded.index.to_numpy(), "symptom": exploded.to_numpy()})
+    labels = history["disease"].str.strip().str.lower()
+    return pairs, labels
+
+
+def encode(pairs: pd.DataFrame, n_rows: int):
+    """Build the multi-hot matrix straight from (row, symptom) pairs.
+
+    Produces the same columns as MultiLabelBinarizer.fit_transform (sorted
+    vocabulary) without materialising Python lists per row.
+    """
+    symptoms = normalize(pairs["symptom"])
+    keep = symptoms != ""
+    rows = pairs["row"].to_numpy()[keep.to_numpy()]
+    codes, vocabulary = pd.factorize(symptoms[keep], sort=True)
+    X = csr_matrix((np.ones(len(codes), dtype=np.float32), (rows, codes)), shape=(n_rows, len(vocabulary)))
+    X.sum_duplicates()
+    X.data[:] = 1
+    encoder = MultiLabelBinarizer(classes=list(vocabulary))
+    encoder.fit([])
+    return X, encoder
+
+
+def write_version(model_dir: str, version: str, artifacts: dict, manifest: dict, activate: bool) -> str:
+    final = os.path.join(model_dir, version)
+    if os.path.exists(final):
+        raise SystemExit(f"Model version {version} already exists in {model_dir}")
+    staging = os.path.join(model_dir, f".{version}.tmp")
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+
+    manifest["files"] = {}
+    for name, obj in artifacts.items():
+        path = os.path.join(staging, name)
+        joblib.dump(obj, path)
+        manifest["files"][name] = {"sha256": sha256_file(path), "bytes": os.path.getsize(path)}
+    with open(os.path.join(staging, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    # Read back what was written before publishing; the registry then trusts the manifest
+    verify_artifacts(staging)
+
+    # Publish the directory and then the pointer, each with an atomic rename
+    os.replace(staging, final)
+    if activate:
+        pointer = os.path.join(model_dir, "CURRENT")
+        with open(pointer + ".tmp", "w") as f:
+            f.write(version)
+        os.replace(pointer + ".tmp", pointer)
+    return final
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the disease model and publish a new model version")
+    parser.add_argument("--dataset", default=DATASET)
+    parser.add_argument("--from-db", action="store_true", help="also train on DiseaseHistory rows from DATABASE_URL")
+    parser.add_argument("--db-rows", choices=["confirmed", "all"], default="confirmed",
+                        help="confirmed: only diagnoses with a TreatmentPlan; all: every DiseaseHistory row")
+    parser.add_argument("--n-estimators", type=int, default=200)
+    parser.add_argument("--n-jobs", type=int, default=-1, help="cores used for fitting (-1 = all)")
+    parser.add_argument("--test-size", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--model-dir", default=MODEL_DIR)
+    parser.add_argument("--version", default=None, help="defaults to a UTC timestamp")
+    parser.add_argument("--no-activate", action="store_true", help="write the version without switching CURRENT")
+    args = parser.parse_args()
+
+    version = args.version or datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+    stages = {}
+    started = time.perf_counter()
+
+    with timed(stages, "load"):
+        pairs, labels = load_csv(args.dataset)
+        sources = {"csv_rows": len(labels)}
+        if args.from_db:
+            db_pairs, db_labels = load_database(args.db_rows == "confirmed")
+            db_pairs["row"] += len(labels)
+            pairs = pd.concat([pairs, db_pairs], ignore_index=True)
+            labels = pd.concat([labels, db_labels], ignore_index=True)
+            sources["db_rows"] = len(db_labels)
+
+    with timed(stages, "preprocess"):
+        X, encoder = encode(pairs, len(labels))
+        y = labels.to_numpy()
+
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=args.test_size, random_state=args.seed)
 
-# Load dataset
-df = pd.read_csv("dataset.csv")
+    with timed(stages, "fit"):
+        model = RandomForestClassifier(n_estimators=args.n_estimators, random_state=args.seed, n_jobs=args.n_jobs)
+        model.fit(X_train, y_train)
 
-# Clean and preprocess
-df.fillna('', inplace=True)
-symptom_columns = [col for col in df.columns if col.lower().startswith('symptom')]
-df['Symptoms'] = df[symptom_columns].values.tolist()
-df['Symptoms'] = df['Symptoms'].apply(lambda x: [s.strip().lower().replace(' ', '_') for s in x if s])
-df['Disease'] = df['Disease'].str.strip().str.lower().replace(' ', '_')
+    with timed(stages, "evaluate"):
+        y_pred = model.predict(X_test)
+        report = classification_report(y_test, y_pred, output_dict=True, zero_division=0)
+        metrics = {
+            "accuracy": round(float(accuracy_score(y_test, y_pred)), 4),
+            "macro_f1": round(float(f1_score(y_test, y_pred, average="macro", zero_division=0)), 4),
+            "weighted_f1": round(float(f1_score(y_test, y_pred, average="weighted", zero_division=0)), 4),
+            "per_class": {label: report[label] for label in model.classes_ if label in report},
+        }
+    print("Model Evaluation Report:\n")
+    print(classification_report(y_test, y_pred, zero_division=0))
 
-# Encode symptoms
-mlb = MultiLabelBinarizer()
-X = mlb.fit_transform(df['Symptoms'])
-y = df['Disease']
+    with timed(stages, "export"):
+        # The API predicts with the flattened forest and only loads sklearn lazily
+        model.n_jobs = 1
+        artifacts = {MODEL_FILE: model, ENCODER_FILE: encoder, FOREST_FILE: flatten_forest(model)}
 
-# Optional: Split for evaluation
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    wall = time.perf_counter() - started
+    manifest = {
+        "version": version,
+        "created_at": datetime.utcnow().isoformat() + "Z",
+        "dataset": {"path": args.dataset, "sha256": sha256_file(args.dataset), **sources},
+        "params": {"n_estimators": args.n_estimators, "n_jobs": args.n_jobs, "test_size": args.test_size,
+                   "seed": args.seed, "db_rows": args.db_rows if args.from_db else None},
+        "shape": {"train_rows": X_train.shape[0], "test_rows": X_test.shape[0],
+                  "features": X.shape[1], "classes": len(model.classes_)},
+        "metrics": metrics,
+        "timings_seconds": {**stages, "total": round(wall, 3)},
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    path = write_version(args.model_dir, version, artifacts, manifest, activate=not args.no_activate)
 
-# Train the model
-model = RandomForestClassifier(n_estimators=200, random_state=42)
-model.fit(X_train, y_train)
+    summary = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in stages.items())
+    print(f"✅ Model version {version} written to {path}{'' if args.no_activate else ' and activated'}")
+    print(f"   accuracy {metrics['accuracy']}, macro F1 {metrics['macro_f1']}")
+    print(f"   wall time {wall:.2f}s ({summary}), peak RSS {manifest['peak_rss_mb']} MB")
 
-# Evaluate
-y_pred = model.predict(X_test)
-print("Model Evaluation Report:\n")
-print(classification_report(y_test, y_pred))
 
-# Save model and encoder
-joblib.dump(model, "disease_model.pkl")
-joblib.dump(mlb, "symptom_encoder.pkl")
+if __name__ == "__main__":
+    main()
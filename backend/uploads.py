@@ -0,0 +1,187 @@
+# uploads.py
+# Multipart parsing for the patient routes. Starlette spools every uploaded
+# file to an anonymous temp file, which the routes then had to copy again to
+# get a path the OCR workers and the ingest queue can open, and it reads the
+# whole body before any size check can run. Routes on UploadRoute instead
+# stream each file part straight into a named file in OCR_SPOOL_DIR, hashing
+# it on the way, and stop reading with a 413 as soon as the body is over
+# MAX_UPLOAD_BYTES - before reading anything when Content-Length says so.
+
+import asyncio
+import hashlib
+import os
+import tempfile
+from typing import Callable, List, Optional
+
+from dotenv import load_dotenv
+from fastapi import HTTPException, Request, Response
+from fastapi.routing import APIRoute
+from python_multipart.multipart import MultipartParser, parse_options_header
+from starlette.datastructures import FormData, Headers, UploadFile
+
+from ocr import OCR_SPOOL_DIR
+
+load_dotenv()
+
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(50 * 1024 * 1024)))
+# Room for the form fields and part headers sent alongside the file
+MAX_FORM_FIELD_BYTES = 64 * 1024
+
+
+def too_large() -> HTTPException:
+    return HTTPException(status_code=413, detail=f"Upload larger than {MAX_UPLOAD_BYTES} bytes")
+
+
+class SpooledUpload(UploadFile):
+    """An upload already written to ``path`` while it was received.
+
+    ``sha256`` is the digest of its contents. The file is deleted when the
+    request's form is closed, unless a route moved it somewhere else first.
+    """
+
+    def __init__(self, file, *, path: str, sha256: str, **kwargs):
+        super().__init__(file, **kwargs)
+        self.path = path
+        self.sha256 = sha256
+
+    async def close(self):
+        await super().close()
+        try:
+            await asyncio.to_thread(os.remove, self.path)
+        except FileNotFoundError:
+            pass
+
+
+class _Part:
+    def __init__(self):
+        self.headers = []
+        self.name = ""
+        self.filename: Optional[str] = None
+        self.data = bytearray()  # field value; file parts go to disk
+        self.pending: List[bytes] = []
+        self.size = 0
+        self.digest = None
+        self.path: Optional[str] = None
+        self.file = None
+
+    def write_pending(self):
+        # Runs in a worker thread: file creation, hashing and writes all block
+        if self.file is None:
+            fd, self.path = tempfile.mkstemp(suffix=os.path.splitext(self.filename or "")[1], dir=OCR_SPOOL_DIR)
+            self.file = os.fdopen(fd, "w+b")
+        for block in self.pending:
+            self.digest.update(block)
+            self.file.write(block)
+        self.pending = []
+
+
+async def parse_multipart(headers: Headers, stream, max_file_bytes: int) -> FormData:
+    _, params = parse_options_header(headers["Content-Type"])
+    boundary = params.get(b"boundary")
+    if not boundary:
+        raise HTTPException(status_code=400, detail="Missing boundary in multipart.")
+    charset = params.get(b"charset", b"utf-8").decode("latin-1")
+
+    parts: List[_Part] = []
+    header_field, header_value = bytearray(), bytearray()
+
+    def on_part_begin():
+        parts.append(_Part())
+
+    def on_header_field(data: bytes, start: int, end: int):
+        header_field.extend(data[start:end])
+
+    def on_header_value(data: bytes, start: int, end: int):
+        header_value.extend(data[start:end])
+
+    def on_header_end():
+        parts[-1].headers.append((bytes(header_field).lower(), bytes(header_value)))
+        header_field.clear()
+        header_value.clear()
+
+    def on_headers_finished():
+        part = parts[-1]
+        _, options = parse_options_header(dict(part.headers).get(b"content-disposition", b""))
+        if b"name" not in options:
+            raise HTTPException(status_code=400, detail='The Content-Disposition header field "name" must be provided.')
+        part.name = options[b"name"].decode(charset, errors="replace")
+        if b"filename" in options:
+            part.filename = options[b"filename"].decode(charset, errors="replace")
+            part.digest = hashlib.sha256()
+
+    def on_part_data(data: bytes, start: int, end: int):
+        part = parts[-1]
+        if part.filename is None:
+            part.data.extend(data[start:end])
+            if len(part.data) > MAX_FORM_FIELD_BYTES:
+                raise HTTPException(status_code=400, detail=f"Form field {part.name!r} is too large")
+        else:
+            part.size += end - start
+            if part.size > max_file_bytes:
+                raise too_large()
+            part.pending.append(data[start:end])
+
+    parser = MultipartParser(boundary, {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+    })
+    try:
+        async for chunk in stream:
+            parser.write(chunk)
+            # The callbacks above only queue file data; write it off the event loop
+            for part in parts:
+                if part.pending:
+                    await asyncio.to_thread(part.write_pending)
+        parser.finalize()
+
+        items = []
+        for part in parts:
+            if part.filename is None:
+                items.append((part.name, part.data.decode(charset, errors="replace")))
+                continue
+            await asyncio.to_thread(part.write_pending)  # creates the file for an empty upload
+            part.file.seek(0)
+            items.append((part.name, SpooledUpload(
+                part.file, path=part.path, sha256=part.digest.hexdigest(), size=part.size,
+                filename=part.filename, headers=Headers(raw=part.headers),
+            )))
+        return FormData(items)
+    except BaseException:
+        for part in parts:
+            if part.file is not None:
+                part.file.close()
+                os.remove(part.path)
+        raise
+
+
+class UploadRequest(Request):
+    async def _spool_form(self) -> FormData:
+        content_length = self.headers.get("Content-Length")
+        if content_length and content_length.isdigit() and \
+                int(content_length) > MAX_UPLOAD_BYTES + MAX_FORM_FIELD_BYTES:
+            raise too_large()
+        if self._form is None:
+            self._form = await parse_multipart(self.headers, self.stream(), MAX_UPLOAD_BYTES)
+        return self._form
+
+    def form(self, **kwargs):
+        content_type, _ = parse_options_header(self.headers.get("Content-Type", ""))
+        if content_type != b"multipart/form-data":
+            return super().form(**kwargs)
+        return self._spool_form()
+
+
+class UploadRoute(APIRoute):
+    """Route class for routers that accept file uploads; see the module comment."""
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def upload_handler(request: Request) -> Response:
+            return await handler(UploadRequest(request.scope, request.receive))
+
+        return upload_handler
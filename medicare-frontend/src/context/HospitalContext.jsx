@@ -1,14 +1,71 @@
 import { createContext, useContext, useState } from "react";
+import axios from "axios";
 
 const HospitalContext = createContext();
 
+// ✅ Every axios call carries the access token
+axios.interceptors.request.use((config) => {
+  const token = localStorage.getItem("token");
+  if (token) config.headers.Authorization = `Bearer ${token}`;
+  return config;
+});
+
+// ✅ Swap the refresh token for a new pair. Refresh tokens are single use, so
+// concurrent 401s share one in-flight refresh instead of each spending it
+let refreshing = null;
+export const refreshAccessToken = () => {
+  if (!refreshing) {
+    refreshing = axios
+      .post("http://localhost:8000/auth/refresh", { refresh_token: localStorage.getItem("refreshToken") })
+      .then((res) => {
+        localStorage.setItem("token", res.data.access_token);
+        localStorage.setItem("refreshToken", res.data.refresh_token);
+        return res.data.access_token;
+      })
+      .finally(() => {
+        refreshing = null;
+      });
+  }
+  return refreshing;
+};
+
+// ✅ On a 401, refresh once and retry the request
+axios.interceptors.response.use(
+  (res) => res,
+  async (error) => {
+    const original = error.config;
+    const refreshToken = localStorage.getItem("refreshToken");
+    if (error.response?.status !== 401 || !refreshToken || original._retried || original.url.endsWith("/auth/refresh")) {
+      return Promise.reject(error);
+    }
+    original._retried = true;
+    await refreshAccessToken();
+    return axios(original);
+  }
+);
+
+// ✅ fetch() for responses axios can't stream (SSE), with the same token handling
+export const authFetch = async (url, options = {}) => {
+  const send = () =>
+    fetch(url, {
+      ...options,
+      headers: { ...options.headers, Authorization: `Bearer ${localStorage.getItem("token")}` },
+    });
+  const res = await send();
+  if (res.status !== 401 || !localStorage.getItem("refreshToken")) return res;
+  await refreshAccessToken();
+  return send();
+};
+
 export const HospitalProvider = ({ children }) => {
   const [hospitalName, setHospitalName] = useState(localStorage.getItem("hospitalName"));
   const [hospitalId, setHospitalId] = useState(localStorage.getItem("hospitalId"));
 
-  const login = (name, id) => {
+  const login = (name, id, tokens = {}) => {
     localStorage.setItem("hospitalName", name);
     localStorage.setItem("hospitalId", id);
+    if (tokens.access_token) localStorage.setItem("token", tokens.access_token);
+    if (tokens.refresh_token) localStorage.setItem("refreshToken", tokens.refresh_token);
     setHospitalName(name);
     setHospitalId(id);
   };
@@ -16,6 +73,8 @@ export const HospitalProvider = ({ children }) => {
   const logout = () => {
     localStorage.removeItem("hospitalName");
     localStorage.removeItem("hospitalId");
+    localStorage.removeItem("token");
+    localStorage.removeItem("refreshToken");
     setHospitalName(null);
     setHospitalId(null);
   };
@@ -2,6 +2,7 @@ import { useEffect, useState } from "react";
 import { useNavigate } from "react-router-dom";
 import axios from "axios";
 import { Bot, Send, ScanSearch, User, Save } from "lucide-react";
+import { authFetch } from "../context/HospitalContext";
 
 export default function AiAssistant() {
   const [patient, setPatient] = useState(null);
@@ -141,23 +142,44 @@ const saveTreatmentPlan = async () => {
         Provide diagnosis guidance, precautions, and treatment if asked.`
       };
 
-      const res = await axios.post("http://localhost:8000/ai/chat", {
-        messages: [
-          systemMessage,
-          ...chatHistory.map((c) => ({
-            role: c.sender === "you" ? "user" : "assistant",
-            content: c.text
-          })),
-          { role: "user", content: chatInput }
-        ]
-      });
-
-      setChatHistory([
-        ...chatHistory,
-        { sender: "you", text: chatInput },
-        { sender: "ai", text: res.data.reply }
-      ]);
+      const messages = [
+        systemMessage,
+        ...chatHistory.map((c) => ({
+          role: c.sender === "you" ? "user" : "assistant",
+          content: c.text
+        })),
+        { role: "user", content: chatInput }
+      ];
+      const history = [...chatHistory, { sender: "you", text: chatInput }];
+      setChatHistory([...history, { sender: "ai", text: "" }]);
       setChatInput("");
+
+      // Stream tokens over SSE and grow the last AI bubble as they arrive
+      const res = await authFetch("http://localhost:8000/ai/chat/stream", {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ messages })
+      });
+      if (!res.ok) throw new Error(`HTTP ${res.status}`);
+
+      const reader = res.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+      let reply = "";
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const events = buffer.split("\n\n");
+        buffer = events.pop();
+        for (const event of events) {
+          if (event.startsWith("event: done")) continue;
+          const data = event.split("\n").find((line) => line.startsWith("data: "));
+          if (!data) continue;
+          reply += JSON.parse(data.slice(6)).delta;
+          setChatHistory([...history, { sender: "ai", text: reply }]);
+        }
+      }
     } catch (err) {
       console.error("Chat failed:", err);
       alert("Failed to get AI response.");
@@ -9,12 +9,16 @@ export default function Dashboard() {
   const [patients, setPatients] = useState([]);
   const [visibleHistoryId, setVisibleHistoryId] = useState(null);
   const [showNewRecordId, setShowNewRecordId] = useState(null);
+  const [nextCursor, setNextCursor] = useState(null);
   const hospitalName = localStorage.getItem("hospitalName");
   const hospitalId = localStorage.getItem("hospitalId");
 
-  const fetchPatients = async () => {
-    const res = await axios.get(`http://localhost:8000/patients/hospital/${hospitalId}`);
-    setPatients(res.data);
+  const fetchPatients = async (afterId = null) => {
+    const res = await axios.get(`http://localhost:8000/patients/hospital/${hospitalId}`, {
+      params: afterId ? { after_id: afterId } : {},
+    });
+    setPatients((prev) => (afterId ? [...prev, ...res.data.items] : res.data.items));
+    setNextCursor(res.data.next_cursor);
   };
 
   useEffect(() => {
@@ -109,6 +113,17 @@ export default function Dashboard() {
           </div>
         ))}
       </div>
+
+      {nextCursor && (
+        <div className="flex justify-center mt-6">
+          <button
+            onClick={() => fetchPatients(nextCursor)}
+            className="bg-blue-500 hover:bg-blue-600 text-white px-6 py-2 rounded shadow-md transition"
+          >
+            Load more
+          </button>
+        </div>
+      )}
     </div>
   );
 }
@@ -13,8 +13,7 @@ export default function Login() {
     try {
       const res = await axios.post('http://localhost:8000/auth/login', credentials);
       if (res.data.access_token) {
-        localStorage.setItem("token", res.data.access_token); // optional
-        login(res.data.name , res.data.hospital_id); // ✅ this updates context + triggers navbar re-render
+        login(res.data.name , res.data.hospital_id, res.data); // ✅ stores tokens, updates context + triggers navbar re-render
         alert("Login successful!");
         navigate("/dashboard");
       }
@@ -18,7 +18,7 @@ export default function Register() {
   const handleSubmit = async (e) => {
     e.preventDefault();
     const res = await axios.post("http://localhost:8000/auth/register", formData);
-    login(res.data.name, res.data.hospital_id); // ✅ use context to update
+    login(res.data.name, res.data.hospital_id, res.data); // ✅ use context to update (and keep the tokens)
     alert("Hospital Registered!");
     navigate("/dashboard");
   };